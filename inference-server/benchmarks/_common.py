@@ -0,0 +1,46 @@
+"""
+Helpers shared by the benchmarks: timing loops and output checksums.
+"""
+import hashlib
+import statistics
+import time
+import torch
+
+
+def time_call(fn, repeats):
+    """
+    Average seconds per call, after one warm-up call.
+    """
+    with torch.no_grad():
+        fn()
+        start = time.perf_counter()
+        for _ in range(repeats):
+            fn()
+    return (time.perf_counter() - start) / repeats
+
+
+def _run_times(fn, repeats):
+    """Seconds taken by each of several runs"""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def best_of(fn, repeats):
+    """Fastest of several runs, in seconds"""
+    return min(_run_times(fn, repeats))
+
+
+def median_of(fn, repeats):
+    """Median seconds per call, after one warm-up call"""
+    fn()
+    return statistics.median(_run_times(fn, repeats))
+
+
+def file_md5(path):
+    """MD5 hex digest of a file, to check two outputs are byte for byte equal"""
+    with open(path, "rb") as f:
+        return hashlib.md5(f.read()).hexdigest()
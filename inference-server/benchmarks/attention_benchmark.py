@@ -0,0 +1,94 @@
+"""
+Benchmark of the attention backends in TabularTransformerWithRelPos: reference versus sdpa.
+
+Times each backend in a fresh subprocess and reports throughput and the peak
+resident memory the forward passes add on top of the loaded model. That both
+backends give the same predictions is checked by tests/test_attention_parity.py.
+
+Usage (from the inference-server directory):
+    python -m benchmarks.attention_benchmark --batch-size 512 --d-model 384
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+import torch
+from models.transformer_model import ATTENTION_BACKENDS, TabularTransformerWithRelPos, set_attention_backend
+
+
+def build_inputs(args):
+    """
+    Random model and batch; every row keeps at least one observed feature.
+    """
+    torch.manual_seed(0)
+    model = TabularTransformerWithRelPos(
+        num_features=args.features,
+        d_model=args.d_model,
+        nhead=args.num_heads,
+        num_layers=args.num_layers,
+        dim_feedforward=args.dim_feedforward,
+        activation="gelu",
+    ).eval()
+    x = torch.randn(args.batch_size, args.features)
+    mask = (torch.rand(args.batch_size, args.features) < args.missing_rate).int()
+    mask[:, 0] = 0
+    return model, x, mask
+
+
+def measure(args):
+    """
+    Time one backend and print its results as JSON; runs in a subprocess so peak memory is its own.
+    """
+    model, x, mask = build_inputs(args)
+    set_attention_backend(model, args.measure)
+    baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    
+    with torch.no_grad():
+        model(x, None, mask)
+        start = time.perf_counter()
+        for _ in range(args.repeats):
+            model(x, None, mask)
+        elapsed = time.perf_counter() - start
+    
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({
+        "rows_per_second": args.batch_size * args.repeats / elapsed,
+        "ms_per_batch": elapsed / args.repeats * 1000,
+        "peak_forward_mb": (peak_kb - baseline_kb) / 1024,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=512)
+    parser.add_argument("--features", type=int, default=39)
+    parser.add_argument("--d-model", type=int, default=384)
+    parser.add_argument("--num-heads", type=int, default=12)
+    parser.add_argument("--num-layers", type=int, default=6)
+    parser.add_argument("--dim-feedforward", type=int, default=1536)
+    parser.add_argument("--missing-rate", type=float, default=0.2)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--measure", choices=ATTENTION_BACKENDS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.measure:
+        measure(args)
+        return
+    
+    print(f"Batch {args.batch_size}, torch threads: {torch.get_num_threads()}")
+    
+    # Each backend is timed in its own process so peak memory is not shared
+    for backend in ATTENTION_BACKENDS:
+        result = subprocess.run(
+            [sys.executable, "-m", "benchmarks.attention_benchmark", *sys.argv[1:], "--measure", backend],
+            check=True, capture_output=True, text=True,
+        )
+        stats = json.loads(result.stdout.strip().splitlines()[-1])
+        print(f"{backend:9s}: {stats['rows_per_second']:10.0f} rows/s, {stats['ms_per_batch']:8.2f} ms/batch, "
+              f"peak forward memory {stats['peak_forward_mb']:7.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Benchmark of imputing a chunked upload as it arrives against imputing it after the upload.
+
+A writer thread sends the parts of a CSV into an UploadSession at a simulated
+link bandwidth. The sequential run waits for the last part before imputing;
+the early run imputes from an UploadStream while the parts are still
+arriving. Both parse in CSV schema mode, which the early start requires; the
+generated columns are matched to the model by name. The outputs are compared
+byte for byte.
+
+Usage (from the inference-server directory):
+    MODEL_PATH=models/tabular_transformer_relpos.pth SCALER_PATH=models/scaler.pkl \\
+        python -m benchmarks.chunked_upload_benchmark --rows 200000 --bandwidth-mbps 100
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+from benchmarks._common import file_md5
+from benchmarks.file_format_benchmark import make_frame
+from inference.chunked_upload import UploadSession, UploadStream, UPLOAD_STREAM_CHUNK_SIZE
+from inference.feature_schema import FeatureSchema
+from inference.imputation_service import ImputationService
+
+
+async def _single_chunk(data):
+    yield data
+
+
+def upload(session, data, bandwidth_mbps):
+    """Send every part in order, taking as long as the link would"""
+    checksums = []
+    for offset in range(0, len(data), session.part_size):
+        part = data[offset:offset + session.part_size]
+        time.sleep(len(part) * 8 / (bandwidth_mbps * 1e6))
+        checksums.append(hashlib.sha256(part).hexdigest())
+        asyncio.run(session.write_part(len(checksums), _single_chunk(part), checksums[-1]))
+    session.complete(checksums)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--missing-row-fraction", type=float, default=0.2)
+    parser.add_argument("--missing-rate", type=float, default=0.2)
+    parser.add_argument("--part-size-mb", type=float, default=4)
+    parser.add_argument("--bandwidth-mbps", type=float, default=100.0, help="Upload bandwidth in megabits per second")
+    args = parser.parse_args()
+
+    service = ImputationService()
+    service.warm_up()
+    with open(service.scaler_path, "rb") as f:
+        scaler = pickle.load(f)
+    df = make_frame(scaler, args.rows, args.missing_row_fraction, args.missing_rate)
+    service.feature_schema = FeatureSchema(df.columns)
+    chunk_size = service.chunk_size or UPLOAD_STREAM_CHUNK_SIZE
+    part_size = int(args.part_size_mb * 1024 * 1024)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        csv_path = os.path.join(work_dir, "input.csv")
+        df.to_csv(csv_path, index=False)
+        with open(csv_path, "rb") as f:
+            data = f.read()
+        print(f"CSV: {args.rows} rows, {len(data) / 1024 ** 2:.1f} MB in parts of {args.part_size_mb:g} MB, "
+              f"upload at {args.bandwidth_mbps:g} Mbit/s takes {len(data) * 8 / (args.bandwidth_mbps * 1e6):.1f} s")
+
+        # Sequential: the job starts once the upload is complete
+        session = UploadSession.create(os.path.join(work_dir, "sequential"), "input.csv", part_size)
+        sequential_output = os.path.join(work_dir, "sequential.csv")
+        start = time.perf_counter()
+        upload(session, data, args.bandwidth_mbps)
+        upload_time = time.perf_counter() - start
+        service.impute_file(session.data_path, sequential_output, chunk_size=chunk_size)
+        sequential_time = time.perf_counter() - start
+
+        # Early: the job reads the parts as they arrive
+        session = UploadSession.create(os.path.join(work_dir, "early"), "input.csv", part_size, start_early=True)
+        early_output = os.path.join(work_dir, "early.csv")
+        start = time.perf_counter()
+        writer = threading.Thread(target=upload, args=(session, data, args.bandwidth_mbps))
+        writer.start()
+        while session.part(1) is None:
+            time.sleep(0.01)
+        with UploadStream(session.upload_dir) as input_stream:
+            service.impute_file(session.data_path, early_output, chunk_size=chunk_size, input_stream=input_stream)
+        writer.join()
+        early_time = time.perf_counter() - start
+
+        assert file_md5(early_output) == file_md5(sequential_output), "Early start changed the output"
+
+    print(f"upload, then impute:   {sequential_time:7.2f} s (upload {upload_time:.2f} s)")
+    print(f"impute while arriving: {early_time:7.2f} s, speedup {sequential_time / early_time:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Benchmark of the compiled TorchScript artifact against the eager model in ImputationService.
+
+Exports the checkpoint (random weights with the notebook config unless
+--model-path is given), then loads the service both ways in fresh processes
+and reports model load time and the time per batch at several batch sizes.
+Both ways are checked to give the same predictions.
+
+Usage (from the inference-server directory):
+    python -m benchmarks.compiled_model_benchmark --batch-sizes 1 8 64
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+import torch
+from models.export import export_torchscript
+from models.inference_graph import _instantiate
+
+MODES = ("eager", "compiled")
+
+
+def measure(args):
+    """
+    Load the service one way, time batches and print the results as JSON.
+    """
+    os.environ["USE_COMPILED_MODEL"] = "1" if args.measure == "compiled" else "0"
+    from inference.batch_memory import BatchBuffers, MemoryPolicy
+    from inference.imputation_service import ImputationService
+    
+    # Import sklearn up front so the scaler unpickle does not dominate the load time
+    import sklearn.preprocessing  # noqa: F401
+    
+    service = ImputationService()
+    start = time.perf_counter()
+    service._ensure_model_loaded()
+    load_seconds = time.perf_counter() - start
+    
+    rng = np.random.default_rng(0)
+    buffers = BatchBuffers(max(args.batch_sizes), service.device)
+    memory_policy = MemoryPolicy(0, service.device)
+    batch_ms, preds = {}, []
+    for batch_size in args.batch_sizes:
+        rows = service.scaler.inverse_transform(rng.standard_normal((batch_size, service.num_features)))
+        rows[rng.random(rows.shape) < 0.2] = np.nan
+        preds.append(service.impute_rows(rows, buffers, memory_policy).tolist())
+        # The TorchScript profiling executor optimizes the graph over the first few calls
+        for _ in range(args.warmup):
+            service.impute_rows(rows, buffers, memory_policy)
+        start = time.perf_counter()
+        for _ in range(args.repeats):
+            service.impute_rows(rows, buffers, memory_policy)
+        batch_ms[batch_size] = (time.perf_counter() - start) / args.repeats * 1000
+    
+    print(json.dumps({"load_seconds": load_seconds, "batch_ms": batch_ms, "preds": preds}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model-path", help="Checkpoint to export; random weights otherwise")
+    parser.add_argument("--model-type", choices=["single", "ensemble"], default="single")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 64])
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--measure", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.measure:
+        measure(args)
+        return
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        model_path = args.model_path
+        if not model_path:
+            config = {"num_features": 39, "d_model": 384, "num_heads": 12, "num_layers": 6,
+                      "dim_feedforward": 1536, "dropout": 0.1, "activation": "gelu"}
+            torch.manual_seed(0)
+            model = _instantiate(config, args.model_type)
+            model_path = os.path.join(tmp_dir, "checkpoint.pth")
+            torch.save({"model_state_dict": model.state_dict(), "config": config, "model_type": args.model_type}, model_path)
+        
+        start = time.perf_counter()
+        artifact = export_torchscript(model_path, os.path.join(tmp_dir, "checkpoint.torchscript.pt")
+                                      if not args.model_path else None)
+        print(f"Exported {artifact} in {time.perf_counter() - start:.2f} seconds")
+        
+        results = {}
+        env = dict(os.environ, MODEL_PATH=model_path)
+        for mode in MODES:
+            result = subprocess.run(
+                [sys.executable, "-m", "benchmarks.compiled_model_benchmark", *sys.argv[1:], "--measure", mode],
+                check=True, capture_output=True, text=True, env=env,
+            )
+            results[mode] = json.loads(result.stdout.strip().splitlines()[-1])
+    
+    # Imputations are in the original scale, so compare relative to their magnitude
+    max_diff = max(
+        np.abs(np.array(eager) - np.array(compiled)).max() / np.abs(np.array(eager)).max()
+        for eager, compiled in zip(results["eager"]["preds"], results["compiled"]["preds"])
+    )
+    assert max_diff < 1e-5, f"Compiled model predictions differ by {max_diff} relative"
+    print(f"Parity OK: max relative diff {max_diff:.2e}")
+    for mode in MODES:
+        stats = results[mode]
+        timings = ", ".join(f"batch {size}: {ms:7.2f} ms" for size, ms in stats["batch_ms"].items())
+        print(f"{mode:8s}: load {stats['load_seconds']:5.2f} s, {timings}")
+
+
+if __name__ == "__main__":
+    main()
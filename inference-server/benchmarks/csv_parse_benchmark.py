@@ -0,0 +1,90 @@
+"""
+Benchmark of CSV parsing with type inference against schema mode.
+
+Writes a CSV with the model features plus a few text columns, then times
+pd.read_csv with type inference (the default path), the pyarrow parse that
+schema mode uses (text columns, with the features parsed as float32 for the
+model), and the header check that rejects a file with missing features
+before it is parsed.
+
+Usage (from the inference-server directory):
+    python -m benchmarks.csv_parse_benchmark --rows 1000000
+"""
+import argparse
+import os
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+import pyarrow.csv as pa_csv
+from benchmarks._common import best_of
+from inference.feature_schema import FeatureSchema, parse_feature_text, read_csv_header
+
+
+def make_frame(rows, features, missing_rate, seed=0):
+    """
+    Numerical feature columns with values missing at random, plus an id and a free-text column.
+    """
+    rng = np.random.default_rng(seed)
+    data = rng.normal(size=(rows, features))
+    data[rng.random((rows, features)) < missing_rate] = np.nan
+    df = pd.DataFrame(data, columns=[f"feature_{i}" for i in range(features)])
+    df.insert(0, "patient_id", [f"{i:08d}" for i in range(rows)])
+    df["note"] = np.where(rng.random(rows) < 0.1, "follow-up, see chart", "")
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--features", type=int, default=39)
+    parser.add_argument("--missing-rate", type=float, default=0.05)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    df = make_frame(args.rows, args.features, args.missing_rate)
+    schema = FeatureSchema([f"feature_{i}" for i in range(args.features)])
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        path = os.path.join(work_dir, "input.csv")
+        df.to_csv(path, index=False)
+        bad_path = os.path.join(work_dir, "bad.csv")
+        df.drop(columns=["feature_3"]).to_csv(bad_path, index=False)
+        print(f"CSV: {args.rows} x {df.shape[1]}, {os.path.getsize(path) / 1024 ** 2:.1f} MB")
+
+        def inferred():
+            return pd.read_csv(path, index_col=None)
+
+        def with_schema():
+            columns = read_csv_header(path)
+            schema.validate(columns)
+            table = pa_csv.read_csv(path, convert_options=pa_csv.ConvertOptions(
+                column_types=schema.arrow_column_types(columns),
+                strings_can_be_null=False,
+            ))
+            parsed = schema.null_missing(table).to_pandas()
+            features = np.column_stack([parse_feature_text(parsed[name]) for name in schema.feature_names])
+            return parsed, features
+
+        def reject_bad_header():
+            try:
+                schema.validate(read_csv_header(bad_path))
+            except ValueError:
+                return
+            raise AssertionError("The malformed header was accepted")
+
+        # Same features up to float32 rounding; ids keep their leading zeros only with the schema
+        expected, (parsed, features) = inferred(), with_schema()
+        assert np.allclose(expected[schema.feature_names].to_numpy(), features, rtol=1e-6, equal_nan=True)
+        assert parsed["patient_id"].iloc[1] == "00000001"
+
+        inferred_time = best_of(inferred, args.repeats)
+        schema_time = best_of(with_schema, args.repeats)
+        reject_time = best_of(reject_bad_header, args.repeats)
+        print(f"pd.read_csv with type inference: {inferred_time:7.2f} s")
+        print(f"schema mode (pyarrow text):      {schema_time:7.2f} s, speedup {inferred_time / schema_time:5.2f}x")
+        print(f"malformed header rejected in:    {reject_time * 1000:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
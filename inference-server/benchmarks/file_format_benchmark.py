@@ -0,0 +1,103 @@
+"""
+End-to-end imputation job time for CSV against Parquet and Arrow IPC inputs.
+
+Generates rows in the scaler's range with a fraction of rows missing values,
+writes the same data as CSV, Parquet and Arrow IPC, and runs
+ImputationService.impute_file on each with the model from MODEL_PATH. Every
+format imputes the same rows, so the difference is parsing, type inference
+and writing. The imputed values of the formats are compared at the end.
+
+Usage (from the inference-server directory):
+    MODEL_PATH=models/tabular_transformer_relpos.pth SCALER_PATH=models/scaler.pkl \\
+        python -m benchmarks.file_format_benchmark --rows 1000000
+"""
+import argparse
+import os
+import pickle
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from inference.imputation_service import ImputationService
+
+
+def make_frame(scaler, rows, missing_row_fraction, missing_rate, seed=0):
+    """
+    Rows drawn around the scaler's mean, with missing values in a fraction of the rows.
+    """
+    rng = np.random.default_rng(seed)
+    num_features = len(scaler.mean_)
+    columns = list(getattr(scaler, "feature_names_in_", [f"feature_{i}" for i in range(num_features)]))
+    data = rng.standard_normal((rows, num_features)) * scaler.scale_ + scaler.mean_
+    rows_with_missing = rng.random(rows) < missing_row_fraction
+    holes = rng.random((int(rows_with_missing.sum()), num_features)) < missing_rate
+    holes[np.arange(len(holes)), rng.integers(0, num_features, len(holes))] = True
+    block = data[rows_with_missing]
+    block[holes] = np.nan
+    data[rows_with_missing] = block
+    return pd.DataFrame(data, columns=columns)
+
+
+def read_output(path):
+    """Imputed numerical block of an output file"""
+    if path.endswith(".csv"):
+        return pd.read_csv(path, index_col=0).to_numpy(dtype=np.float64)
+    if path.endswith(".parquet"):
+        return pq.read_table(path).to_pandas().to_numpy(dtype=np.float64)
+    with pa.memory_map(path) as source:
+        return pa.ipc.open_file(source).read_all().to_pandas().to_numpy(dtype=np.float64)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--missing-row-fraction", type=float, default=0.01,
+                        help="Fraction of rows with missing values; only these reach the model")
+    parser.add_argument("--missing-rate", type=float, default=0.2)
+    parser.add_argument("--row-group-size", type=int, default=128 * 1024)
+    parser.add_argument("--work-dir", default=None, help="Directory for the generated files; a temporary one by default")
+    args = parser.parse_args()
+
+    service = ImputationService()
+    service.warm_up()
+    with open(service.scaler_path, "rb") as f:
+        scaler = pickle.load(f)
+
+    df = make_frame(scaler, args.rows, args.missing_row_fraction, args.missing_rate)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    print(f"Frame: {args.rows} x {df.shape[1]}, {int(df.isna().any(axis=1).sum())} rows with missing values")
+
+    with tempfile.TemporaryDirectory(dir=args.work_dir) as work_dir:
+        inputs = {
+            "csv": os.path.join(work_dir, "input.csv"),
+            "parquet": os.path.join(work_dir, "input.parquet"),
+            "arrow": os.path.join(work_dir, "input.arrow"),
+        }
+        df.to_csv(inputs["csv"], index=False)
+        pq.write_table(table, inputs["parquet"], row_group_size=args.row_group_size)
+        with pa.ipc.new_file(inputs["arrow"], table.schema) as writer:
+            writer.write_table(table, max_chunksize=args.row_group_size)
+
+        results = {}
+        for file_format, input_path in inputs.items():
+            output_path = os.path.join(work_dir, "output" + os.path.splitext(input_path)[1])
+            start = time.perf_counter()
+            metrics = service.impute_file(input_path, output_path)
+            elapsed = time.perf_counter() - start
+            results[file_format] = (elapsed, read_output(output_path))
+            print(f"{file_format:8s}: input {os.path.getsize(input_path) / 1024 ** 2:8.1f} MB, "
+                  f"output {os.path.getsize(output_path) / 1024 ** 2:8.1f} MB, job {elapsed:8.2f} s, "
+                  f"{metrics['missing_values']} values imputed")
+
+    csv_time, csv_values = results["csv"]
+    for file_format in ("parquet", "arrow"):
+        elapsed, values = results[file_format]
+        # Row groups change which rows share a batch, which moves results by float32 rounding
+        assert np.allclose(values, csv_values, rtol=1e-5, atol=1e-6), f"{file_format} output differs from CSV"
+        print(f"{file_format} speedup over csv: {csv_time / elapsed:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
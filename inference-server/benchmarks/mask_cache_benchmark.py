@@ -0,0 +1,86 @@
+"""
+Benchmark of the memoized mask encodings and the mask pattern cache.
+
+Compares missingness_encoder run over every mask entry with the [2, d_model]
+lookup table that FeatureValueDependentEncoder now uses, then runs the full
+model over pattern-homogeneous batches with and without a MaskPatternCache
+and reports the cache hit rate. The cache only applies to these shared
+[1, F] masks, and on CPU its speedup is around 1x, anywhere from 0.88x to 1.2x.
+
+Usage (from the inference-server directory):
+    python -m benchmarks.mask_cache_benchmark --batch-size 512 --d-model 384 --attention-backend sdpa
+"""
+import argparse
+import torch
+from benchmarks._common import time_call
+from models.mask_cache import MaskPatternCache
+from models.transformer_model import (
+    ATTENTION_BACKENDS, TabularTransformerWithRelPos, set_attention_backend, set_mask_cache
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=512)
+    parser.add_argument("--features", type=int, default=39)
+    parser.add_argument("--d-model", type=int, default=384)
+    parser.add_argument("--num-heads", type=int, default=12)
+    parser.add_argument("--num-layers", type=int, default=6)
+    parser.add_argument("--patterns", type=int, default=4)
+    parser.add_argument("--cache-size", type=int, default=256)
+    parser.add_argument("--attention-backend", choices=ATTENTION_BACKENDS, default="reference")
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    model = TabularTransformerWithRelPos(
+        num_features=args.features,
+        d_model=args.d_model,
+        nhead=args.num_heads,
+        num_layers=args.num_layers,
+        dim_feedforward=4 * args.d_model,
+        max_seq_len=max(2 * args.features, 100)
+    ).eval()
+    set_attention_backend(model, args.attention_backend)
+    print(f"d_model {args.d_model}, batch {args.batch_size}, {args.attention_backend} attention, "
+          f"torch threads: {torch.get_num_threads()}")
+
+    # Mask encodings: MLP over every entry against the lookup table
+    encoder = model.feature_value_encoder
+    mask = (torch.rand(args.batch_size, args.features) < 0.2).int()
+    with torch.no_grad():
+        per_entry = encoder.missingness_encoder(mask.float().unsqueeze(-1))
+        lookup = encoder._encode_missingness(mask)
+    assert torch.allclose(per_entry, lookup, atol=1e-5), "Mask encoding lookup differs from the MLP"
+
+    mlp_time = time_call(lambda: encoder.missingness_encoder(mask.float().unsqueeze(-1)), args.repeats)
+    lookup_time = time_call(lambda: encoder._encode_missingness(mask), args.repeats)
+    print(f"mask encoding: per-entry MLP {mlp_time * 1000:8.3f} ms, lookup {lookup_time * 1000:8.3f} ms, "
+          f"speedup {mlp_time / lookup_time:5.2f}x")
+
+    # Full model over pattern-homogeneous batches, with and without the cache
+    x = torch.randn(args.batch_size, args.features)
+    patterns = [(torch.rand(1, args.features) < 0.2).int() for _ in range(args.patterns)]
+
+    def run_patterns():
+        return [model(x, None, pattern) for pattern in patterns]
+
+    with torch.no_grad():
+        uncached = run_patterns()
+    uncached_time = time_call(run_patterns, args.repeats)
+
+    cache = MaskPatternCache(args.cache_size)
+    set_mask_cache(model, cache)
+    with torch.no_grad():
+        cached = run_patterns()
+    for want, got in zip(uncached, cached):
+        assert torch.equal(want, got), "Cached mask tensors changed the predictions"
+    cached_time = time_call(run_patterns, args.repeats)
+
+    print(f"{args.patterns} pattern batches: uncached {uncached_time * 1000:8.2f} ms, "
+          f"cached {cached_time * 1000:8.2f} ms, speedup {uncached_time / cached_time:5.2f}x")
+    print(f"cache: {cache.metrics()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Benchmark of model loading: eager construction versus the pruned inference graph.
+
+Saves a checkpoint with random weights in the old training layout, then loads
+it in a fresh subprocess each way and reports load time, parameter count and
+peak resident memory. Both models are checked to give the same predictions.
+
+Usage (from the inference-server directory):
+    python -m benchmarks.model_load_benchmark --model-type ensemble --d-model 384
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import torch
+from models.inference_graph import _instantiate, build_inference_model
+
+LOADERS = ("eager", "pruned")
+
+
+def load(path, loader):
+    """
+    Load the checkpoint one way and return (model, seconds).
+    """
+    start = time.perf_counter()
+    checkpoint = torch.load(path, map_location="cpu")
+    if loader == "eager":
+        model = _instantiate(checkpoint["config"], checkpoint.get("model_type"))
+        model.load_state_dict(checkpoint["model_state_dict"])
+        model.eval()
+    else:
+        model, _ = build_inference_model(checkpoint, torch.device("cpu"))
+    return model, time.perf_counter() - start
+
+
+def measure(args):
+    """
+    Load with one loader, run a fixed batch and print the results as JSON.
+    """
+    model, seconds = load(args.checkpoint, args.measure)
+    torch.manual_seed(1)
+    x = torch.randn(16, args.features)
+    mask = (torch.rand(16, args.features) < 0.2).int()
+    with torch.no_grad():
+        preds = model(x, None, mask)
+    print(json.dumps({
+        "seconds": seconds,
+        "parameters": sum(p.numel() for p in model.parameters()),
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "preds": preds.tolist(),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model-type", choices=["single", "ensemble"], default="ensemble")
+    parser.add_argument("--features", type=int, default=39)
+    parser.add_argument("--d-model", type=int, default=384)
+    parser.add_argument("--num-heads", type=int, default=12)
+    parser.add_argument("--num-layers", type=int, default=6)
+    parser.add_argument("--dim-feedforward", type=int, default=1536)
+    parser.add_argument("--checkpoint", help=argparse.SUPPRESS)
+    parser.add_argument("--measure", choices=LOADERS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.measure:
+        measure(args)
+        return
+    
+    config = {
+        "num_features": args.features,
+        "d_model": args.d_model,
+        "num_heads": args.num_heads,
+        "num_layers": args.num_layers,
+        "dim_feedforward": args.dim_feedforward,
+        "dropout": 0.1,
+        "activation": "gelu",
+    }
+    torch.manual_seed(0)
+    model = _instantiate(config, args.model_type)
+    
+    # Store q/k/v separately, the way the training notebooks save them
+    state_dict = {}
+    for key, value in model.state_dict().items():
+        if ".qkv_proj." in key:
+            prefix, suffix = key.split(".qkv_proj.")
+            for name, chunk in zip("qkv", value.chunk(3, dim=0)):
+                state_dict[f"{prefix}.{name}_proj.{suffix}"] = chunk.clone()
+        else:
+            state_dict[key] = value
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "checkpoint.pth")
+        torch.save({"model_state_dict": state_dict, "config": config, "model_type": args.model_type}, path)
+        print(f"{args.model_type} checkpoint: {os.path.getsize(path) / 1024 ** 2:.1f} MB")
+        
+        results = {}
+        for loader in LOADERS:
+            result = subprocess.run(
+                [sys.executable, "-m", "benchmarks.model_load_benchmark", *sys.argv[1:],
+                 "--checkpoint", path, "--measure", loader],
+                check=True, capture_output=True, text=True,
+            )
+            results[loader] = json.loads(result.stdout.strip().splitlines()[-1])
+    
+    eager, pruned = torch.tensor(results["eager"]["preds"]), torch.tensor(results["pruned"]["preds"])
+    assert torch.equal(eager, pruned), f"Pruned model differs by {(eager - pruned).abs().max().item()}"
+    print("Parity OK: identical predictions")
+    for loader in LOADERS:
+        stats = results[loader]
+        print(f"{loader:7s}: load {stats['seconds']:6.2f} s, {stats['parameters']:10d} parameters, "
+              f"peak RSS {stats['peak_rss_mb']:7.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark of the inference backends: PyTorch versus ONNX Runtime.
+
+Exports the checkpoint to ONNX (random weights with the notebook config unless
+--model-path is given), checks both backends give the same predictions at
+several batch sizes and reports load time and rows per second for each.
+
+Usage (from the inference-server directory):
+    python -m benchmarks.onnx_benchmark --model-type ensemble --batch-sizes 1 64 512
+"""
+import argparse
+import os
+import tempfile
+import time
+import numpy as np
+import torch
+from inference.backends import OnnxRuntimeBackend, TorchBackend
+from models.export import export_onnx
+from models.inference_graph import _instantiate, build_inference_model
+
+
+def time_backend(backend, values, mask, output, repeats):
+    """
+    Average seconds per batch, after one warm-up call.
+    """
+    backend.run(values, mask, output)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        backend.run(values, mask, output)
+    return (time.perf_counter() - start) / repeats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model-path", help="Checkpoint to export; random weights otherwise")
+    parser.add_argument("--model-type", choices=["single", "ensemble"], default="single")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 64, 512])
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        model_path = args.model_path
+        if not model_path:
+            config = {"num_features": 39, "d_model": 384, "num_heads": 12, "num_layers": 6,
+                      "dim_feedforward": 1536, "dropout": 0.1, "activation": "gelu"}
+            torch.manual_seed(0)
+            model = _instantiate(config, args.model_type)
+            model_path = os.path.join(tmp_dir, "checkpoint.pth")
+            torch.save({"model_state_dict": model.state_dict(), "config": config, "model_type": args.model_type}, model_path)
+        
+        start = time.perf_counter()
+        path = export_onnx(model_path, os.path.join(tmp_dir, "checkpoint.onnx"))
+        print(f"Exported ONNX model ({os.path.getsize(path) / 1024 ** 2:.1f} MB) in {time.perf_counter() - start:.2f} seconds")
+        
+        start = time.perf_counter()
+        checkpoint = torch.load(model_path, map_location="cpu")
+        torch_backend = TorchBackend(build_inference_model(checkpoint, torch.device("cpu"))[0])
+        torch_load = time.perf_counter() - start
+        
+        start = time.perf_counter()
+        onnx_backend = OnnxRuntimeBackend(path)
+        onnx_load = time.perf_counter() - start
+        print(f"Load: torch {torch_load:.2f} s, onnxruntime {onnx_load:.2f} s; threads: {torch.get_num_threads()}")
+        
+        num_features = onnx_backend.config.get("num_features", 39)
+        generator = torch.Generator().manual_seed(1)
+        for batch_size in args.batch_sizes:
+            mask = (torch.rand(batch_size, num_features, generator=generator) < 0.2).int()
+            values = torch.randn(batch_size, num_features, generator=generator) * (1 - mask)
+            torch_out = np.empty((batch_size, num_features), dtype=np.float32)
+            onnx_out = np.empty_like(torch_out)
+            
+            torch_time = time_backend(torch_backend, values, mask, torch_out, args.repeats)
+            onnx_time = time_backend(onnx_backend, values, mask, onnx_out, args.repeats)
+            
+            max_diff = np.abs(torch_out - onnx_out).max()
+            assert np.allclose(torch_out, onnx_out, atol=1e-4, rtol=1e-4), f"ONNX output differs by {max_diff}"
+            print(f"batch {batch_size:5d}: torch {batch_size / torch_time:9.0f} rows/s, "
+                  f"onnxruntime {batch_size / onnx_time:9.0f} rows/s ({torch_time / onnx_time:4.2f}x), "
+                  f"max abs diff {max_diff:.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Benchmark of missingness-pattern grouping.
+
+Generates EHR-like rows where a few missingness patterns cover most of the
+data, groups them with group_by_pattern and, for every frequent pattern,
+compares a forward pass with the full [batch_size, num_features] mask against
+one with the pattern passed once as a [1, num_features] mask. Predictions
+must match; the report lists each pattern's row count and speedup.
+
+Usage (from the inference-server directory):
+    python -m benchmarks.pattern_benchmark --rows 20000 --patterns 8 --d-model 384
+"""
+import argparse
+import time
+import numpy as np
+import torch
+from benchmarks._common import time_call
+from inference.missingness_patterns import group_by_pattern
+from models.transformer_model import TabularTransformerWithRelPos
+
+
+def make_missingness(rows, features, patterns, dominant_share, rng):
+    """
+    Missing value mask where `patterns` fixed patterns cover `dominant_share` of the rows.
+    """
+    # Panels: each pattern leaves out a random block of features
+    templates = rng.random((patterns, features)) < rng.uniform(0.05, 0.5, size=(patterns, 1))
+    weights = rng.dirichlet(np.ones(patterns))
+    missing = templates[rng.choice(patterns, size=rows, p=weights)]
+
+    # The rest is scattered missingness with no shared structure
+    scattered = rng.random(rows) >= dominant_share
+    missing[scattered] = rng.random((int(scattered.sum()), features)) < 0.2
+    return missing
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--features", type=int, default=39)
+    parser.add_argument("--patterns", type=int, default=8)
+    parser.add_argument("--dominant-share", type=float, default=0.9)
+    parser.add_argument("--min-rows", type=int, default=64)
+    parser.add_argument("--batch-size", type=int, default=512)
+    parser.add_argument("--d-model", type=int, default=384)
+    parser.add_argument("--num-heads", type=int, default=12)
+    parser.add_argument("--num-layers", type=int, default=6)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    rng = np.random.default_rng(0)
+    missing = make_missingness(args.rows, args.features, args.patterns, args.dominant_share, rng)
+    values = np.where(missing, 0.0, rng.standard_normal(missing.shape)).astype(np.float32)
+
+    rows_to_process = np.flatnonzero(missing.any(axis=1))
+    start = time.perf_counter()
+    groups, remaining, distinct_patterns = group_by_pattern(missing, rows_to_process, args.min_rows)
+    group_time = time.perf_counter() - start
+    print(f"{args.rows} rows, {args.rows - len(rows_to_process)} fully observed, {distinct_patterns} distinct patterns; "
+          f"{len(groups)} frequent patterns cover {sum(len(g) for g in groups)} rows, {len(remaining)} rows stay mixed; "
+          f"grouping took {group_time * 1000:.1f} ms")
+
+    model = TabularTransformerWithRelPos(
+        num_features=args.features,
+        d_model=args.d_model,
+        nhead=args.num_heads,
+        num_layers=args.num_layers,
+        dim_feedforward=4 * args.d_model,
+        max_seq_len=max(2 * args.features, 100)
+    ).eval()
+    print(f"d_model {args.d_model}, batch {args.batch_size}, torch threads: {torch.get_num_threads()}")
+
+    full_total = shared_total = 0.0
+    for pattern, group in enumerate(groups):
+        batch_rows = group[:args.batch_size]
+        x = torch.from_numpy(values[batch_rows])
+        full_mask = torch.from_numpy(missing[batch_rows]).int()
+        shared_mask = full_mask[:1]
+
+        with torch.no_grad():
+            expected = model(x, None, full_mask)
+            got = model(x, None, shared_mask)
+        assert torch.allclose(expected, got, atol=1e-5), f"Pattern {pattern}: shared mask predictions differ"
+
+        full_time = time_call(lambda: model(x, None, full_mask), args.repeats)
+        shared_time = time_call(lambda: model(x, None, shared_mask), args.repeats)
+        # Scale the per-batch times to every batch of the pattern
+        num_batches = len(group) / len(batch_rows)
+        full_total += full_time * num_batches
+        shared_total += shared_time * num_batches
+        print(f"pattern {pattern}: {len(group):6d} rows, {int(missing[group[0]].sum()):2d} missing features, "
+              f"full mask {full_time * 1000:8.2f} ms, shared mask {shared_time * 1000:8.2f} ms, "
+              f"speedup {full_time / shared_time:5.2f}x")
+
+    if groups:
+        print(f"Grouped rows: {full_total:.2f} s with full masks, {shared_total:.2f} s with shared masks, "
+              f"speedup {full_total / shared_total:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
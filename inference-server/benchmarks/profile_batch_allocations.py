@@ -0,0 +1,100 @@
+"""
+Allocation profile of the per-batch pipeline around the model.
+
+Runs ImputationService._impute_batch over steady-state batches with the
+model replaced by a pass-through, so only the work around it is measured:
+gathering the rows and their mask, filling and scaling, the host to tensor
+copies, unscaling and writing the imputed values back. The model's own
+allocations are covered by profile_forward_allocations.
+
+Per batch it reports:
+    numpy peak   Largest amount of numpy memory allocated on top of the
+                 working block while the batch ran (tracemalloc), in
+                 multiples of the batch as float64
+    torch allocs Tensor allocations recorded by torch.profiler
+    time         Median wall time of the pipeline
+
+Usage (from the inference-server directory):
+    MODEL_PATH=models/tabular_transformer_relpos.pth SCALER_PATH=models/scaler.pkl \\
+        python -m benchmarks.profile_batch_allocations --batch-size 2048
+"""
+import argparse
+import time
+import tracemalloc
+import numpy as np
+import torch
+from torch.profiler import profile, ProfilerActivity
+from inference.backends import InferenceBackend
+from inference.batch_memory import BatchBuffers, MemoryPolicy
+from inference.imputation_service import ImputationService
+
+
+class PassThroughBackend(InferenceBackend):
+    """Returns its input as the prediction, standing in for the model"""
+    name = "pass-through"
+
+    def __init__(self, scales_in_graph):
+        self.scales_in_graph = scales_in_graph
+
+    def run(self, batch_tensor, mask_tensor, output):
+        torch.from_numpy(output).copy_(batch_tensor)
+
+
+def profile_batches(service, values, missing, batch_size, batches):
+    """
+    Returns:
+        tuple: Numpy peak bytes, torch allocations and median seconds per batch
+    """
+    buffers = BatchBuffers(batch_size, service.device)
+    memory_policy = MemoryPolicy(0, service.device)
+    positions = [np.arange(i * batch_size, (i + 1) * batch_size) for i in range(batches)]
+    # The first batch allocates the buffers
+    service._impute_batch(values, missing, positions[0], buffers, memory_policy)
+
+    peaks, times = [], []
+    tracemalloc.start()
+    for batch_positions in positions[1:]:
+        tracemalloc.reset_peak()
+        current, _ = tracemalloc.get_traced_memory()
+        start = time.perf_counter()
+        service._impute_batch(values, missing, batch_positions, buffers, memory_policy)
+        times.append(time.perf_counter() - start)
+        peaks.append(tracemalloc.get_traced_memory()[1] - current)
+    tracemalloc.stop()
+
+    with profile(activities=[ProfilerActivity.CPU], profile_memory=True) as prof:
+        service._impute_batch(values, missing, positions[-1], buffers, memory_policy)
+    torch_allocations = sum(1 for event in prof.events() if event.self_cpu_memory_usage > 0)
+    return max(peaks), torch_allocations, float(np.median(times))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=2048)
+    parser.add_argument("--batches", type=int, default=50)
+    parser.add_argument("--missing-rate", type=float, default=0.2)
+    args = parser.parse_args()
+
+    service = ImputationService()
+    service.warm_up()
+    rng = np.random.default_rng(0)
+    rows = args.batch_size * args.batches
+    values = service.scaler.inverse_transform(rng.standard_normal((rows, service.num_features)))
+    values[rng.random(values.shape) < args.missing_rate] = np.nan
+    missing = np.isnan(values)
+    batch_bytes = args.batch_size * service.num_features * 8
+
+    print(f"Batches of {args.batch_size} x {service.num_features}, one batch as float64 is "
+          f"{batch_bytes / 1024 ** 2:.2f} MB")
+    for scales_in_graph in (False, True):
+        service.backend = PassThroughBackend(scales_in_graph)
+        peak, torch_allocations, seconds = profile_batches(
+            service, values.copy(), missing, args.batch_size, args.batches
+        )
+        label = "in-graph scaling" if scales_in_graph else "numpy scaling"
+        print(f"{label:17s} numpy peak {peak / batch_bytes:5.2f} batches ({peak / 1024 ** 2:6.2f} MB), "
+              f"torch allocs {torch_allocations:3d}, time {seconds * 1e3:7.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Profile of the ops run by a steady-state TabularTransformerWithRelPos forward pass.
+
+Runs a few warm-up calls so the cached relative bias and column indices are
+built, then records one more call with torch.profiler and checks that none of
+the input-independent ops (arange, zeros, abs, embedding) run again.
+tests/test_forward_allocations.py runs the same check on a tiny model.
+
+Usage (from the inference-server directory):
+    python -m benchmarks.profile_forward_allocations --batch-size 64
+"""
+import argparse
+import torch
+from torch.profiler import profile, ProfilerActivity
+from models.transformer_model import TabularTransformerWithRelPos
+
+# Ops that only depend on the sequence length and should come from the caches
+CACHED_OPS = ["aten::arange", "aten::zeros", "aten::abs", "aten::embedding"]
+
+
+def profile_forward(model, x, mask):
+    """
+    Record one forward pass and return the profiler events keyed by op name.
+    """
+    with torch.no_grad(), profile(activities=[ProfilerActivity.CPU], profile_memory=True) as prof:
+        model(x, None, mask)
+    return {event.key: event for event in prof.key_averages()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--features", type=int, default=39)
+    parser.add_argument("--d-model", type=int, default=384)
+    parser.add_argument("--num-heads", type=int, default=12)
+    parser.add_argument("--num-layers", type=int, default=6)
+    parser.add_argument("--dim-feedforward", type=int, default=1536)
+    parser.add_argument("--warmup", type=int, default=2)
+    args = parser.parse_args()
+    
+    torch.manual_seed(0)
+    model = TabularTransformerWithRelPos(
+        num_features=args.features,
+        d_model=args.d_model,
+        nhead=args.num_heads,
+        num_layers=args.num_layers,
+        dim_feedforward=args.dim_feedforward,
+        activation="gelu",
+    ).eval()
+    x = torch.randn(args.batch_size, args.features)
+    mask = (torch.rand(args.batch_size, args.features) < 0.2).int()
+    
+    with torch.no_grad():
+        for _ in range(args.warmup):
+            model(x, None, mask)
+    events = profile_forward(model, x, mask)
+    
+    total_alloc = sum(max(event.self_cpu_memory_usage, 0) for event in events.values())
+    print(f"Ops recorded: {len(events)}, allocated: {total_alloc / 1024 ** 2:.2f} MB")
+    for name in CACHED_OPS:
+        count = events[name].count if name in events else 0
+        print(f"{name:18s} calls: {count}")
+    
+    leftover = [name for name in CACHED_OPS if name in events]
+    assert not leftover, f"Input-independent ops still run on every forward call: {leftover}"
+    print("OK: steady-state forward runs no input-independent ops")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Benchmark of the packed QKV projection in MultiHeadAttentionWithRelPos.
+
+Loads the attention block from a state dict in the old separate q/k/v layout,
+checks the packed projection against three separate projections and reports
+the time of each for one self-attention input.
+
+Usage (from the inference-server directory):
+    python -m benchmarks.qkv_benchmark --batch-size 512 --d-model 384
+"""
+import argparse
+import torch
+import torch.nn.functional as F
+from benchmarks._common import time_call
+from models.transformer_model import MultiHeadAttentionWithRelPos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=512)
+    parser.add_argument("--features", type=int, default=39)
+    parser.add_argument("--d-model", type=int, default=384)
+    parser.add_argument("--num-heads", type=int, default=12)
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+    
+    torch.manual_seed(0)
+    d_model = args.d_model
+    
+    # Old checkpoint layout: one weight and bias per projection
+    old_state = {}
+    for name in ("q", "k", "v", "out"):
+        old_state[f"{name}_proj.weight"] = torch.randn(d_model, d_model) * d_model ** -0.5
+        old_state[f"{name}_proj.bias"] = torch.randn(d_model) * 0.02
+    reference = MultiHeadAttentionWithRelPos(d_model, args.num_heads, max_seq_len=max(2 * args.features, 100))
+    old_state.update({
+        key: value for key, value in reference.state_dict().items()
+        if not key.startswith(("qkv_proj", "out_proj"))
+    })
+    attention = MultiHeadAttentionWithRelPos(d_model, args.num_heads, max_seq_len=max(2 * args.features, 100)).eval()
+    attention.load_state_dict(old_state)
+    
+    x = torch.randn(args.batch_size, args.features, d_model)
+    separate = [(old_state[f"{name}_proj.weight"], old_state[f"{name}_proj.bias"]) for name in ("q", "k", "v")]
+    
+    def separate_projections():
+        return [F.linear(x, weight, bias) for weight, bias in separate]
+    
+    def packed_projection():
+        return attention._project_qkv(x, x, x)
+    
+    # Parity: packed heads against the separate projections reshaped to heads
+    with torch.no_grad():
+        expected = [
+            out.view(args.batch_size, args.features, args.num_heads, -1).transpose(1, 2)
+            for out in separate_projections()
+        ]
+        packed = packed_projection()
+        cross = attention._project_qkv(x, x.clone(), x.clone())
+    for name, want, got, got_cross in zip("qkv", expected, packed, cross):
+        assert torch.allclose(want, got, atol=1e-5), f"Packed {name} projection differs"
+        assert torch.allclose(want, got_cross, atol=1e-5), f"Sliced {name} projection differs"
+    print(f"Parity OK; batch {args.batch_size}, d_model {d_model}, torch threads: {torch.get_num_threads()}")
+    
+    separate_time = time_call(separate_projections, args.repeats)
+    packed_time = time_call(packed_projection, args.repeats)
+    print(f"separate q/k/v: {separate_time * 1000:8.2f} ms, packed qkv: {packed_time * 1000:8.2f} ms, "
+          f"speedup {separate_time / packed_time:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Benchmark of the reduced-precision inference modes: float32, dynamic INT8 and bf16.
+
+Each mode is measured in a fresh subprocess: rows per second and the memory
+held by the model weights. The accuracy gate's NRMSE against float32 is
+reported alongside. Pass --checkpoint to measure real weights; the default
+random weights show speed and size but not the accuracy of a trained model.
+
+Usage (from the inference-server directory):
+    python -m benchmarks.quantization_benchmark --checkpoint models/tabular_transformer_relpos.pth
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+import warnings
+import torch
+from models.inference_graph import _instantiate, build_inference_model
+from models.quantization import QUANTIZATION_MODES, accuracy_gate, quantize_model
+
+
+def load_model(args):
+    """
+    Float32 model from --checkpoint, or random weights with the notebook config.
+    """
+    if args.checkpoint:
+        checkpoint = torch.load(args.checkpoint, map_location="cpu")
+        model, _ = build_inference_model(checkpoint, torch.device("cpu"))
+        return model, checkpoint["config"].get("num_features", 39)
+    
+    config = {
+        "num_features": args.features,
+        "d_model": args.d_model,
+        "num_heads": args.num_heads,
+        "num_layers": args.num_layers,
+        "dim_feedforward": args.dim_feedforward,
+        "dropout": 0.1,
+        "activation": "gelu",
+    }
+    torch.manual_seed(0)
+    return _instantiate(config, "single").eval(), args.features
+
+
+def build_sample(num_features, args):
+    """Scaled rows with a fifth of the values masked out"""
+    generator = torch.Generator().manual_seed(1)
+    mask = (torch.rand(args.batch_size, num_features, generator=generator) < 0.2).int()
+    values = torch.randn(args.batch_size, num_features, generator=generator) * (1 - mask)
+    return values, mask
+
+
+def model_size_mb(model):
+    """
+    In-memory weight size; shared layers count once, INT8 linears one byte per weight.
+    """
+    tensors = list(model.parameters()) + list(model.buffers())
+    for module in model.modules():
+        if isinstance(module, torch.ao.nn.quantized.dynamic.Linear):
+            weight, bias = module._weight_bias()
+            tensors += [weight] if bias is None else [weight, bias]
+    return sum(t.numel() * t.element_size() for t in tensors) / 1024 ** 2
+
+
+def measure(args):
+    """
+    Time one mode and print its results as JSON; runs in a subprocess so peak memory is its own.
+    """
+    model, num_features = load_model(args)
+    values, mask = build_sample(num_features, args)
+    if args.measure != "none":
+        model = quantize_model(model, args.measure)
+    
+    with torch.no_grad():
+        model(values, None, mask)
+        start = time.perf_counter()
+        for _ in range(args.repeats):
+            model(values, None, mask)
+        elapsed = time.perf_counter() - start
+    
+    print(json.dumps({
+        "rows_per_second": args.batch_size * args.repeats / elapsed,
+        "model_mb": model_size_mb(model),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--checkpoint", help="Single-model checkpoint to measure instead of random weights")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--features", type=int, default=39)
+    parser.add_argument("--d-model", type=int, default=384)
+    parser.add_argument("--num-heads", type=int, default=12)
+    parser.add_argument("--num-layers", type=int, default=6)
+    parser.add_argument("--dim-feedforward", type=int, default=1536)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--measure", choices=QUANTIZATION_MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    warnings.simplefilter("ignore")
+    
+    if args.measure:
+        measure(args)
+        return
+    
+    model, num_features = load_model(args)
+    values, mask = build_sample(num_features, args)
+    print(f"Batch {args.batch_size}, torch threads: {torch.get_num_threads()}")
+    
+    baseline = None
+    for mode in QUANTIZATION_MODES:
+        error = accuracy_gate(model, quantize_model(model, mode), values, mask) if mode != "none" else 0.0
+        result = subprocess.run(
+            [sys.executable, "-m", "benchmarks.quantization_benchmark", *sys.argv[1:], "--measure", mode],
+            check=True, capture_output=True, text=True,
+        )
+        stats = json.loads(result.stdout.strip().splitlines()[-1])
+        baseline = baseline or stats
+        print(f"{mode:5s}: {stats['rows_per_second']:9.0f} rows/s ({stats['rows_per_second'] / baseline['rows_per_second']:4.2f}x), "
+              f"weights {stats['model_mb']:6.1f} MB, NRMSE vs float32 {error:.4f}")
+
+
+if __name__ == "__main__":
+    main()
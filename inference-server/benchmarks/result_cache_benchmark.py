@@ -0,0 +1,87 @@
+"""
+Benchmark of the result cache on repeated and append-only re-submissions.
+
+Imputes a CSV cold, then the identical file again (served from the cache as a
+whole), then the same file with rows appended (unchanged blocks are reused
+and only the new rows go through the model). The appended file is also
+imputed without the cache, and the outputs are compared byte for byte.
+
+Blocks are fixed ranges of --block-rows rows, whether the CSV is loaded
+whole or streamed in chunks of --chunk-size rows.
+
+Usage (from the inference-server directory):
+    MODEL_PATH=models/tabular_transformer_relpos.pth SCALER_PATH=models/scaler.pkl \\
+        python -m benchmarks.result_cache_benchmark --rows 200000 --append-fraction 0.05
+"""
+import argparse
+import os
+import pickle
+import tempfile
+import time
+from benchmarks._common import file_md5
+from benchmarks.file_format_benchmark import make_frame
+from inference.imputation_service import ImputationService
+
+
+def timed_job(service, input_path, output_path):
+    start = time.perf_counter()
+    metrics = service.impute_file(input_path, output_path)
+    return time.perf_counter() - start, metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--append-fraction", type=float, default=0.05, help="Rows appended, as a fraction of --rows")
+    parser.add_argument("--missing-row-fraction", type=float, default=0.2)
+    parser.add_argument("--missing-rate", type=float, default=0.2)
+    parser.add_argument("--chunk-size", type=int, default=0, help="0 loads the CSV whole")
+    parser.add_argument("--block-rows", type=int, default=10_000)
+    parser.add_argument("--cache-mb", type=float, default=2048)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        uncached = ImputationService()
+        uncached.chunk_size = args.chunk_size
+        uncached.result_cache_mb = 0
+        uncached.warm_up()
+
+        service = ImputationService()
+        service.chunk_size = args.chunk_size
+        service.result_cache_mb = args.cache_mb
+        service.result_cache_block_rows = args.block_rows
+        service.result_cache_dir = os.path.join(work_dir, "cache")
+        service.warm_up()
+
+        with open(service.scaler_path, "rb") as f:
+            scaler = pickle.load(f)
+        appended_rows = int(args.rows * args.append_fraction)
+        df = make_frame(scaler, args.rows + appended_rows, args.missing_row_fraction, args.missing_rate)
+        original_path = os.path.join(work_dir, "extract.csv")
+        appended_path = os.path.join(work_dir, "extract_appended.csv")
+        df.iloc[:args.rows].to_csv(original_path, index=False)
+        df.to_csv(appended_path, index=False)
+        print(f"CSV: {args.rows} rows, then {appended_rows} appended; chunks of {args.chunk_size} rows, "
+              f"blocks of {args.block_rows} rows")
+
+        cold_time, _ = timed_job(service, original_path, os.path.join(work_dir, "cold.csv"))
+        repeat_time, repeat_metrics = timed_job(service, original_path, os.path.join(work_dir, "repeat.csv"))
+        appended_time, appended_metrics = timed_job(service, appended_path, os.path.join(work_dir, "appended.csv"))
+        baseline_time, _ = timed_job(uncached, appended_path, os.path.join(work_dir, "baseline.csv"))
+
+        assert file_md5(os.path.join(work_dir, "repeat.csv")) == file_md5(os.path.join(work_dir, "cold.csv"))
+        assert file_md5(os.path.join(work_dir, "appended.csv")) == file_md5(os.path.join(work_dir, "baseline.csv")), \
+            "Reused blocks changed the output"
+        assert repeat_metrics["result_cache"]["file_hits"] == 1
+
+        print(f"cold:                  {cold_time:8.2f} s")
+        print(f"identical re-upload:   {repeat_time:8.2f} s, speedup {cold_time / repeat_time:8.1f}x")
+        print(f"appended, uncached:    {baseline_time:8.2f} s")
+        print(f"appended, cached:      {appended_time:8.2f} s, speedup {baseline_time / appended_time:8.1f}x "
+              f"({appended_metrics['result_cache']['block_hits']} blocks reused, "
+              f"{appended_metrics['result_cache']['block_misses']} imputed)")
+        print(f"cache: {service.result_cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Benchmark of compressed result files: size, write cost and transfer time.
+
+Writes a result-shaped CSV chunk by chunk with ResultWriter, the way the
+streaming CSV path does, once uncompressed and once per available
+compression. Reports the file size, the time spent writing, the time a client
+spends decoding, and the transfer time over a link of the given bandwidth.
+zstd is skipped when the zstandard package is not installed.
+
+Usage (from the inference-server directory):
+    python -m benchmarks.result_compression_benchmark --rows 1000000 --bandwidth-mbps 100
+"""
+import argparse
+import gzip
+import hashlib
+import os
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from inference.result_files import RESULT_COMPRESSIONS, ResultWriter, check_compression, iter_decompressed
+
+
+def make_frame(rows, features, seed=0):
+    """Imputed-looking rows: float64 features written with full precision"""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(rng.normal(size=(rows, features)), columns=[f"feature_{i}" for i in range(features)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--features", type=int, default=39)
+    parser.add_argument("--chunk-size", type=int, default=100_000)
+    parser.add_argument("--bandwidth-mbps", type=float, default=100.0, help="Link bandwidth in megabits per second")
+    args = parser.parse_args()
+
+    df = make_frame(args.rows, args.features)
+    chunks = [df.iloc[start:start + args.chunk_size].to_csv(header=start == 0)
+              for start in range(0, args.rows, args.chunk_size)]
+    expected = hashlib.md5("".join(chunks).encode("utf-8")).hexdigest()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        for compression in RESULT_COMPRESSIONS:
+            try:
+                check_compression(compression)
+            except ImportError as e:
+                print(f"{compression:5s}: skipped, {e}")
+                continue
+            codec = None if compression == "none" else compression
+            path = os.path.join(work_dir, f"result.csv.{compression}")
+
+            start = time.perf_counter()
+            with ResultWriter(path, codec) as writer:
+                for chunk in chunks:
+                    writer.write(chunk)
+            write_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            if codec is None:
+                with open(path, "rb") as f:
+                    data = f.read()
+            else:
+                data = b"".join(iter_decompressed(path, codec))
+            decode_time = time.perf_counter() - start
+            assert hashlib.md5(data).hexdigest() == expected, f"{compression} result does not decode to the CSV"
+            if codec == "gzip":
+                # Single gzip member, so decoders that stop after the first member read it all
+                with open(path, "rb") as f:
+                    assert gzip.decompress(f.read()) == data
+
+            size = os.path.getsize(path)
+            transfer_time = size * 8 / (args.bandwidth_mbps * 1e6)
+            results[compression] = transfer_time + decode_time
+            print(f"{compression:5s}: {size / 1024 ** 2:8.1f} MB, write {write_time:6.2f} s, "
+                  f"decode {decode_time:6.2f} s, transfer at {args.bandwidth_mbps:g} Mbit/s {transfer_time:7.2f} s")
+
+    for compression, total in results.items():
+        if compression != "none":
+            print(f"{compression} download (transfer + decode) speedup: {results['none'] / total:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Benchmark of the scaler: sklearn calls against pre-extracted parameters.
+
+Per batch, compares the transform and inverse_transform of the pickled
+sklearn scaler with ScalerParams (the same float64 operations without
+sklearn's validation) and with TensorScaler (float32 tensor ops, as used in
+the graph with SCALER_IN_GRAPH=1). Also times loading the pickle against
+the exported .npz, and runs an imputation job with numpy and in-graph
+scaling to report the difference in the imputed values.
+
+Usage (from the inference-server directory):
+    MODEL_PATH=models/tabular_transformer_relpos.pth SCALER_PATH=models/scaler.pkl \\
+        python -m benchmarks.scaler_benchmark --batch-size 2048 --rows 200000
+"""
+import argparse
+import os
+import pickle
+import tempfile
+import time
+import numpy as np
+import torch
+from benchmarks._common import median_of
+from benchmarks.file_format_benchmark import make_frame, read_output
+from inference.imputation_service import ImputationService
+from models.scaler_params import ScalerParams, TensorScaler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=2048)
+    parser.add_argument("--repeats", type=int, default=200)
+    parser.add_argument("--rows", type=int, default=200_000, help="Rows of the end-to-end job")
+    parser.add_argument("--missing-row-fraction", type=float, default=0.2)
+    parser.add_argument("--missing-rate", type=float, default=0.2)
+    args = parser.parse_args()
+
+    scaler_path = os.environ.get("SCALER_PATH", "models/scaler.pkl")
+    with open(scaler_path, "rb") as f:
+        scaler = pickle.load(f)
+    params = ScalerParams.from_sklearn(scaler)
+    tensor_scaler = TensorScaler(params)
+
+    batch = make_frame(scaler, args.batch_size, 0.0, 0.0).to_numpy()
+    batch_tensor = torch.from_numpy(batch.astype(np.float32))
+    assert np.array_equal(scaler.transform(batch), params.transform(batch))
+    assert np.array_equal(scaler.inverse_transform(batch), params.inverse_transform(batch))
+
+    def tensor_round_trip():
+        with torch.no_grad():
+            tensor_scaler.inverse_transform(tensor_scaler.transform(batch_tensor))
+
+    sklearn_time = median_of(lambda: scaler.inverse_transform(scaler.transform(batch)), args.repeats)
+    params_time = median_of(lambda: params.inverse_transform(params.transform(batch)), args.repeats)
+    tensor_time = median_of(tensor_round_trip, args.repeats)
+    print(f"transform + inverse_transform of {args.batch_size} x {params.n_features_in_}:")
+    print(f"  sklearn:       {sklearn_time * 1e6:9.1f} us")
+    print(f"  ScalerParams:  {params_time * 1e6:9.1f} us, speedup {sklearn_time / params_time:5.2f}x")
+    print(f"  TensorScaler:  {tensor_time * 1e6:9.1f} us, speedup {sklearn_time / tensor_time:5.2f}x")
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        npz_path = os.path.join(work_dir, "scaler.npz")
+        params.save(npz_path)
+
+        def load_pickle():
+            with open(scaler_path, "rb") as f:
+                pickle.load(f)
+
+        pickle_load_time = median_of(load_pickle, 20)
+        npz_load_time = median_of(lambda: ScalerParams.load(npz_path), 20)
+        print(f"load: pickle {pickle_load_time * 1e3:.2f} ms, npz {npz_load_time * 1e3:.2f} ms")
+
+        df = make_frame(scaler, args.rows, args.missing_row_fraction, args.missing_rate)
+        input_path = os.path.join(work_dir, "input.csv")
+        df.to_csv(input_path, index=False)
+
+        results = {}
+        for in_graph in (False, True):
+            service = ImputationService()
+            service.scaler_in_graph = in_graph
+            service.warm_up()
+            output_path = os.path.join(work_dir, f"output_{int(in_graph)}.csv")
+            start = time.perf_counter()
+            service.impute_file(input_path, output_path)
+            results[in_graph] = (time.perf_counter() - start, read_output(output_path))
+
+    numpy_time, numpy_values = results[False]
+    graph_time, graph_values = results[True]
+    imputed = df.isna().to_numpy()
+    difference = np.abs(graph_values[imputed] - numpy_values[imputed])
+    relative = difference / np.maximum(np.abs(numpy_values[imputed]), 1e-12)
+    print(f"job of {args.rows} rows: numpy scaling {numpy_time:.2f} s, in-graph {graph_time:.2f} s")
+    print(f"in-graph imputed values: max abs difference {difference.max():.3g}, max relative {relative.max():.3g}")
+
+
+if __name__ == "__main__":
+    main()
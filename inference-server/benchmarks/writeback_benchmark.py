@@ -0,0 +1,111 @@
+"""
+Micro-benchmark for writing imputed values back into a DataFrame.
+
+Compares the per-column .loc assignment loop that impute_csv used to run for
+every batch with the masked np.where write-back over the numerical block.
+
+Usage (from the inference-server directory):
+    python -m benchmarks.writeback_benchmark --rows 1000000 --features 39
+"""
+import argparse
+import time
+import numpy as np
+import pandas as pd
+
+
+def make_frame(rows, features, missing_rate, seed=0):
+    """
+    Build a synthetic numerical frame with values missing completely at random.
+    """
+    rng = np.random.default_rng(seed)
+    data = rng.normal(size=(rows, features))
+    data[rng.random((rows, features)) < missing_rate] = np.nan
+    columns = [f"feature_{i}" for i in range(features)]
+    return pd.DataFrame(data, columns=columns)
+
+
+def loc_writeback(df_original, imputed, batch_size, max_batches=None):
+    """
+    Per-column .loc write-back, as previously done in ImputationService.impute_csv.
+    """
+    df_imputed = df_original.copy()
+    numerical_cols = df_original.columns
+    rows_with_missing = df_original[numerical_cols].isna().any(axis=1)
+    rows_to_process = rows_with_missing[rows_with_missing].index
+    
+    batches = 0
+    for i in range(0, len(rows_to_process), batch_size):
+        if max_batches is not None and batches >= max_batches:
+            break
+        batch_indices = rows_to_process[i:i+batch_size]
+        mask = df_original.loc[batch_indices, numerical_cols].isna().astype(int)
+        imputed_batch_df = pd.DataFrame(imputed[i:i+batch_size], columns=numerical_cols, index=batch_indices)
+        
+        for col in numerical_cols:
+            missing_mask = mask[col] == 1
+            if missing_mask.any():
+                df_imputed.loc[batch_indices[missing_mask], col] = imputed_batch_df.loc[batch_indices[missing_mask], col]
+        batches += 1
+    
+    return df_imputed, batches
+
+
+def masked_writeback(df_original, imputed, batch_size):
+    """
+    Masked np.where write-back over the numerical block, as done by ImputationService.
+    """
+    numerical_cols = df_original.columns
+    values = df_original[numerical_cols].to_numpy(dtype=np.float64, na_value=np.nan, copy=True)
+    missing = np.isnan(values)
+    rows_to_process = np.flatnonzero(missing.any(axis=1))
+    
+    batches = 0
+    for i in range(0, len(rows_to_process), batch_size):
+        batch_positions = rows_to_process[i:i+batch_size]
+        values[batch_positions] = np.where(missing[batch_positions], imputed[i:i+batch_size], values[batch_positions])
+        batches += 1
+    
+    df_imputed = df_original.copy()
+    cols_with_missing = missing.any(axis=0)
+    df_imputed[numerical_cols[cols_with_missing]] = values[:, cols_with_missing]
+    
+    return df_imputed, batches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--features", type=int, default=39)
+    parser.add_argument("--missing-rate", type=float, default=0.05)
+    parser.add_argument("--batch-size", type=int, default=128)
+    parser.add_argument("--loc-batches", type=int, default=200,
+                        help="Number of batches timed for the .loc loop before extrapolating (0 runs them all)")
+    args = parser.parse_args()
+    
+    df = make_frame(args.rows, args.features, args.missing_rate)
+    rows_to_process = int(df.isna().any(axis=1).sum())
+    imputed = np.random.default_rng(1).normal(size=(rows_to_process, args.features))
+    total_batches = -(-rows_to_process // args.batch_size)
+    print(f"Frame: {args.rows} x {args.features}, {rows_to_process} rows with missing values, {total_batches} batches")
+    
+    start = time.perf_counter()
+    masked_df, _ = masked_writeback(df, imputed, args.batch_size)
+    masked_time = time.perf_counter() - start
+    print(f"np.where write-back: {masked_time:.3f}s ({masked_time / total_batches * 1e6:.1f} us/batch)")
+    
+    start = time.perf_counter()
+    loc_df, loc_batches = loc_writeback(df, imputed, args.batch_size, args.loc_batches or None)
+    loc_time = time.perf_counter() - start
+    loc_estimate = loc_time / loc_batches * total_batches
+    label = "measured" if loc_batches == total_batches else f"extrapolated from {loc_batches} batches"
+    print(f".loc write-back: {loc_estimate:.3f}s ({loc_time / loc_batches * 1e6:.1f} us/batch, {label})")
+    
+    # Both methods must produce the same values for the rows the loop covered
+    covered = df.isna().any(axis=1).to_numpy().nonzero()[0][:loc_batches * args.batch_size]
+    assert np.array_equal(masked_df.iloc[covered].to_numpy(), loc_df.iloc[covered].to_numpy(), equal_nan=True)
+    
+    print(f"Speedup: {loc_estimate / masked_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
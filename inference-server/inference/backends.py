@@ -0,0 +1,116 @@
+import json
+import os
+import numpy as np
+import torch
+
+INFERENCE_BACKENDS = ("torch", "onnxruntime")
+
+
+class InferenceBackend:
+    """
+    Runs the imputation model on one prepared batch.
+
+    Backends take the scaled values (missing entries set to 0) and the missing
+    value mask as the preallocated batch tensors, and write the scaled
+    predictions into the batch's numpy output buffer. A backend that
+    scales_in_graph takes and returns values in the original units instead.
+    """
+    name = None
+    scales_in_graph = False
+
+    def run(self, batch_tensor, mask_tensor, output):
+        """
+        Predict one batch.
+
+        Args:
+            batch_tensor (torch.Tensor): Scaled float32 values [batch_size, num_features]
+            mask_tensor (torch.Tensor): bool mask, True where missing [batch_size, num_features],
+                or [1, num_features] when every row has the same pattern
+            output (np.ndarray): float32 buffer the predictions are written to
+        """
+        raise NotImplementedError
+
+
+class TorchBackend(InferenceBackend):
+    """
+    Eager, compiled or quantized PyTorch model.
+
+    With a TensorScaler, scaling and unscaling run as tensor ops around the
+    model on its device, so the batch and the output hold unscaled values.
+    """
+    name = "torch"
+
+    def __init__(self, model, scaler=None):
+        """
+        Args:
+            model: Model called as model(values, None, mask)
+            scaler (TensorScaler): Scales in the graph when given
+        """
+        self.model = model
+        self.scaler = scaler
+        self.scales_in_graph = scaler is not None
+
+    def run(self, batch_tensor, mask_tensor, output):
+        # Columns are in training order, so no column indices are needed
+        with torch.no_grad():
+            if self.scaler is not None:
+                # Missing entries are 0 in the scaled space, as with numpy scaling
+                batch_tensor = self.scaler.transform(batch_tensor).masked_fill(mask_tensor, 0.0)
+            imputed_tensor = self.model(batch_tensor, None, mask_tensor)
+            if self.scaler is not None:
+                imputed_tensor = self.scaler.inverse_transform(imputed_tensor)
+        torch.from_numpy(output).copy_(imputed_tensor)
+
+
+class OnnxRuntimeBackend(InferenceBackend):
+    """
+    ONNX model exported by `python -m models.export --format onnx`, run on CPU by ONNX Runtime.
+    """
+    name = "onnxruntime"
+
+    def __init__(self, path, num_threads=None):
+        """
+        Args:
+            path (str): ONNX model file
+            num_threads (int): Intra-op threads; defaults to torch's thread count
+        """
+        try:
+            import onnxruntime
+        except ImportError as e:
+            raise ImportError("The onnxruntime backend requires the onnxruntime package") from e
+
+        self.path = path
+        self.num_threads = num_threads or torch.get_num_threads()
+        self._onnxruntime = onnxruntime
+        self._session = None
+        self._session_pid = None
+
+        # Read the export metadata from the first session
+        metadata = self._get_session().get_modelmeta().custom_metadata_map
+        self.source_sha256 = metadata.get("source_sha256")
+        self.config = json.loads(metadata["config"])
+        self.model_type = metadata.get("model_type", "single")
+
+    def _get_session(self):
+        """
+        Get the session for this process, creating it after a fork.
+
+        Runtime thread pools do not survive fork, so job workers forked from
+        the loaded server build their own session on first use.
+        """
+        if self._session is None or self._session_pid != os.getpid():
+            options = self._onnxruntime.SessionOptions()
+            options.intra_op_num_threads = self.num_threads
+            options.inter_op_num_threads = 1
+            self._session = self._onnxruntime.InferenceSession(
+                self.path, sess_options=options, providers=["CPUExecutionProvider"]
+            )
+            self._session_pid = os.getpid()
+        return self._session
+
+    def run(self, batch_tensor, mask_tensor, output):
+        imputed = self._get_session().run(
+            # The exported graph takes the mask as int32
+            ["imputed"], {"values": batch_tensor.cpu().numpy(), "mask": mask_tensor.cpu().numpy().astype(np.int32)}
+        )[0]
+        np.copyto(output, imputed)
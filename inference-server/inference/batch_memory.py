@@ -0,0 +1,140 @@
+import gc
+import os
+import resource
+import numpy as np
+import torch
+
+class BatchBuffers:
+    """
+    Preallocated input, mask and output buffers reused by every batch of a job.
+    
+    Each batch is copied into the leading rows of the buffers instead of
+    allocating fresh tensors, so the batch loop does not churn the allocator.
+    
+    Besides the model's tensors there are host staging arrays: the gathered
+    rows (float64, also used for the write-back), their scaled copy and their
+    mask. On CPU the host mask is a view of the bool mask tensor, so the mask
+    is gathered straight into the model input. Filling, scaling and writing
+    back happen in place on these arrays, so a batch allocates nothing.
+    """
+    def __init__(self, batch_size, device):
+        self.batch_size = batch_size
+        self.device = device
+        self.num_features = None
+        self.allocations = 0
+        self.reuses = 0
+        
+        self.input_buffer = None
+        self.mask_buffer = None
+        self.output_buffer = None
+        self.rows_buffer = None
+        self.scaled_buffer = None
+        self.host_mask_buffer = None
+        # Missing entries of the scaled rows, as a tensor for torch.where
+        self.fill_value = torch.zeros((), dtype=torch.float64)
+    
+    def get(self, num_rows, num_features):
+        """
+        Get views of the buffers sized for a batch.
+        
+        Args:
+            num_rows (int): Number of rows in the batch
+            num_features (int): Number of features per row
+            
+        Returns:
+            tuple: Input tensor, mask tensor and output array views
+        """
+        if self.num_features != num_features or num_rows > self.batch_size:
+            self.batch_size = max(self.batch_size, num_rows)
+            self.num_features = num_features
+            self.input_buffer = torch.empty((self.batch_size, num_features), dtype=torch.float32, device=self.device)
+            self.mask_buffer = torch.empty((self.batch_size, num_features), dtype=torch.bool, device=self.device)
+            # Model outputs are float32; keep them that way for the inverse transform
+            self.output_buffer = np.empty((self.batch_size, num_features), dtype=np.float32)
+            # Rows are scaled in float64 before the cast to float32, as sklearn does
+            self.rows_buffer = np.empty((self.batch_size, num_features), dtype=np.float64)
+            self.scaled_buffer = np.empty((self.batch_size, num_features), dtype=np.float64)
+            if self.mask_buffer.device.type == "cpu":
+                self.host_mask_buffer = self.mask_buffer.numpy()
+            else:
+                self.host_mask_buffer = np.empty((self.batch_size, num_features), dtype=bool)
+            self.allocations += 1
+        else:
+            self.reuses += 1
+        
+        return self.input_buffer[:num_rows], self.mask_buffer[:num_rows], self.output_buffer[:num_rows]
+    
+    def host(self, num_rows):
+        """
+        Get views of the host staging arrays, after get() has sized the buffers.
+        
+        Returns:
+            tuple: Rows, scaled rows and mask array views
+        """
+        return self.rows_buffer[:num_rows], self.scaled_buffer[:num_rows], self.host_mask_buffer[:num_rows]
+    
+    def metrics(self):
+        """
+        Summary of buffer usage for job metrics.
+        """
+        return {
+            "allocations": self.allocations,
+            "reuses": self.reuses,
+        }
+
+class MemoryPolicy:
+    """
+    Releases memory only when usage crosses a configurable watermark.
+    
+    Replaces the unconditional gc.collect() and torch.cuda.empty_cache() that
+    used to run after every batch.
+    """
+    def __init__(self, watermark_mb, device):
+        self.watermark_mb = watermark_mb
+        self.device = device
+        self.batches = 0
+        self.collections = 0
+        self.peak_usage_mb = 0.0
+    
+    def current_usage_mb(self):
+        """
+        Memory currently in use: allocated CUDA memory on GPU, resident set size on CPU.
+        """
+        if self.device.type == "cuda":
+            return torch.cuda.memory_allocated(self.device) / (1024 * 1024)
+        
+        try:
+            with open("/proc/self/statm") as f:
+                resident_pages = int(f.read().split()[1])
+            return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+        except (OSError, ValueError, IndexError):
+            # Not on Linux, fall back to the peak resident set size
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    
+    def after_batch(self):
+        """
+        Record a finished batch and collect if the watermark has been crossed.
+        """
+        self.batches += 1
+        if self.watermark_mb <= 0:
+            return
+        
+        usage_mb = self.current_usage_mb()
+        self.peak_usage_mb = max(self.peak_usage_mb, usage_mb)
+        if usage_mb > self.watermark_mb:
+            gc.collect()
+            if self.device.type == "cuda":
+                torch.cuda.empty_cache()
+            self.collections += 1
+    
+    def metrics(self):
+        """
+        Summary of the policy for job metrics.
+        """
+        return {
+            "mode": "watermark" if self.watermark_mb > 0 else "disabled",
+            "watermark_mb": self.watermark_mb,
+            "batches": self.batches,
+            "collections": self.collections,
+            "peak_usage_mb": round(self.peak_usage_mb, 1),
+        }
@@ -0,0 +1,47 @@
+# Rough count of live float32 activations per row, per tensor family, at the
+# widest point of a forward pass (embeddings and encoders, FFN, attention scores)
+EMBEDDING_TENSORS = 16
+FEEDFORWARD_TENSORS = 2
+SCORE_TENSORS = 4
+
+# FeatureValueDependentEncoder always uses 4 heads, and FeatureCorrelationModule
+# keeps one F x F correlation matrix next to its mask matrix
+EXTRA_SCORE_HEADS = 4 + 1
+
+def estimate_row_bytes(num_features, d_model, num_heads, dim_feedforward, num_models=1):
+    """
+    Estimate the peak activation memory needed to impute one row.
+    
+    Args:
+        num_features (int): Number of features per row (the sequence length)
+        d_model (int): Model embedding dimension
+        num_heads (int): Attention heads in the transformer layers
+        dim_feedforward (int): Hidden size of the transformer feedforward blocks
+        num_models (int): Ensemble members evaluated at the same time
+        
+    Returns:
+        int: Estimated bytes per row
+    """
+    embedding_values = EMBEDDING_TENSORS * num_features * d_model
+    feedforward_values = FEEDFORWARD_TENSORS * num_features * dim_feedforward
+    score_values = SCORE_TENSORS * (num_heads + EXTRA_SCORE_HEADS) * num_features * num_features
+    return 4 * num_models * (embedding_values + feedforward_values + score_values)
+
+def choose_batch_size(num_features, d_model, num_heads, dim_feedforward, memory_budget_mb,
+                      num_models=1, min_batch_size=32, max_batch_size=8192):
+    """
+    Pick the largest power-of-two batch size whose activations fit the memory budget.
+    
+    The attention and correlation scores grow with batch x F^2, so wide feature
+    sets get smaller batches while narrow ones can use more of the matmul throughput.
+    
+    Returns:
+        int: Batch size between min_batch_size and max_batch_size
+    """
+    row_bytes = estimate_row_bytes(num_features, d_model, num_heads, dim_feedforward, num_models)
+    fitting_rows = int(memory_budget_mb * 1024 * 1024 // row_bytes)
+    
+    batch_size = min_batch_size
+    while batch_size * 2 <= min(fitting_rows, max_batch_size):
+        batch_size *= 2
+    return batch_size
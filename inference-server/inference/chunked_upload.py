@@ -0,0 +1,326 @@
+import hashlib
+import io
+import json
+import os
+import shutil
+import time
+
+# Bounds and default of the part size a client may choose, in bytes
+UPLOAD_MIN_PART_SIZE = 64 * 1024
+UPLOAD_MAX_PART_SIZE = 256 * 1024 * 1024
+UPLOAD_DEFAULT_PART_SIZE = 16 * 1024 * 1024
+
+# Seconds a job reading an upload in progress waits for its next part before failing
+UPLOAD_PART_TIMEOUT = float(os.environ.get("UPLOAD_PART_TIMEOUT", 300))
+
+# Rows per chunk when imputing an upload in progress and IMPUTATION_CHUNK_SIZE is unset
+UPLOAD_STREAM_CHUNK_SIZE = 65536
+
+# How often a job reading an upload in progress checks for new parts, in seconds
+UPLOAD_POLL_INTERVAL = 0.1
+
+# Seconds without a new part after which an upload is considered abandoned and removed
+UPLOAD_SESSION_TTL = float(os.environ.get("UPLOAD_SESSION_TTL", 24 * 3600))
+
+
+class UploadSession:
+    """
+    A resumable upload that arrives in numbered parts of a fixed size.
+
+    Everything lives in one directory, so the server and the job workers see
+    the same state:
+        session.json     filename, part size and whether to start early
+        <n>.part.json    size and SHA-256 of each part once it is verified
+        complete.json    total size and part count once the client completes
+        <filename>       the file itself; part n is written at offset (n - 1) * part_size
+
+    Parts can arrive in any order and be retried. Because every part lands at
+    its final offset, completing the upload does not copy anything.
+    """
+    def __init__(self, upload_dir):
+        self.upload_dir = upload_dir
+        with open(os.path.join(upload_dir, "session.json")) as f:
+            session = json.load(f)
+        self.filename = session["filename"]
+        self.part_size = session["part_size"]
+        self.start_early = session["start_early"]
+        self.data_path = os.path.join(upload_dir, self.filename)
+
+    @classmethod
+    def create(cls, upload_dir, filename, part_size=None, start_early=False):
+        """
+        Start a new upload.
+
+        Raises:
+            ValueError: For an empty filename or a part size out of bounds
+        """
+        filename = os.path.basename(filename or "")
+        if not filename or filename in ("session.json", "complete.json") or filename.endswith(".part.json"):
+            raise ValueError("A file name is required")
+        part_size = part_size or UPLOAD_DEFAULT_PART_SIZE
+        if not UPLOAD_MIN_PART_SIZE <= part_size <= UPLOAD_MAX_PART_SIZE:
+            raise ValueError(f"Part size must be between {UPLOAD_MIN_PART_SIZE} and {UPLOAD_MAX_PART_SIZE} bytes")
+
+        os.makedirs(upload_dir)
+        open(os.path.join(upload_dir, filename), "wb").close()
+        _write_json(os.path.join(upload_dir, "session.json"), {
+            "filename": filename,
+            "part_size": part_size,
+            "start_early": start_early,
+            "created_at": time.time(),
+        })
+        return cls(upload_dir)
+
+    @classmethod
+    def open(cls, upload_dir):
+        """The upload in a directory, or None when there is none"""
+        try:
+            return cls(upload_dir)
+        except FileNotFoundError:
+            return None
+
+    def _part_path(self, part_number):
+        return os.path.join(self.upload_dir, f"{part_number}.part.json")
+
+    def part(self, part_number):
+        """Size and SHA-256 of a received part, or None"""
+        try:
+            with open(self._part_path(part_number)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def received_parts(self):
+        """
+        Returns:
+            dict: Part number -> {"size", "sha256"} for every verified part
+        """
+        parts = {}
+        for name in os.listdir(self.upload_dir):
+            if name.endswith(".part.json"):
+                part_number = int(name.split(".", 1)[0])
+                info = self.part(part_number)
+                if info is not None:
+                    parts[part_number] = info
+        return dict(sorted(parts.items()))
+
+    def completion(self):
+        """Total size and part count once the upload is complete, or None"""
+        try:
+            with open(os.path.join(self.upload_dir, "complete.json")) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    async def write_part(self, part_number, chunks, sha256):
+        """
+        Write one part at its offset, hashing it as it arrives.
+
+        A part is only recorded once its SHA-256 matches, so a part cut off by
+        a dropped connection or corrupted in transit is simply sent again.
+        Sending a recorded part again with the same checksum is a no-op.
+
+        Args:
+            part_number (int): 1-based part number
+            chunks: Async iterator over the bytes of the part
+            sha256 (str): Hex SHA-256 of the part, as computed by the client
+
+        Returns:
+            dict: Size and SHA-256 of the part
+
+        Raises:
+            ValueError: For a completed upload, a bad part number, an oversized
+                part, a checksum mismatch, or a recorded part with other contents
+        """
+        sha256 = sha256.lower()
+        if self.completion() is not None:
+            raise ValueError("Upload is already complete")
+        if part_number < 1:
+            raise ValueError("Part numbers start at 1")
+        recorded = self.part(part_number)
+        if recorded is not None:
+            if recorded["sha256"] != sha256:
+                raise ValueError(f"Part {part_number} was already received with a different checksum")
+            return recorded
+
+        digest = hashlib.sha256()
+        offset = (part_number - 1) * self.part_size
+        size = 0
+        fd = os.open(self.data_path, os.O_WRONLY)
+        try:
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > self.part_size:
+                    raise ValueError(f"Part {part_number} is larger than the part size of {self.part_size} bytes")
+                digest.update(chunk)
+                os.pwrite(fd, chunk, offset)
+                offset += len(chunk)
+        finally:
+            os.close(fd)
+
+        if size == 0:
+            raise ValueError(f"Part {part_number} is empty")
+        if digest.hexdigest() != sha256:
+            raise ValueError(f"Checksum mismatch for part {part_number}, send it again")
+
+        info = {"size": size, "sha256": sha256}
+        _write_json(self._part_path(part_number), info)
+        return info
+
+    def complete(self, checksums):
+        """
+        Check that every part arrived and mark the upload complete.
+
+        Completing again with the same checksums returns the same result.
+
+        Args:
+            checksums (list): Hex SHA-256 of every part, in order
+
+        Returns:
+            dict: Total size and part count
+
+        Raises:
+            ValueError: When parts are missing, checksums differ, or a part
+                other than the last is short
+        """
+        checksums = [checksum.lower() for checksum in checksums]
+        completion = self.completion()
+        if completion is not None:
+            if completion["checksums"] != checksums:
+                raise ValueError("Upload was already completed with different parts")
+            return completion
+
+        if not checksums:
+            raise ValueError("At least one part is required")
+        parts = self.received_parts()
+        missing = [n for n in range(1, len(checksums) + 1) if n not in parts]
+        if missing:
+            raise ValueError(f"Parts not received: {', '.join(map(str, missing))}")
+        extra = [n for n in parts if n > len(checksums)]
+        if extra:
+            raise ValueError(f"Parts received beyond the last one: {', '.join(map(str, extra))}")
+        for n, checksum in enumerate(checksums, start=1):
+            if parts[n]["sha256"] != checksum:
+                raise ValueError(f"Checksum of part {n} does not match the part received")
+            if n < len(checksums) and parts[n]["size"] != self.part_size:
+                raise ValueError(f"Part {n} is shorter than the part size; only the last part may be")
+
+        total_size = (len(checksums) - 1) * self.part_size + parts[len(checksums)]["size"]
+        os.truncate(self.data_path, total_size)
+        completion = {"total_size": total_size, "parts": len(checksums), "checksums": checksums}
+        _write_json(os.path.join(self.upload_dir, "complete.json"), completion)
+        return completion
+
+    def header_received(self):
+        """Whether the first line of the file has fully arrived"""
+        if self.part(1) is None:
+            return False
+        with open(self.data_path, "rb") as f:
+            line = f.readline(self.part(1)["size"])
+        return line.endswith(b"\n") or self.completion() is not None
+
+    def last_activity(self):
+        """Time the session was last written to: created, sent a part or completed"""
+        return max(entry.stat().st_mtime for entry in os.scandir(self.upload_dir))
+
+    def remove(self):
+        shutil.rmtree(self.upload_dir, ignore_errors=True)
+
+
+def expired_uploads(upload_root, max_age=UPLOAD_SESSION_TTL):
+    """
+    Upload sessions under a directory that have not been written to for max_age seconds.
+
+    Returns:
+        list: (upload ID, UploadSession) pairs
+    """
+    cutoff = time.time() - max_age
+    expired = []
+    for entry in os.scandir(upload_root):
+        if not entry.is_dir():
+            continue
+        upload = UploadSession.open(entry.path)
+        try:
+            if upload is not None and upload.last_activity() < cutoff:
+                expired.append((entry.name, upload))
+        except FileNotFoundError:
+            # Removed while it was being checked
+            continue
+    return expired
+
+
+class UploadStream(io.RawIOBase):
+    """
+    Reads an upload from the start while its later parts are still arriving.
+
+    A read that reaches a part not received yet waits for it, so a reader can
+    parse the file in one pass as it arrives. The stream ends once the upload
+    is complete and every byte has been read.
+    """
+    def __init__(self, upload_dir, timeout=UPLOAD_PART_TIMEOUT):
+        """
+        Args:
+            upload_dir (str): Directory of the upload session
+            timeout (float): Seconds to wait for the next part before failing
+        """
+        super().__init__()
+        self.session = UploadSession(upload_dir)
+        self.timeout = timeout
+        self._fd = os.open(self.session.data_path, os.O_RDONLY)
+        self._position = 0
+        self._part_sizes = {}
+        self._total_size = None
+
+    def readable(self):
+        return True
+
+    def _readable_end(self):
+        """Offset up to which bytes can be read now, or None if the next part has not arrived"""
+        if self._total_size is None:
+            completion = self.session.completion()
+            if completion is not None:
+                self._total_size = completion["total_size"]
+        if self._total_size is not None:
+            return self._total_size
+
+        part_number = self._position // self.session.part_size + 1
+        if part_number not in self._part_sizes:
+            info = self.session.part(part_number)
+            if info is None:
+                return None
+            self._part_sizes[part_number] = info["size"]
+        end = (part_number - 1) * self.session.part_size + self._part_sizes[part_number]
+        # A short part is the last one; wait for completion to confirm the end of the file
+        return end if end > self._position else None
+
+    def readinto(self, buffer):
+        waiting_since = time.monotonic()
+        while True:
+            end = self._readable_end()
+            if end is not None:
+                count = min(len(buffer), end - self._position)
+                if count <= 0:
+                    return 0
+                data = os.pread(self._fd, count, self._position)
+                buffer[:len(data)] = data
+                self._position += len(data)
+                return len(data)
+
+            if not os.path.exists(self.session.upload_dir):
+                raise IOError("Upload was aborted")
+            if time.monotonic() - waiting_since > self.timeout:
+                raise TimeoutError(f"No new part of the upload arrived for {self.timeout:g} seconds")
+            time.sleep(UPLOAD_POLL_INTERVAL)
+
+    def close(self):
+        if not self.closed:
+            os.close(self._fd)
+        super().close()
+
+
+def _write_json(path, value):
+    """Write a JSON file atomically, so readers in other processes never see it half written"""
+    partial_path = f"{path}.tmp"
+    with open(partial_path, "w") as f:
+        json.dump(value, f)
+    os.replace(partial_path, path)
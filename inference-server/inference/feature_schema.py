@@ -0,0 +1,115 @@
+import csv
+
+# Cells read as missing in feature columns; other columns keep their text as is
+FEATURE_NA_VALUES = ["", "#N/A", "N/A", "NA", "NULL", "NaN", "nan", "null", "-NaN", "-nan", "n/a"]
+
+
+class FeatureSchema:
+    """
+    Model features, in training order, that input columns are matched against by name.
+
+    Every column is read as text without type inference; in feature columns
+    the FEATURE_NA_VALUES become missing. The model gets the features parsed
+    as float32, while the output keeps the text of every observed cell, so
+    only imputed cells change. The features may appear in any order and
+    position in the file.
+    """
+    def __init__(self, feature_names):
+        """
+        Args:
+            feature_names (list): Feature column names in training order
+        """
+        self.feature_names = list(feature_names)
+
+    @classmethod
+    def from_model(cls, config, scaler):
+        """
+        Build the schema from the checkpoint config's "feature_names", or else
+        the names the scaler was fitted with.
+
+        Returns:
+            FeatureSchema, or None when neither records the feature names
+        """
+        feature_names = config.get("feature_names")
+        if feature_names is None and hasattr(scaler, "feature_names_in_"):
+            feature_names = list(scaler.feature_names_in_)
+        if feature_names is None:
+            return None
+        return cls(feature_names)
+
+    def validate(self, columns):
+        """
+        Check that a file's columns contain every feature exactly once.
+
+        Args:
+            columns (list): Column names of the file
+
+        Raises:
+            ValueError: When features are missing or a column name repeats
+        """
+        seen = set()
+        duplicates = [name for name in columns if name in seen or seen.add(name)]
+        if duplicates:
+            raise ValueError(f"Duplicate columns in header: {', '.join(sorted(set(duplicates)))}")
+
+        missing = [name for name in self.feature_names if name not in seen]
+        if missing:
+            raise ValueError(
+                f"Header is missing {len(missing)} of {len(self.feature_names)} model features: {', '.join(missing)}"
+            )
+
+    def arrow_column_types(self, columns):
+        """Column types for pyarrow.csv: every column as text, missing values marked by null_missing"""
+        import pyarrow as pa
+        return {name: pa.string() for name in columns}
+
+    def null_missing(self, table):
+        """Turn the FEATURE_NA_VALUES of an Arrow table's feature columns into nulls"""
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        na_values = pa.array(FEATURE_NA_VALUES)
+        for name in self.feature_names:
+            index = table.schema.get_field_index(name)
+            column = table.column(index)
+            column = pc.if_else(pc.is_in(column, value_set=na_values), pa.scalar(None, pa.string()), column)
+            table = table.set_column(index, name, column)
+        return table
+
+
+
+def parse_feature_text(column):
+    """
+    Parse the text of a feature column as float32, missing cells as NaN.
+
+    Args:
+        column (pd.Series): Text cells, missing ones null
+
+    Returns:
+        np.ndarray: float32 values
+
+    Raises:
+        ValueError: For a cell that is not a number
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    array = pa.array(column, type=pa.string(), from_pandas=True)
+    try:
+        numbers = array.cast(pa.float32())
+    except pa.ArrowInvalid:
+        # The CSV readers accept padded numbers such as " 2"; a plain cast does not
+        numbers = pc.utf8_trim_whitespace(array).cast(pa.float32())
+    return numbers.to_numpy(zero_copy_only=False)
+
+
+def read_csv_header(path):
+    """
+    Read only the header row of a CSV file.
+
+    Raises:
+        ValueError: When the file is empty
+    """
+    with open(path, newline="") as f:
+        header = next(csv.reader(f), None)
+    if not header:
+        raise ValueError(f"{path} has no header row")
+    return header
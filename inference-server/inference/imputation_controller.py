@@ -1,35 +1,55 @@
 import os
 import time
+from inference.chunked_upload import UploadSession, UploadStream, UPLOAD_STREAM_CHUNK_SIZE
 from inference.imputation_service import ImputationService
+from inference.job_registry import job_registry
+from inference.micro_batcher import MicroBatcher, MICROBATCH_MAX_BATCH_SIZE, MICROBATCH_MAX_WAIT_MS
 
 imputation_service = ImputationService()
 
-def process_csv_file(input_file_path, output_file_path, job_id):
+# Coalesces synchronous row-imputation requests; runs in the server process
+micro_batcher = MicroBatcher(imputation_service, MICROBATCH_MAX_BATCH_SIZE, MICROBATCH_MAX_WAIT_MS)
+
+def process_file(input_file_path, output_file_path, job_id, upload_dir=None):
     """
-    Process a CSV file to impute missing values using the transformer model.
+    Process a CSV, Parquet or Arrow IPC file to impute missing values using the transformer model.
     This function is intended to be run in the background.
     
     Args:
-        input_file_path (str): Path to the input CSV file
-        output_file_path (str): Path where the imputed CSV should be saved
+        input_file_path (str): Path to the input file
+        output_file_path (str): Path where the imputed file should be saved, in the same format
         job_id (str): Unique identifier for this job
+        upload_dir (str): Session directory of a chunked upload whose later parts
+            are still arriving; the CSV is then imputed as the parts come in
     """
     try:
         # Log start of processing
         print(f"Starting processing job {job_id} for file {input_file_path}")
+        job_registry.mark_started(job_id)
         start_time = time.time()
         
         # Perform imputation
-        imputation_service.impute_csv(input_file_path, output_file_path)
+        if upload_dir is not None:
+            with UploadStream(upload_dir) as input_stream:
+                metrics = imputation_service.impute_file(
+                    input_file_path, output_file_path,
+                    chunk_size=imputation_service.chunk_size or UPLOAD_STREAM_CHUNK_SIZE,
+                    input_stream=input_stream
+                )
+        else:
+            metrics = imputation_service.impute_file(input_file_path, output_file_path)
         
         # Log completion
         end_time = time.time()
         processing_time = end_time - start_time
+        metrics["processing_time"] = processing_time
+        job_registry.mark_completed(job_id, metrics)
         print(f"Completed processing job {job_id} in {processing_time:.2f} seconds")
+        print(f"Job {job_id} metrics: {metrics}")
         
         # Clean up input file to save space
         try:
-            os.remove(input_file_path)
+            _remove_input(input_file_path)
             print(f"Deleted input file {input_file_path}")
         except Exception as e:
             print(f"Warning: Failed to delete input file {input_file_path}: {str(e)}")
@@ -37,14 +57,26 @@ def process_csv_file(input_file_path, output_file_path, job_id):
     except Exception as e:
         # Log any errors
         print(f"Error processing job {job_id}: {str(e)}")
+        job_registry.mark_failed(job_id, str(e))
         
         # Clean up any files if possible
-        for file_path in [input_file_path, output_file_path]:
-            if os.path.exists(file_path):
-                try:
-                    os.remove(file_path)
-                except Exception:
-                    pass
+        try:
+            _remove_input(input_file_path)
+        except Exception:
+            pass
+        if os.path.exists(output_file_path):
+            try:
+                os.remove(output_file_path)
+            except Exception:
+                pass
         
         # Re-raise the exception to be handled by the caller
-        raise
\ No newline at end of file
+        raise
+
+def _remove_input(input_file_path):
+    """Delete a job's input file, with its whole session directory when it came from a chunked upload"""
+    upload = UploadSession.open(os.path.dirname(input_file_path))
+    if upload is not None and upload.data_path == input_file_path:
+        upload.remove()
+    elif os.path.exists(input_file_path):
+        os.remove(input_file_path)
@@ -1,27 +1,50 @@
-from fastapi import APIRouter, UploadFile, File, BackgroundTasks, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, UploadFile, File, HTTPException, Request
+from fastapi.responses import FileResponse, StreamingResponse
+from pydantic import BaseModel
+from typing import List, Optional
+import asyncio
 import os
 import uuid
-from inference.imputation_controller import process_csv_file
+from urllib.parse import quote
+import numpy as np
+from datetime import datetime, timezone
+from inference.chunked_upload import UploadSession, expired_uploads
+from inference.imputation_controller import process_file, imputation_service, micro_batcher
+from inference.job_registry import job_registry, STATUS_PROCESSING, STATUS_COMPLETED, STATUS_FAILED
+from inference.job_scheduler import job_scheduler, QueueFullError
+from inference.result_files import StreamDecompressor, compression_of, iter_decompressed, result_path
+from inference.table_formats import detect_format, media_type
 
 router = APIRouter(tags=["Inference"])
 
 UPLOAD_DIR = "temp/uploads"
 RESULTS_DIR = "temp/results"
 
+# How often the progressive download checks for newly written chunks, in seconds
+STREAM_POLL_INTERVAL = 0.2
+
 #if no dirs
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 os.makedirs(RESULTS_DIR, exist_ok=True)
 
 @router.post("/impute/")
 async def impute_data(
-    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
 ):
     """
-    Upload a CSV file with missing values for imputation.
+    Upload a CSV, Parquet (.parquet, .pq) or Arrow IPC (.arrow, .feather, .ipc)
+    file with missing values for imputation; the result has the same format.
+    CSV results are stored compressed when RESULT_COMPRESSION is set.
     Returns a job ID that can be used to check status and download results.
+    Responds with 429 when the job queue is full.
     """
+    if not imputation_service.ready:
+        raise HTTPException(status_code=503, detail="Model is still warming up, try again shortly")
+    
+    # Reject early, before spending time on the upload
+    if not job_scheduler.has_capacity():
+        raise HTTPException(status_code=429, detail="Imputation queue is full, try again later")
+    
     # Generate a unique ID for this job
     job_id = str(uuid.uuid4())
     
@@ -36,14 +59,23 @@ async def impute_data(
             while chunk := await file.read(chunk_size):
                 f.write(chunk)
         
+        # In schema mode, reject a file whose columns do not match the model before queueing it
+        try:
+            imputation_service.validate_input(file_path)
+        except ValueError as e:
+            os.remove(file_path)
+            raise HTTPException(status_code=422, detail=str(e))
+        
         # Process the file in the background
-        output_path = os.path.join(RESULTS_DIR, f"{job_id}_imputed_{file.filename}")
-        background_tasks.add_task(
-            process_csv_file,
-            file_path,
-            output_path,
-            job_id
-        )
+        output_path = _output_path(job_id, file.filename, file_path)
+        job_registry.create_job(job_id, file.filename, file_path, output_path)
+        try:
+            job_scheduler.submit(job_id, process_file, file_path, output_path, job_id)
+        except QueueFullError:
+            # The queue filled up while the file was uploading
+            job_registry.delete_job(job_id)
+            os.remove(file_path)
+            raise HTTPException(status_code=429, detail="Imputation queue is full, try again later")
         
         return {
             "job_id": job_id,
@@ -51,65 +83,414 @@ async def impute_data(
             "status": "processing"
         }
     
+    except HTTPException:
+        raise
     except Exception as e:
         # Clean up if there's an error
         if os.path.exists(file_path):
             os.remove(file_path)
         raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
 
+class InitiateUploadRequest(BaseModel):
+    filename: str
+    # Bytes per part; every part but the last must have exactly this size
+    part_size: Optional[int] = None
+    # Impute CSV rows as parts arrive instead of after completion (needs CSV schema mode)
+    start_early: bool = False
+
+class CompleteUploadRequest(BaseModel):
+    # Hex SHA-256 of every part, in order
+    parts: List[str]
+
+def _get_upload(upload_id):
+    upload = UploadSession.open(os.path.join(UPLOAD_DIR, os.path.basename(upload_id)))
+    if upload is None:
+        raise HTTPException(status_code=404, detail=f"Upload {upload_id} not found")
+    return upload
+
+def _output_path(job_id, filename, input_path):
+    """Result path of a job, compressed for CSV inputs when RESULT_COMPRESSION is set"""
+    output_path = os.path.join(RESULTS_DIR, f"{job_id}_imputed_{filename}")
+    if detect_format(input_path) == "csv":
+        output_path = result_path(output_path, imputation_service.result_compression)
+    return output_path
+
+def _can_start_early(upload):
+    """Whether the rows of an upload can be imputed before all its parts have arrived"""
+    return (upload.start_early and detect_format(upload.data_path) == "csv"
+            and imputation_service.feature_schema is not None)
+
+def _remove_expired_uploads():
+    """Remove the sessions of uploads abandoned for UPLOAD_SESSION_TTL, unless a job is still reading them"""
+    for upload_id, upload in expired_uploads(UPLOAD_DIR):
+        job = job_registry.get_job(upload_id)
+        if job is not None and job["status"] == STATUS_PROCESSING:
+            continue
+        upload.remove()
+        print(f"Removed abandoned upload {upload_id}")
+
+@router.post("/impute/uploads/")
+async def initiate_upload(request: InitiateUploadRequest):
+    """
+    Start a resumable upload, sent in parts with PUT /impute/uploads/{upload_id}/parts/{n}
+    and finished with POST /impute/uploads/{upload_id}/complete.
+    
+    The upload ID is also the ID of the imputation job. With start_early, a CSV
+    upload is imputed as its parts arrive, once the first part is in, when
+    CSV schema mode is on; otherwise the job starts on completion. The session
+    is removed once its job finishes, and an upload without a new part for
+    UPLOAD_SESSION_TTL seconds is removed when the next upload starts.
+    """
+    if not imputation_service.ready:
+        raise HTTPException(status_code=503, detail="Model is still warming up, try again shortly")
+    
+    if not job_scheduler.has_capacity():
+        raise HTTPException(status_code=429, detail="Imputation queue is full, try again later")
+    
+    _remove_expired_uploads()
+    
+    upload_id = str(uuid.uuid4())
+    try:
+        upload = UploadSession.create(
+            os.path.join(UPLOAD_DIR, upload_id), request.filename, request.part_size, request.start_early
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    
+    return {
+        "upload_id": upload_id,
+        "part_size": upload.part_size,
+        "start_early": _can_start_early(upload),
+    }
+
+@router.get("/impute/uploads/{upload_id}")
+async def upload_status(upload_id: str):
+    """
+    List the parts received so far, so an interrupted upload can resume with the missing ones.
+    """
+    upload = _get_upload(upload_id)
+    job = job_registry.get_job(upload_id)
+    
+    return {
+        "upload_id": upload_id,
+        "filename": upload.filename,
+        "part_size": upload.part_size,
+        "parts": [{"part_number": n, **info} for n, info in upload.received_parts().items()],
+        "completed": upload.completion() is not None,
+        "job_status": job["status"] if job is not None else None,
+    }
+
+@router.put("/impute/uploads/{upload_id}/parts/{part_number}")
+async def upload_part(upload_id: str, part_number: int, request: Request):
+    """
+    Upload one part as the raw request body, with its hex SHA-256 in the
+    X-Checksum-SHA256 header. A part whose checksum does not match is
+    rejected with 422 and can be sent again.
+    """
+    upload = _get_upload(upload_id)
+    checksum = request.headers.get("x-checksum-sha256")
+    if not checksum:
+        raise HTTPException(status_code=422, detail="The X-Checksum-SHA256 header is required")
+    
+    try:
+        info = await upload.write_part(part_number, request.stream(), checksum)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    
+    job_status = None
+    if _can_start_early(upload) and job_registry.get_job(upload_id) is None and upload.header_received():
+        job_status = _start_job(upload_id, upload, early=True)
+    
+    return {"upload_id": upload_id, "part_number": part_number, **info, "job_status": job_status}
+
+@router.post("/impute/uploads/{upload_id}/complete")
+async def complete_upload(upload_id: str, request: CompleteUploadRequest):
+    """
+    Finish an upload once every part is in, and start imputing it if it has not started yet.
+    Returns the job ID, which is the upload ID.
+    """
+    upload = _get_upload(upload_id)
+    
+    try:
+        completion = upload.complete(request.parts)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    
+    job = job_registry.get_job(upload_id)
+    status = job["status"] if job is not None else _start_job(upload_id, upload, early=False)
+    
+    return {
+        "job_id": upload_id,
+        "size": completion["total_size"],
+        "status": status,
+    }
+
+def _start_job(upload_id, upload, early):
+    """
+    Queue the imputation of an upload, checking its header against the model first.
+    
+    Returns:
+        str: Job status, or None when an early start was deferred to completion
+    """
+    try:
+        imputation_service.validate_input(upload.data_path)
+    except ValueError as e:
+        upload.remove()
+        raise HTTPException(status_code=422, detail=str(e))
+    
+    output_path = _output_path(upload_id, upload.filename, upload.data_path)
+    job_registry.create_job(upload_id, upload.filename, upload.data_path, output_path)
+    try:
+        job_scheduler.submit(
+            upload_id, process_file, upload.data_path, output_path, upload_id,
+            upload.upload_dir if early else None
+        )
+    except QueueFullError:
+        job_registry.delete_job(upload_id)
+        if early:
+            # The job will be queued again when the upload completes
+            return None
+        raise HTTPException(status_code=429, detail="Imputation queue is full, complete the upload again later")
+    
+    return STATUS_PROCESSING
+
+@router.delete("/impute/uploads/{upload_id}")
+async def abort_upload(upload_id: str):
+    """
+    Abort an upload and discard its parts. A job reading it fails.
+    """
+    upload = _get_upload(upload_id)
+    upload.remove()
+    return {"upload_id": upload_id, "message": "Upload aborted"}
+
+def _timestamp(value):
+    """Format a registry timestamp for API responses"""
+    if value is None:
+        return None
+    return datetime.fromtimestamp(value, tz=timezone.utc).isoformat()
+
+class RowImputationRequest(BaseModel):
+    # Each record lists the model features in training order, null where missing
+    records: List[List[Optional[float]]]
+
+@router.post("/impute/rows/")
+async def impute_rows(request: RowImputationRequest):
+    """
+    Impute a few records synchronously and return them with missing values filled in.
+    Concurrent requests are coalesced into a single model forward pass, so a
+    request holds at most MICROBATCH_MAX_BATCH_SIZE records. Records with no
+    observed value are rejected with 422, as there is nothing to impute from.
+    """
+    if not request.records:
+        raise HTTPException(status_code=422, detail="At least one record is required")
+    
+    # One request must fit in a single forward pass, so it cannot hold up the others
+    if len(request.records) > micro_batcher.max_batch_size:
+        raise HTTPException(
+            status_code=422,
+            detail=f"{len(request.records)} records sent, at most {micro_batcher.max_batch_size} are accepted per request"
+        )
+    
+    if not imputation_service.ready:
+        raise HTTPException(status_code=503, detail="Model is still warming up, try again shortly")
+    
+    for i, record in enumerate(request.records):
+        if len(record) != imputation_service.num_features:
+            raise HTTPException(
+                status_code=422,
+                detail=f"Record {i} has {len(record)} values, expected {imputation_service.num_features}"
+            )
+        if all(v is None for v in record):
+            raise HTTPException(status_code=422, detail=f"Record {i} has no observed values")
+    
+    rows = np.array([[np.nan if v is None else v for v in record] for record in request.records], dtype=np.float64)
+    imputed = await micro_batcher.submit(rows)
+    
+    return {
+        "records": imputed.tolist(),
+        "missing_values": int(np.isnan(rows).sum())
+    }
+
+@router.get("/impute/rows/stats/")
+async def row_imputation_stats():
+    """
+    Latency percentiles and batch fill statistics of the row imputation micro-batcher.
+    """
+    return micro_batcher.stats()
+
+@router.get("/impute/cache/stats/")
+async def result_cache_stats():
+    """
+    Size, hit rates and evictions of the result cache, across every job worker.
+    """
+    if imputation_service.result_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **imputation_service.result_cache.stats()}
+
 @router.get("/impute/{job_id}/status/")
 async def check_imputation_status(job_id: str):
     """
     Check the status of an imputation job.
     """
-    result_file = None
-    for filename in os.listdir(RESULTS_DIR):
-        if filename.startswith(f"{job_id}_imputed_"):
-            result_file = filename
-            break
+    job = job_registry.get_job(job_id)
     
-    if result_file:
-        return {
-            "job_id": job_id,
-            "status": "completed",
-            "result_file": result_file
-        }
-        
-    input_file = None
-    for filename in os.listdir(UPLOAD_DIR):
-        if filename.startswith(f"{job_id}_"):
-            input_file = filename
-            break
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
     
-    if input_file:
-        return {
-            "job_id": job_id,
-            "status": "processing"
-        }
-        
-    raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    response = {
+        "job_id": job_id,
+        "status": job["status"],
+        "created_at": _timestamp(job["created_at"]),
+        "started_at": _timestamp(job["started_at"]),
+        "finished_at": _timestamp(job["finished_at"]),
+    }
+    
+    if job["status"] == STATUS_PROCESSING:
+        queue_status = job_scheduler.queue_status(job_id)
+        if queue_status is not None:
+            response.update(queue_status)
+    elif job["status"] == STATUS_COMPLETED:
+        response["result_file"] = os.path.basename(job["output_path"])
+        response["rows"] = job["rows"]
+    elif job["status"] == STATUS_FAILED:
+        response["error"] = job["error"]
+    
+    return response
+
+def _accepts_encoding(accept_encoding, encoding):
+    """Whether an Accept-Encoding header allows a content coding"""
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        if coding.strip().lower() not in (encoding, "*"):
+            continue
+        quality = params.strip()
+        if quality.startswith("q="):
+            try:
+                return float(quality[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
+
+def _content_disposition(filename):
+    return f"attachment; filename*=utf-8''{quote(filename)}"
 
 @router.get("/impute/{job_id}/download")
-async def download_imputed_data(job_id: str):
+async def download_imputed_data(job_id: str, request: Request):
     """
     Download the imputed data file once processing is complete.
+    
+    A compressed result is sent as stored, with a matching Content-Encoding,
+    to clients that accept that encoding, and decompressed on the fly for the
+    others. Range requests are supported on the stored bytes, so interrupted
+    downloads can be resumed.
     """
-    # Look for result file
-    result_file = None
-    for filename in os.listdir(RESULTS_DIR):
-        if filename.startswith(f"{job_id}_imputed_"):
-            result_file = filename
-            break
+    job = job_registry.get_job(job_id)
     
-    if not result_file:
+    if job is None or job["status"] != STATUS_COMPLETED or not os.path.exists(job["output_path"]):
         raise HTTPException(status_code=404, detail=f"Results for job {job_id} not found")
     
-    file_path = os.path.join(RESULTS_DIR, result_file)
+    output_path = job["output_path"]
+    encoding = compression_of(output_path)
+    headers = {}
+    if encoding is not None:
+        headers["Vary"] = "Accept-Encoding"
+        if not _accepts_encoding(request.headers.get("accept-encoding", ""), encoding):
+            headers["Content-Disposition"] = _content_disposition(job["filename"])
+            return StreamingResponse(
+                iter_decompressed(output_path, encoding), media_type=media_type(output_path), headers=headers
+            )
+        headers["Content-Encoding"] = encoding
     
     return FileResponse(
-        path=file_path,
-        filename=result_file.replace(f"{job_id}_imputed_", ""),
-        media_type="text/csv"
+        path=output_path,
+        filename=job["filename"],
+        media_type=media_type(output_path),
+        headers=headers
+    )
+
+async def _follow_result(job_id, output_path, read_size=1024 * 1024):
+    """
+    Yield the bytes of a result file as they are written, until the job finishes.
+    
+    The streaming paths write to a .part file that is renamed once complete;
+    the open handle keeps reading the same file across the rename.
+    """
+    partial_path = f"{output_path}.part"
+    result_file = None
+    try:
+        while result_file is None:
+            job = job_registry.get_job(job_id)
+            if job is None or job["status"] == STATUS_FAILED:
+                return
+            for path in (partial_path, output_path):
+                try:
+                    result_file = open(path, "rb")
+                    break
+                except FileNotFoundError:
+                    continue
+            if result_file is None:
+                if job["status"] == STATUS_COMPLETED:
+                    return
+                await asyncio.sleep(STREAM_POLL_INTERVAL)
+        
+        while True:
+            data = result_file.read(read_size)
+            if data:
+                yield data
+                continue
+            job = job_registry.get_job(job_id)
+            if job is None or job["status"] == STATUS_FAILED:
+                return
+            if job["status"] == STATUS_COMPLETED:
+                # Everything was written before the job was marked completed
+                while data := result_file.read(read_size):
+                    yield data
+                return
+            await asyncio.sleep(STREAM_POLL_INTERVAL)
+    finally:
+        if result_file is not None:
+            result_file.close()
+
+async def _follow_decompressed(job_id, output_path, encoding):
+    """Yield the plain bytes of a compressed result file as it is written"""
+    decompressor = StreamDecompressor(encoding)
+    async for data in _follow_result(job_id, output_path):
+        if data := decompressor.decompress(data):
+            yield data
+
+@router.get("/impute/{job_id}/stream")
+async def stream_imputed_data(job_id: str, request: Request):
+    """
+    Download the imputed data while the job is still running.
+    
+    Chunks are sent as soon as they are written, and the response ends when
+    the job completes. As with the download, a compressed result is sent as
+    stored, with its Content-Encoding, to clients that accept that encoding,
+    and decompressed on the fly for the others. If the job fails, the response
+    ends early, so the client should check the job status afterwards.
+    """
+    job = job_registry.get_job(job_id)
+    
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    if job["status"] == STATUS_FAILED:
+        raise HTTPException(status_code=409, detail=f"Job {job_id} failed: {job['error']}")
+    
+    output_path = job["output_path"]
+    headers = {"Content-Disposition": _content_disposition(job["filename"])}
+    encoding = compression_of(output_path)
+    if encoding is not None:
+        headers["Vary"] = "Accept-Encoding"
+        if not _accepts_encoding(request.headers.get("accept-encoding", ""), encoding):
+            return StreamingResponse(
+                _follow_decompressed(job_id, output_path, encoding), media_type=media_type(output_path),
+                headers=headers
+            )
+        headers["Content-Encoding"] = encoding
+    
+    return StreamingResponse(
+        _follow_result(job_id, output_path), media_type=media_type(output_path), headers=headers
     )
     
 @router.delete("/impute/{job_id}")
@@ -117,25 +498,27 @@ async def delete_job_files(job_id: str):
     """
     Delete job files to free up space.
     """
+    job = job_registry.get_job(job_id)
+    
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"No files found for job {job_id}")
+    
     deleted_files = []
     
-    for filename in os.listdir(UPLOAD_DIR):
-        if filename.startswith(f"{job_id}_"):
-            file_path = os.path.join(UPLOAD_DIR, filename)
-            os.remove(file_path)
-            deleted_files.append(filename)
-            
-    for filename in os.listdir(RESULTS_DIR):
-        if filename.startswith(f"{job_id}_imputed_"):
-            file_path = os.path.join(RESULTS_DIR, filename)
+    for file_path in [job["input_path"], job["output_path"]]:
+        if os.path.exists(file_path):
             os.remove(file_path)
-            deleted_files.append(filename)
+            deleted_files.append(os.path.basename(file_path))
     
-    if not deleted_files:
-        raise HTTPException(status_code=404, detail=f"No files found for job {job_id}")
+    # Parts and session files of a chunked upload
+    upload = UploadSession.open(os.path.join(UPLOAD_DIR, os.path.basename(job_id)))
+    if upload is not None:
+        upload.remove()
+    
+    job_registry.delete_job(job_id)
     
     return {
         "job_id": job_id,
         "deleted_files": deleted_files,
         "message": "Job files deleted successfully"
-    }
\ No newline at end of file
+    }
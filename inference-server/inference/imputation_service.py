@@ -1,9 +1,20 @@
+import hashlib
+import json
 import os
+import time
+import numpy as np
 import pandas as pd
 import torch
 import pickle
 from torch.utils.data import DataLoader, TensorDataset
-import gc
+from inference.backends import INFERENCE_BACKENDS
+from inference.batch_memory import BatchBuffers, MemoryPolicy
+from inference.batch_tuner import choose_batch_size
+from inference.feature_schema import FeatureSchema, parse_feature_text, read_csv_header
+from inference.missingness_patterns import PatternStats, group_by_pattern
+from inference.result_cache import ResultCache
+from inference.result_files import ResultWriter, check_compression, compression_of, pandas_compression
+from inference.table_formats import TableReader, detect_format, numeric_columns, table_numeric_block, table_write_back
 
 class ImputationService:
     def __init__(self):
@@ -13,15 +24,96 @@ class ImputationService:
         """
         self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
         self.model = None
+        self.backend = None
         self.scaler = None
+        # Whether the scaler transforms in place (ScalerParams) or returns copies (sklearn)
+        self.scaler_in_place = False
+        self.config = None
+        self.num_features = None
+        self.ready = False
         
         # Paths to model and scaler files - adjust as needed
         self.model_path = os.environ.get("MODEL_PATH", "models/tabular_transformer_relpos.pth")
         self.scaler_path = os.environ.get("SCALER_PATH", "models/scaler.pkl")
         
+        # Rows per chunk when streaming CSVs; 0 loads the whole file at once
+        self.chunk_size = int(os.environ.get("IMPUTATION_CHUNK_SIZE", 0))
+        
+        # Memory usage above which the batch loop collects garbage; 0 never collects
+        self.gc_watermark_mb = float(os.environ.get("IMPUTATION_GC_WATERMARK_MB", 4096))
+        
+        # Activation memory the batch size is tuned against
+        self.memory_budget_mb = float(os.environ.get("IMPUTATION_MEMORY_BUDGET_MB", 1024))
+        
+        # Attention implementation: "reference" (step by step) or "sdpa" (fused kernel)
+        self.attention_backend = os.environ.get("ATTENTION_BACKEND", "reference")
+        
+        # Match CSV columns to the model features by name and parse them as float32 with pyarrow
+        self.csv_schema_mode = os.environ.get("CSV_SCHEMA_MODE", "0") == "1"
+        self.feature_schema = None
+        
+        # Compression of CSV results: "none", "gzip" or "zstd" (needs the zstandard package)
+        self.result_compression = os.environ.get("RESULT_COMPRESSION", "none")
+        
+        # Rows a missingness pattern needs to be imputed in its own batches; 0 disables grouping
+        self.pattern_min_rows = int(os.environ.get("IMPUTATION_PATTERN_MIN_ROWS", 64))
+        
+        # Entries of the LRU cache for mask-only tensors of pattern batches; 0 disables the cache.
+        # It only applies to shared [1, F] masks and is not reliably faster on CPU; see MaskPatternCache
+        self.mask_cache_size = int(os.environ.get("MASK_CACHE_SIZE", 0))
+        self.mask_cache = None
+        
+        # Disk space for cached results, keyed by input content and model; 0 disables the cache
+        self.result_cache_mb = float(os.environ.get("RESULT_CACHE_SIZE_MB", 0))
+        
+        # Directory of the result cache, shared by the server and the job workers
+        self.result_cache_dir = os.environ.get("RESULT_CACHE_DIR", "temp/cache")
+        
+        # Rows per cached block; appending rows to a file reuses every complete block before them
+        self.result_cache_block_rows = int(os.environ.get("RESULT_CACHE_BLOCK_ROWS", 10000))
+        self.result_cache = None
+        
+        # Scale and unscale as float32 tensor ops on the model device (torch backend only)
+        self.scaler_in_graph = os.environ.get("SCALER_IN_GRAPH", "0") == "1"
+        
+        # Runtime that executes the model: "torch" or "onnxruntime" (CPU, needs an exported .onnx)
+        self.inference_backend = os.environ.get("INFERENCE_BACKEND", "torch")
+        if self.inference_backend not in INFERENCE_BACKENDS:
+            raise ValueError(
+                f"Unknown INFERENCE_BACKEND {self.inference_backend!r}; expected one of {', '.join(INFERENCE_BACKENDS)}"
+            )
+        
+        # Load the TorchScript artifact exported next to the checkpoint when its hash matches
+        self.use_compiled_model = os.environ.get("USE_COMPILED_MODEL", "1") == "1"
+        
+        # Reduced-precision inference: "none", "int8" (dynamic, CPU only) or "bf16"
+        self.quantization = os.environ.get("QUANTIZATION_MODE", "none")
+        
+        # Largest NRMSE against float32 on the held-out sample that still activates the quantized model
+        self.quantization_max_nrmse = float(os.environ.get("QUANTIZATION_MAX_NRMSE", 0.05))
+        
+        # CSV of real held-out rows for the accuracy gate; required when quantization is on
+        self.quantization_sample_path = os.environ.get("QUANTIZATION_SAMPLE_PATH")
+        if self.quantization != "none" and not self.quantization_sample_path:
+            raise ValueError(f"QUANTIZATION_MODE={self.quantization} requires QUANTIZATION_SAMPLE_PATH, "
+                             "a CSV of real rows for the accuracy gate")
+        self.quantization_report = None
+        
+        # Batch sizes run once at startup so the first real request is not the slow one
+        self.warmup_batch_sizes = [
+            int(size) for size in os.environ.get("WARMUP_BATCH_SIZES", "1,8,64").split(",") if size.strip()
+        ]
+        
         print(f"ImputationService initialized. Using device: {self.device}")
         print(f"Model path: {self.model_path}")
         print(f"Scaler path: {self.scaler_path}")
+        print(f"CSV chunk size: {self.chunk_size or 'whole file'}")
+        print(f"GC watermark: {self.gc_watermark_mb or 'disabled'} MB")
+        print(f"Memory budget: {self.memory_budget_mb} MB")
+        print(f"Inference backend: {self.inference_backend}")
+        print(f"Attention backend: {self.attention_backend}")
+        print(f"Quantization: {self.quantization}")
+        print(f"Result compression: {self.result_compression}")
     
     def _load_model(self):
         """
@@ -30,48 +122,37 @@ class ImputationService:
         try:
             print("Loading model and scaler...")
             
-            # Load the model
-            checkpoint = torch.load(self.model_path, map_location=self.device)
+            # Fail at startup rather than at the end of the first job
+            check_compression(self.result_compression)
             
-            # Determine which model class to use based on the saved configuration
-            if checkpoint.get("model_type") == "ensemble":
-                from models.transformer_model import EnsembleModel
-                
-                # Create an instance of the ensemble model
-                config = checkpoint["config"]
-                num_features = config.get("num_features", 39)  # Default to 39 if not stored
-                
-                self.model = EnsembleModel(
-                    num_features=num_features,
-                    config=config,
-                    num_models=3  # Default ensemble size from the notebook
-                ).to(self.device)
+            if self.inference_backend == "onnxruntime":
+                onnx_backend = self._load_onnx_backend()
+                model_type = onnx_backend.model_type
             else:
-                # Default to single model
-                from models.transformer_model import TabularTransformerWithRelPos
-                
-                # Create an instance of the transformer model
-                config = checkpoint["config"]
-                num_features = config.get("num_features", 39)  # Default to 39 if not stored
-                
-                self.model = TabularTransformerWithRelPos(
-                    num_features=num_features,
-                    d_model=config["d_model"],
-                    nhead=config["num_heads"],
-                    num_layers=config["num_layers"],
-                    dim_feedforward=config["dim_feedforward"],
-                    dropout=config["dropout"],
-                    activation=config["activation"],
-                    max_seq_len=max(2 * num_features, 100)
-                ).to(self.device)
-            
-            # Load the model weights
-            self.model.load_state_dict(checkpoint["model_state_dict"])
-            self.model.eval()
-            
-            # Load the scaler
-            with open(self.scaler_path, 'rb') as f:
-                self.scaler = pickle.load(f)
+                model_type = self._load_torch_model()
+            
+            self.num_features = self.config.get("num_features", 39)  # Default to 39 if not stored
+            
+            self._load_scaler()
+            
+            if self.csv_schema_mode:
+                self._load_feature_schema()
+            
+            # The backend is only set once everything it needs has loaded
+            if self.inference_backend == "torch":
+                backend = self._build_torch_backend(model_type)
+            elif self.inference_backend == "onnxruntime":
+                if self.quantization != "none":
+                    print("Quantization applies to the torch backend only; ONNX Runtime runs the exported float32 model")
+                if self.scaler_in_graph:
+                    print("In-graph scaling applies to the torch backend only; ONNX Runtime gets scaled values")
+                backend = onnx_backend
+            else:
+                raise ValueError(f"Unknown inference backend: {self.inference_backend}")
+            self.backend = backend
+            
+            if self.result_cache_mb > 0:
+                self._load_result_cache()
             
             print("Model and scaler loaded successfully")
             
@@ -79,147 +160,1021 @@ class ImputationService:
             print(f"Error loading model: {str(e)}")
             raise
     
+    def _build_torch_backend(self, model_type):
+        """
+        Quantize and attach the mask cache to the loaded PyTorch model, then wrap it in a backend.
+        
+        Args:
+            model_type (str): The checkpoint's model type
+            
+        Returns:
+            TorchBackend: Backend running self.model
+        """
+        # The accuracy gate needs the scaler to build its sample
+        if self.quantization != "none":
+            self._quantize_model()
+        
+        if self.mask_cache_size > 0 and not isinstance(self.model, torch.jit.ScriptModule):
+            from models.mask_cache import MaskPatternCache
+            from models.transformer_model import set_mask_cache
+            self.mask_cache = MaskPatternCache(self.mask_cache_size)
+            set_mask_cache(self.model, self.mask_cache)
+            print(f"Mask pattern cache enabled with {self.mask_cache_size} entries")
+        
+        from inference.backends import TorchBackend
+        tensor_scaler = None
+        if self.scaler_in_graph:
+            from models.scaler_params import TensorScaler
+            tensor_scaler = TensorScaler(self.scaler).to(self.device)
+            print("Scaling runs in the graph as float32 tensor ops")
+        return TorchBackend(self.model, tensor_scaler)
+    
+    def _load_scaler(self):
+        """
+        Load the scaler parameters exported next to the checkpoint, or else unpickle the scaler.
+        
+        The exported .npz is read without unpickling anything. A pickled
+        scaler of a supported type is converted to the same parameters, which
+        transform exactly like it without sklearn's validation on every batch,
+        and the parameters are exported next to the checkpoint so later loads
+        skip the unpickle.
+        """
+        from models.export import file_sha256
+        from models.scaler_params import ScalerParams, load_scaler_params, scaler_params_path
+        
+        params = load_scaler_params(self.model_path, self.scaler_path)
+        if params is not None:
+            self.scaler = params
+            self.scaler_in_place = True
+            print(f"Loaded scaler parameters from {params.path}")
+            return
+        
+        params_path = scaler_params_path(self.model_path)
+        print(f"No usable scaler parameters at {params_path}; unpickling the scaler from {self.scaler_path}")
+        with open(self.scaler_path, 'rb') as f:
+            scaler = pickle.load(f)
+        try:
+            self.scaler = ScalerParams.from_sklearn(scaler, file_sha256(self.scaler_path))
+            self.scaler_in_place = True
+        except ValueError as e:
+            if self.scaler_in_graph:
+                raise ValueError(f"In-graph scaling needs the scaler's parameters: {e}") from e
+            print(f"Using the sklearn scaler as is: {e}")
+            self.scaler = scaler
+            self.scaler_in_place = False
+            return
+        
+        # Write to a temporary name first, so a job worker never loads a partial file
+        partial_path = f"{params_path}.{os.getpid()}.part"
+        try:
+            self.scaler.save(partial_path)
+            os.replace(partial_path, params_path)
+        except OSError as e:
+            print(f"Could not export the scaler parameters to {params_path}: {e}")
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            return
+        # The result cache fingerprints the scaler by this file from now on
+        self.scaler.path = params_path
+        print(f"Exported the scaler parameters to {params_path}")
+    
+    def _load_feature_schema(self):
+        """
+        Take the feature names for schema mode from the checkpoint config or the scaler.
+        
+        Raises:
+            ValueError: When neither records the feature names, or their count
+                does not match the model
+        """
+        self.feature_schema = FeatureSchema.from_model(self.config, self.scaler)
+        if self.feature_schema is None:
+            raise ValueError(
+                "CSV_SCHEMA_MODE=1 needs the feature names, but neither the checkpoint config "
+                "(\"feature_names\") nor the scaler (feature_names_in_) records them"
+            )
+        if len(self.feature_schema.feature_names) != self.num_features:
+            raise ValueError(
+                f"Schema has {len(self.feature_schema.feature_names)} feature names, "
+                f"but the model expects {self.num_features} features"
+            )
+        print(f"CSV schema mode enabled for {self.num_features} features")
+    
+    def _load_result_cache(self):
+        """
+        Open the result cache under a fingerprint of everything besides the input that decides the results.
+        """
+        from models.export import file_sha256, onnx_path
+        
+        model_files = [self.model_path, onnx_path(self.model_path)] if self.inference_backend == "onnxruntime" \
+            else [self.model_path]
+        fingerprint = {
+            "model": [file_sha256(path) for path in model_files if os.path.exists(path)],
+            "scaler": file_sha256(getattr(self.scaler, "path", None) or self.scaler_path),
+            "scaler_in_graph": self.scaler_in_graph,
+            "inference_backend": self.inference_backend,
+            "use_compiled_model": self.use_compiled_model,
+            "quantization": self.quantization,
+            "quantization_active": bool(self.quantization_report and self.quantization_report["active"]),
+            "attention_backend": self.attention_backend,
+            "mask_cache": self.mask_cache is not None,
+            "pattern_min_rows": self.pattern_min_rows,
+            "result_cache_block_rows": self.result_cache_block_rows,
+            "csv_schema_mode": self.feature_schema is not None,
+            "device": str(self.device),
+        }
+        fingerprint = hashlib.sha256(json.dumps(fingerprint, sort_keys=True).encode()).hexdigest()
+        self.result_cache = ResultCache(self.result_cache_dir, int(self.result_cache_mb * 1024 * 1024), fingerprint)
+        print(f"Result cache enabled in {self.result_cache_dir} with {self.result_cache_mb:g} MB")
+    
+    def _load_torch_model(self):
+        """
+        Load the PyTorch model, preferring a compiled artifact exported from this exact checkpoint.
+        
+        Returns:
+            The checkpoint's model type
+        """
+        compiled = None
+        if self.use_compiled_model and self.quantization == "none":
+            from models.export import load_torchscript
+            compiled = load_torchscript(self.model_path, self.device, self.attention_backend)
+        
+        if compiled is not None:
+            self.model, metadata = compiled
+            self.config = metadata["config"]
+            print(f"Loaded compiled model {metadata['path']} (torch {metadata['torch_version']})")
+            return metadata["model_type"]
+        
+        # Load the model
+        checkpoint = torch.load(self.model_path, map_location=self.device)
+        self.config = checkpoint["config"]
+        
+        # Build only the weights inference uses, straight from the checkpoint
+        from models.inference_graph import build_inference_model
+        self.model, report = build_inference_model(checkpoint, self.device)
+        print(f"Pruned {report['pruned_parameters']} unused parameters "
+              f"({report['saved_mb']:.1f} MB), model built in {report['build_seconds']:.2f} seconds")
+        
+        from models.transformer_model import set_attention_backend
+        set_attention_backend(self.model, self.attention_backend)
+        return checkpoint.get("model_type")
+    
+    def _load_onnx_backend(self):
+        """
+        Load the ONNX model exported next to the checkpoint into an ONNX Runtime backend.
+        
+        The checkpoint itself is optional, so a worker can ship with only the
+        ONNX file; when it is present, the export must come from it.
+        
+        Returns:
+            OnnxRuntimeBackend: The backend, not yet set as self.backend
+        """
+        from inference.backends import OnnxRuntimeBackend
+        from models.export import file_sha256, onnx_path
+        
+        path = onnx_path(self.model_path)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No ONNX model at {path}; export it with python -m models.export --format onnx")
+        
+        backend = OnnxRuntimeBackend(path)
+        if os.path.exists(self.model_path) and backend.source_sha256 != file_sha256(self.model_path):
+            raise ValueError(f"ONNX model {path} is stale: checkpoint hash does not match")
+        
+        self.config = backend.config
+        print(f"Loaded ONNX model {path} for ONNX Runtime ({backend.num_threads} threads)")
+        return backend
+    
+    def _quantize_model(self):
+        """
+        Swap in a reduced-precision copy of the model if it passes the accuracy gate.
+        
+        The candidate is compared against the float32 model on a held-out sample;
+        above QUANTIZATION_MAX_NRMSE the float32 model stays active.
+        """
+        from models.quantization import accuracy_gate, quantize_model
+        
+        if self.quantization == "int8" and self.device.type != "cpu":
+            print("INT8 dynamic quantization only runs on CPU; keeping float32")
+            return
+        
+        start_time = time.time()
+        values, mask = self._quantization_sample()
+        candidate = quantize_model(self.model, self.quantization)
+        error = accuracy_gate(self.model, candidate, values, mask)
+        active = error <= self.quantization_max_nrmse
+        
+        self.quantization_report = {
+            "mode": self.quantization,
+            "nrmse": error,
+            "max_nrmse": self.quantization_max_nrmse,
+            "sample_rows": values.size(0),
+            "active": active,
+        }
+        if active:
+            self.model = candidate
+            print(f"{self.quantization} model activated: NRMSE {error:.4f} vs float32 "
+                  f"(gate checked in {time.time() - start_time:.2f} seconds)")
+        else:
+            print(f"{self.quantization} model rejected: NRMSE {error:.4f} vs float32 is above "
+                  f"{self.quantization_max_nrmse}; keeping float32")
+    
+    def _quantization_sample(self, num_rows=512):
+        """
+        Build the held-out sample for the quantization accuracy gate from the
+        first rows of QUANTIZATION_SAMPLE_PATH, read the way job inputs are.
+        
+        Returns:
+            Tuple of scaled input tensor and missing mask, prepared the same way
+            as in _impute_batch, with a fifth of the observed values masked out
+            
+        Raises:
+            ValueError: When the sample does not have the model's features
+        """
+        rng = np.random.default_rng(0)
+        if self.feature_schema is not None:
+            columns = read_csv_header(self.quantization_sample_path)
+            self.feature_schema.validate(columns)
+            df = next(self._read_csv_chunks_with_schema(self.quantization_sample_path, columns, num_rows))
+            numerical_cols = pd.Index(self.feature_schema.feature_names)
+        else:
+            df = pd.read_csv(self.quantization_sample_path, nrows=num_rows)
+            numerical_cols = df.select_dtypes(include=['number']).columns
+        rows, _ = self._numeric_block(df, numerical_cols)
+        if rows.shape[1] != self.num_features:
+            raise ValueError(f"Quantization sample {self.quantization_sample_path} has {rows.shape[1]} "
+                             f"numerical columns, expected {self.num_features}")
+        
+        # Rows with nothing observed have nothing to compare
+        rows = rows[~np.isnan(rows).all(axis=1)]
+        missing = np.isnan(rows) | (rng.random(rows.shape) < 0.2)
+        scaled = self.scaler.transform(np.where(missing, 0.0, rows))
+        values = torch.from_numpy(scaled).float().to(self.device)
+        mask = torch.from_numpy(missing).to(self.device)
+        return values, mask
+    
+    def warm_up(self):
+        """
+        Load the model and scaler and run dummy batches through the full pipeline.
+        
+        Besides paying for torch.load and the scaler unpickle up front, this lets
+        the allocator and kernels settle at the batch sizes the server will use.
+        The service reports ready only once this has finished.
+        """
+        self._ensure_model_loaded()
+        
+        start_time = time.time()
+        batch_sizes = sorted(set(self.warmup_batch_sizes + [self._auto_batch_size()]))
+        buffers = BatchBuffers(max(batch_sizes), self.device)
+        memory_policy = MemoryPolicy(0, self.device)
+        rng = np.random.default_rng(0)
+        
+        for batch_size in batch_sizes:
+            # Plausible rows in the original scale, with about a fifth of the values missing
+            rows = self.scaler.inverse_transform(rng.standard_normal((batch_size, self.num_features)))
+            rows[rng.random(rows.shape) < 0.2] = np.nan
+            self.impute_rows(rows, buffers, memory_policy)
+        
+        self.ready = True
+        print(f"Model warmed up at batch sizes {batch_sizes} in {time.time() - start_time:.2f} seconds")
+    
     def _ensure_model_loaded(self):
         """
         Ensure the model and scaler are loaded.
         """
-        if self.model is None or self.scaler is None:
+        if self.backend is None or self.scaler is None:
             self._load_model()
     
-    def impute_csv(self, input_file_path, output_file_path, batch_size=128):
+    def _auto_batch_size(self):
+        """
+        Pick a batch size for the loaded model from its shape and the memory budget.
+        """
+        return choose_batch_size(
+            num_features=self.num_features,
+            d_model=self.config["d_model"],
+            num_heads=self.config["num_heads"],
+            dim_feedforward=self.config["dim_feedforward"],
+            memory_budget_mb=self.memory_budget_mb
+        )
+    
+    def validate_input(self, input_file_path):
+        """
+        Check the columns of an input file against the feature schema without parsing its rows.
+        
+        Only the CSV header or the Parquet/Arrow schema is read, so a malformed
+        file is rejected before any work is queued. Does nothing when schema
+        mode is off.
+        
+        Raises:
+            ValueError: When features are missing or a column name repeats
+        """
+        self._ensure_model_loaded()
+        if self.feature_schema is None:
+            return
+        
+        file_format = detect_format(input_file_path)
+        if file_format == "csv":
+            columns = read_csv_header(input_file_path)
+        else:
+            reader = TableReader(input_file_path, file_format)
+            columns = reader.schema.names
+            reader.close()
+        self.feature_schema.validate(columns)
+    
+    def impute_file(self, input_file_path, output_file_path, batch_size=None, chunk_size=None, input_stream=None):
+        """
+        Impute missing values in a CSV, Parquet or Arrow IPC file.
+        
+        The format is taken from the file extension (see inference.table_formats)
+        and the output is written in the same format.
+        
+        Args:
+            input_file_path (str): Path to the input file
+            output_file_path (str): Path where the imputed file should be saved
+            batch_size (int): Rows per model forward pass; tuned automatically by default
+            chunk_size (int): Rows per chunk when streaming CSVs; Parquet and Arrow
+                files are always processed one row group or record batch at a time
+            input_stream: Binary file object to read a CSV from while it is still
+                being written; see impute_csv
+                
+        Returns:
+            dict: Job metrics
+        """
+        file_format = detect_format(input_file_path)
+        
+        # The result cache is opened with the model
+        self._ensure_model_loaded()
+        
+        # An identical input with the same model and settings was imputed before
+        cache_key = None
+        if self.result_cache is not None and input_stream is None:
+            result_cache_before = self.result_cache.metrics()
+            cache_key = self.result_cache.file_key(
+                input_file_path,
+                format=file_format,
+                compression=compression_of(output_file_path),
+                chunk_size=(self.chunk_size if chunk_size is None else chunk_size) if file_format == "csv" else None,
+                batch_size=batch_size or self._auto_batch_size(),
+            )
+            cached_metrics = self.result_cache.fetch_file(cache_key, output_file_path)
+            if cached_metrics is not None:
+                print(f"Served {output_file_path} from the result cache")
+                cached_metrics["result_cache"] = self.result_cache.metrics(since=result_cache_before)
+                return cached_metrics
+        
+        if file_format == "csv":
+            metrics = self.impute_csv(input_file_path, output_file_path, batch_size, chunk_size, input_stream)
+        else:
+            def impute(batch_size, buffers, memory_policy, pattern_stats):
+                return self._impute_table_file(
+                    input_file_path, output_file_path, file_format, batch_size, buffers, memory_policy, pattern_stats
+                )
+            metrics = self._run_job(impute, batch_size)
+        
+        if cache_key is not None:
+            metrics["result_cache"] = self.result_cache.metrics(since=result_cache_before)
+            self.result_cache.store_file(cache_key, output_file_path, metrics)
+        return metrics
+    
+    def impute_csv(self, input_file_path, output_file_path, batch_size=None, chunk_size=None, input_stream=None):
         """
         Impute missing values in a CSV file using the trained transformer model.
         
         Args:
             input_file_path (str): Path to the input CSV file
             output_file_path (str): Path where the imputed CSV should be saved
-            batch_size (int): Batch size for processing large files
+            batch_size (int): Rows per model forward pass. Defaults to a size tuned
+                to the model shape and IMPUTATION_MEMORY_BUDGET_MB.
+            chunk_size (int): Number of rows to read per chunk in streaming mode.
+                Defaults to IMPUTATION_CHUNK_SIZE; 0 reads the whole file at once.
+            input_stream: Binary file object the rows are read from instead of the
+                input path, for a file that is still arriving. It is parsed in one
+                pass, so schema mode is required; the header is still read from
+                the input path.
+                
+        Returns:
+            dict: Job metrics, including the memory policy that was applied
+        """
+        if chunk_size is None:
+            chunk_size = self.chunk_size
+        
+        def impute(batch_size, buffers, memory_policy, pattern_stats):
+            if input_stream is not None or (chunk_size and chunk_size > 0):
+                return self._impute_csv_streaming(
+                    input_file_path, output_file_path, batch_size, chunk_size, buffers, memory_policy, pattern_stats,
+                    input_stream
+                )
+            return self._impute_csv_whole(
+                input_file_path, output_file_path, batch_size, buffers, memory_policy, pattern_stats
+            )
+        return self._run_job(impute, batch_size)
+    
+    def _run_job(self, impute, batch_size=None):
+        """
+        Set up the per-job batch state, run an imputation and collect its metrics.
+        
+        Args:
+            impute (callable): Called with (batch_size, buffers, memory_policy,
+                pattern_stats); returns the format-specific metrics
+            batch_size (int): Rows per model forward pass; tuned automatically by default
+            
+        Returns:
+            dict: Job metrics, including the memory policy that was applied
         """
         try:
             # Ensure the model is loaded
             self._ensure_model_loaded()
             
-            # Load the CSV file
-            print(f"Loading CSV file from {input_file_path}...")
-            df_original = pd.read_csv(input_file_path, index_col=None)
-            print(f"Loaded CSV with shape: {df_original.shape}")
+            batch_size_mode = "fixed"
+            if batch_size is None:
+                batch_size = self._auto_batch_size()
+                batch_size_mode = "auto"
+            print(f"Using batch size {batch_size} ({batch_size_mode})")
             
-            # Check for missing values
-            missing_count = df_original.isna().sum().sum()
-            missing_percentage = (missing_count / (df_original.shape[0] * df_original.shape[1])) * 100
-            print(f"Dataset contains {missing_count} missing values ({missing_percentage:.2f}% of all values)")
+            # Buffers and memory policy are per job, so concurrent jobs never share them
+            buffers = BatchBuffers(batch_size, self.device)
+            memory_policy = MemoryPolicy(self.gc_watermark_mb, self.device)
+            pattern_stats = PatternStats(self.pattern_min_rows)
+            mask_cache_before = self.mask_cache.metrics() if self.mask_cache is not None else None
+            result_cache_before = self.result_cache.metrics() if self.result_cache is not None else None
             
-            # Create a copy for imputation
-            df_imputed = df_original.copy()
+            metrics = impute(batch_size, buffers, memory_policy, pattern_stats)
             
-            # Process in batches if the dataset is large
-            if len(df_original) > batch_size:
-                print(f"Processing large dataset in batches of {batch_size}...")
-                
-                # Process each numerical column
-                numerical_cols = df_original.select_dtypes(include=['number']).columns
-                
-                # Get indices of rows with missing values
-                rows_with_missing = df_original[numerical_cols].isna().any(axis=1)
-                rows_to_process = rows_with_missing[rows_with_missing].index
-                
-                if len(rows_to_process) == 0:
-                    print("No missing values found in numerical columns")
-                    df_original.to_csv(output_file_path)
-                    return
-                
-                # Process in batches
-                for i in range(0, len(rows_to_process), batch_size):
-                    batch_indices = rows_to_process[i:i+batch_size]
-                    print(f"Processing batch {i//batch_size + 1} with {len(batch_indices)} rows")
+            metrics["batch_size"] = batch_size
+            metrics["batch_size_mode"] = batch_size_mode
+            metrics["buffers"] = buffers.metrics()
+            metrics["memory_policy"] = memory_policy.metrics()
+            metrics["patterns"] = pattern_stats.metrics()
+            if self.mask_cache is not None:
+                metrics["mask_cache"] = self.mask_cache.metrics(since=mask_cache_before)
+            if self.result_cache is not None:
+                metrics["result_cache"] = self.result_cache.metrics(since=result_cache_before)
+            if self.quantization_report is not None:
+                metrics["quantization"] = dict(self.quantization_report)
+            print(f"Memory policy: {metrics['memory_policy']}")
+            print(f"Missingness patterns: {metrics['patterns']}")
+            if self.mask_cache is not None:
+                print(f"Mask pattern cache: {metrics['mask_cache']}")
+            if self.result_cache is not None:
+                print(f"Result cache: {metrics['result_cache']}")
+            
+            return metrics
+            
+        except Exception as e:
+            print(f"Error during imputation: {str(e)}")
+            raise
+    
+    def impute_rows(self, rows, buffers, memory_policy):
+        """
+        Impute missing values in a block of rows already in memory.
+        
+        Args:
+            rows (np.ndarray): Rows of model features, NaN where values are missing
+            buffers (BatchBuffers): Buffers reused across calls
+            memory_policy (MemoryPolicy): Decides when memory is released
+            
+        Returns:
+            np.ndarray: A float64 copy of the rows with missing values imputed
+        """
+        self._ensure_model_loaded()
+        
+        values = np.array(rows, dtype=np.float64)
+        if values.ndim != 2 or values.shape[1] != self.num_features:
+            raise ValueError(f"Expected rows of {self.num_features} features, got shape {values.shape}")
+        
+        missing = np.isnan(values)
+        rows_to_process = np.flatnonzero(missing.any(axis=1))
+        if len(rows_to_process) > 0:
+            self._impute_batch(values, missing, rows_to_process, buffers, memory_policy)
+        
+        return values
+    
+    def _impute_csv_whole(self, input_file_path, output_file_path, batch_size, buffers, memory_policy, pattern_stats):
+        """
+        Impute a CSV file that is loaded into memory in one piece.
+        """
+        # Load the CSV file
+        print(f"Loading CSV file from {input_file_path}...")
+        numerical_cols = None
+        if self.feature_schema is not None:
+            df_original = self._read_csv_with_schema(input_file_path)
+            numerical_cols = pd.Index(self.feature_schema.feature_names)
+        else:
+            df_original = pd.read_csv(input_file_path, index_col=None)
+        print(f"Loaded CSV with shape: {df_original.shape}")
+        
+        # Check for missing values
+        missing_count = df_original.isna().sum().sum()
+        missing_percentage = (missing_count / (df_original.shape[0] * df_original.shape[1])) * 100
+        print(f"Dataset contains {missing_count} missing values ({missing_percentage:.2f}% of all values)")
+        
+        df_imputed, numerical_cols = self._impute_frame(
+            df_original, batch_size, buffers, memory_policy, pattern_stats, numerical_cols
+        )
+        
+        # Save the imputed dataset
+        print(f"Saving imputed dataset to {output_file_path}...")
+        df_imputed.to_csv(output_file_path, compression=pandas_compression(output_file_path))
+        
+        # Verification
+        missing_after = df_imputed[numerical_cols].isna().sum().sum()
+        print(f"Missing values in numerical columns after imputation: {missing_after}")
+        
+        return {
+            "rows": len(df_original),
+            "missing_values": int(missing_count),
+            "missing_after": int(missing_after),
+        }
+    
+    def _impute_csv_streaming(self, input_file_path, output_file_path, batch_size, chunk_size, buffers, memory_policy,
+                              pattern_stats, input_stream=None):
+        """
+        Impute a CSV file chunk by chunk so memory stays bounded by the chunk size.
+        
+        Rows are grouped into exactly the same batches as the whole-file path
+        without pattern grouping: the rows of a chunk's last, incomplete batch
+        are carried over and prepended to the next chunk. Pattern grouping is
+        off here, whatever IMPUTATION_PATTERN_MIN_ROWS says: which patterns are
+        frequent is only known for the whole file, and grouping per chunk gives
+        batches, and so float32 results, that differ from the whole-file path.
+        The output is written to
+        a temporary file and only moved into place once every chunk has been
+        appended, so a partial result is never visible. A compressed output is
+        written as a single gzip member or zstd frame, flushed after every chunk.
+        """
+        print(f"Streaming CSV file from {input_file_path} in chunks of {chunk_size} rows...")
+        
+        if self.feature_schema is not None:
+            # Schema mode: the dtypes are known, so the file is parsed only once
+            columns = read_csv_header(input_file_path)
+            self.feature_schema.validate(columns)
+            numerical_cols = pd.Index(self.feature_schema.feature_names)
+        elif input_stream is not None:
+            raise ValueError("Imputing a file while it arrives requires CSV schema mode")
+        else:
+            # Parse every chunk with the dtypes the whole file would have produced
+            csv_dtypes = self._resolve_csv_dtypes(input_file_path, chunk_size)
+            numerical_cols = None
+        
+        partial_path = f"{output_file_path}.part"
+        rows_read = 0
+        missing_before = 0
+        missing_after = 0
+        batch_number = 0
+        header = True
+        pending = None
+        
+        try:
+            with ResultWriter(partial_path, compression_of(output_file_path)) as output_file:
+                if numerical_cols is not None:
+                    reader = self._read_csv_chunks_with_schema(
+                        input_stream if input_stream is not None else input_file_path, columns, chunk_size
+                    )
+                else:
+                    reader = pd.read_csv(input_file_path, index_col=None, chunksize=chunk_size, dtype=csv_dtypes)
+                chunk_number = 0
+                next_chunk = next(reader, None)
+                while next_chunk is not None:
+                    chunk = next_chunk
+                    chunk_number += 1
+                    # Read one chunk ahead to know whether this one is the last
+                    next_chunk = next(reader, None)
+                    is_last_chunk = next_chunk is None
                     
-                    # Get batch data
-                    batch_df = df_original.loc[batch_indices, numerical_cols]
+                    print(f"Processing chunk {chunk_number} with {len(chunk)} rows")
+                    rows_read += len(chunk)
+                    missing_before += chunk.isna().sum().sum()
+                    chunk_cols = numerical_cols if numerical_cols is not None else (
+                        chunk.select_dtypes(include=['number']).columns
+                    )
+                    pattern_stats.count_fully_observed(int(chunk[chunk_cols].notna().all(axis=1).sum()))
                     
-                    # Create mask for missing values (1 where missing, 0 otherwise)
-                    mask = batch_df.isna().astype(int)
+                    if pending is not None:
+                        chunk = pd.concat([pending, chunk])
+                        pending = None
                     
-                    # Fill missing with zeros for processing
-                    batch_df_filled = batch_df.fillna(0)
+                    values, missing = self._numeric_block(chunk, chunk_cols)
+                    rows_to_process = np.flatnonzero(missing.any(axis=1))
                     
-                    # Scale the data
-                    batch_data_scaled = self.scaler.transform(batch_df_filled)
+                    # Hold back an incomplete trailing batch until the next chunk arrives
+                    ready_count = len(rows_to_process)
+                    if not is_last_chunk:
+                        ready_count -= ready_count % batch_size
                     
-                    # Convert to tensors
-                    batch_tensor = torch.tensor(batch_data_scaled, dtype=torch.float32).to(self.device)
-                    mask_tensor = torch.tensor(mask.values, dtype=torch.int).to(self.device)
-                    column_indices = torch.arange(batch_tensor.shape[1]).to(self.device)
+                    batch_number = self._impute_by_pattern(
+                        values, missing, rows_to_process[:ready_count], batch_size,
+                        buffers, memory_policy, pattern_stats, batch_number, group_patterns=False
+                    )
                     
-                    # Perform imputation
-                    with torch.no_grad():
-                        imputed_tensor = self.model(batch_tensor, column_indices, mask_tensor)
-                        
-                    # Convert back to numpy and original scale
-                    imputed_np = imputed_tensor.cpu().numpy()
-                    imputed_np = self.scaler.inverse_transform(imputed_np)
+                    df_imputed = self._write_back(chunk, values, missing, chunk_cols)
                     
-                    # Create DataFrame with imputed values
-                    imputed_batch_df = pd.DataFrame(imputed_np, columns=numerical_cols, index=batch_indices)
+                    if ready_count < len(rows_to_process):
+                        split_at = rows_to_process[ready_count]
+                        pending = chunk.iloc[split_at:]
+                        df_imputed = df_imputed.iloc[:split_at]
                     
-                    # Update only the missing values in the original
-                    for col in numerical_cols:
-                        missing_mask = mask[col] == 1
-                        if missing_mask.any():
-                            df_imputed.loc[batch_indices[missing_mask], col] = imputed_batch_df.loc[batch_indices[missing_mask], col]
+                    # Append the finished rows, writing the header only once
+                    output_file.write(df_imputed.to_csv(header=header))
+                    header = False
                     
-                    # Clear GPU memory
-                    del batch_tensor, mask_tensor, imputed_tensor
-                    torch.cuda.empty_cache() if torch.cuda.is_available() else None
-                    gc.collect()
+                    missing_after += df_imputed[chunk_cols].isna().sum().sum()
             
-            else:
-                # Process the entire dataset at once
-                print("Processing entire dataset at once...")
-                
-                # Process each numerical column
-                numerical_cols = df_original.select_dtypes(include=['number']).columns
-                
-                # Create mask for missing values (1 where missing, 0 otherwise)
-                mask = df_original[numerical_cols].isna().astype(int)
-                
-                # Fill missing with zeros for processing
-                df_filled = df_original[numerical_cols].fillna(0)
-                
-                # Scale the data
-                data_scaled = self.scaler.transform(df_filled)
-                
-                # Convert to tensors
-                data_tensor = torch.tensor(data_scaled, dtype=torch.float32).to(self.device)
-                mask_tensor = torch.tensor(mask.values, dtype=torch.int).to(self.device)
-                column_indices = torch.arange(data_tensor.shape[1]).to(self.device)
-                
-                # Perform imputation
-                with torch.no_grad():
-                    imputed_tensor = self.model(data_tensor, column_indices, mask_tensor)
+            os.replace(partial_path, output_file_path)
+        except Exception:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            raise
+        
+        print(f"Streamed {rows_read} rows containing {missing_before} missing values to {output_file_path}")
+        print(f"Missing values in numerical columns after imputation: {missing_after}")
+        
+        return {
+            "rows": rows_read,
+            "missing_values": int(missing_before),
+            "missing_after": int(missing_after),
+            "chunk_size": chunk_size,
+        }
+    
+    def _impute_table_file(self, input_file_path, output_file_path, file_format, batch_size, buffers, memory_policy,
+                           pattern_stats):
+        """
+        Impute a Parquet or Arrow IPC file one row group or record batch at a time.
+        
+        Columns are read straight into the numerical block without going through
+        pandas, and the output keeps the input's schema: every column keeps its
+        type and each block becomes one row group or record batch of the
+        output. Like the streaming CSV path, the output only appears once
+        complete.
+        """
+        print(f"Reading {file_format} file from {input_file_path}...")
+        reader = TableReader(input_file_path, file_format)
+        if self.feature_schema is not None:
+            self.feature_schema.validate(reader.schema.names)
+            numerical_cols = self.feature_schema.feature_names
+        else:
+            numerical_cols = numeric_columns(reader.schema)
+        print(f"{reader.num_blocks} blocks with {len(numerical_cols)} numerical columns")
+        
+        partial_path = f"{output_file_path}.part"
+        rows_read = 0
+        missing_before = 0
+        missing_after = 0
+        batch_number = 0
+        
+        try:
+            with reader.open_writer(partial_path, reader.schema) as writer:
+                for block in range(reader.num_blocks):
+                    table = reader.read_block(block)
+                    print(f"Processing block {block + 1} with {table.num_rows} rows")
+                    rows_read += table.num_rows
                     
-                # Convert back to numpy and original scale
-                imputed_np = imputed_tensor.cpu().numpy()
-                imputed_np = self.scaler.inverse_transform(imputed_np)
-                
-                # Create DataFrame with imputed values
-                imputed_df_nums = pd.DataFrame(imputed_np, columns=numerical_cols, index=df_original.index)
-                
-                # Update only the missing values in the original
-                for col in numerical_cols:
-                    missing_mask = mask[col] == 1
-                    if missing_mask.any():
-                        df_imputed.loc[missing_mask, col] = imputed_df_nums.loc[missing_mask, col]
+                    values, missing = table_numeric_block(table, numerical_cols)
+                    missing_before += int(missing.sum())
+                    rows_to_process = np.flatnonzero(missing.any(axis=1))
+                    pattern_stats.count_fully_observed(table.num_rows - len(rows_to_process))
+                    
+                    batch_number = self._impute_by_pattern(
+                        values, missing, rows_to_process, batch_size,
+                        buffers, memory_policy, pattern_stats, batch_number, whole_input=reader.num_blocks == 1
+                    )
+                    missing_after += int(np.isnan(values).sum())
+                    
+                    table = table_write_back(table, values, missing, numerical_cols)
+                    if file_format == "parquet":
+                        writer.write_table(table, row_group_size=max(table.num_rows, 1))
+                    else:
+                        writer.write_table(table)
+            
+            os.replace(partial_path, output_file_path)
+        except Exception:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            raise
+        finally:
+            reader.close()
+        
+        print(f"Imputed {rows_read} rows containing {missing_before} missing values to {output_file_path}")
+        print(f"Missing values in numerical columns after imputation: {missing_after}")
+        
+        return {
+            "rows": rows_read,
+            "missing_values": missing_before,
+            "missing_after": missing_after,
+            "format": file_format,
+        }
+    
+    def _resolve_csv_dtypes(self, input_file_path, chunk_size):
+        """
+        Scan the CSV once, chunk by chunk, and merge the inferred column dtypes.
+        
+        Without this, a chunk where an integer column happens to have no missing
+        values would be written as "5" instead of the "5.0" the whole-file path
+        produces, so the streamed output would not match byte for byte.
+        
+        Returns:
+            dict: Column dtypes for the whole file
+        """
+        resolved = {}
+        for chunk in pd.read_csv(input_file_path, index_col=None, chunksize=chunk_size):
+            for col, dtype in chunk.dtypes.items():
+                if col not in resolved or resolved[col] == dtype:
+                    resolved[col] = dtype
+                elif (pd.api.types.is_numeric_dtype(resolved[col]) and pd.api.types.is_numeric_dtype(dtype)
+                      and not pd.api.types.is_bool_dtype(resolved[col]) and not pd.api.types.is_bool_dtype(dtype)):
+                    resolved[col] = np.result_type(resolved[col], dtype)
+                else:
+                    resolved[col] = object
+        return resolved
+    
+    def _read_csv_with_schema(self, input_file_path):
+        """
+        Parse a CSV with pyarrow, using the feature schema instead of type inference.
+        
+        The header is validated before any row is parsed. Every column is read
+        as text; only the NA values of feature columns become missing. The
+        features are parsed as float32 for the model in _numeric_block, and
+        observed cells are written back exactly as they came in.
+        """
+        import pyarrow.csv as pa_csv
+        
+        columns = read_csv_header(input_file_path)
+        self.feature_schema.validate(columns)
+        
+        table = pa_csv.read_csv(
+            input_file_path,
+            convert_options=pa_csv.ConvertOptions(
+                column_types=self.feature_schema.arrow_column_types(columns),
+                strings_can_be_null=False,
+            ),
+        )
+        return self.feature_schema.null_missing(table).to_pandas()
+    
+    def _read_csv_chunks_with_schema(self, source, columns, chunk_size):
+        """
+        Parse a CSV with pyarrow's streaming reader in chunks of chunk_size rows.
+        
+        Cells are read exactly like _read_csv_with_schema does. The index
+        continues across chunks, as with pd.read_csv(chunksize=...). A file
+        with only a header gives one empty chunk.
+        
+        Args:
+            source: Path or binary file object of the CSV, header included
+            columns (list): Column names from the already validated header
+            chunk_size (int): Rows per chunk; the last chunk may be shorter
             
-            # Save the imputed dataset
-            print(f"Saving imputed dataset to {output_file_path}...")
-            df_imputed.to_csv(output_file_path)
+        Yields:
+            pd.DataFrame: The next chunk, feature columns null where missing
+        """
+        import pyarrow as pa
+        import pyarrow.csv as pa_csv
+        
+        reader = pa_csv.open_csv(
+            source,
+            convert_options=pa_csv.ConvertOptions(
+                column_types=self.feature_schema.arrow_column_types(columns),
+                strings_can_be_null=False,
+            ),
+        )
+        
+        def to_frame(table, start):
+            df = self.feature_schema.null_missing(table).to_pandas()
+            df.index = pd.RangeIndex(start, start + len(df))
+            return df
+        
+        # Record batches follow the reader's block size, so rows are regrouped into chunks
+        pending = reader.schema.empty_table()
+        rows_yielded = 0
+        for batch in reader:
+            pending = pa.concat_tables([pending, pa.Table.from_batches([batch])])
+            while pending.num_rows >= chunk_size:
+                yield to_frame(pending.slice(0, chunk_size), rows_yielded)
+                pending = pending.slice(chunk_size)
+                rows_yielded += chunk_size
+        if pending.num_rows > 0 or rows_yielded == 0:
+            yield to_frame(pending, rows_yielded)
+    
+    def _impute_frame(self, df_original, batch_size, buffers, memory_policy, pattern_stats, numerical_cols=None):
+        """
+        Impute the missing numerical values of a DataFrame.
+        
+        Args:
+            df_original (pd.DataFrame): Data with missing values
+            batch_size (int): Rows per model forward pass
+            buffers (BatchBuffers): Buffers reused across batches
+            memory_policy (MemoryPolicy): Decides when memory is released
+            pattern_stats (PatternStats): Counts how rows were routed
+            numerical_cols (pd.Index): Feature columns in training order; all
+                numerical columns, in file order, by default
             
-            # Verification
-            missing_after = df_imputed[numerical_cols].isna().sum().sum()
-            print(f"Missing values in numerical columns after imputation: {missing_after}")
+        Returns:
+            tuple: The imputed DataFrame and the numerical columns that were imputed
+        """
+        # Process each numerical column
+        if numerical_cols is None:
+            numerical_cols = df_original.select_dtypes(include=['number']).columns
+        values, missing = self._numeric_block(df_original, numerical_cols)
+        
+        # Get positions of rows with missing values
+        rows_to_process = np.flatnonzero(missing.any(axis=1))
+        pattern_stats.count_fully_observed(len(df_original) - len(rows_to_process))
+        
+        if len(rows_to_process) == 0:
+            print("No missing values found in numerical columns")
+            return df_original.copy(), numerical_cols
+        
+        # Process in batches; fully observed rows never reach the model
+        print(f"Processing {len(rows_to_process)} rows with missing values in batches of {batch_size}...")
+        self._impute_by_pattern(values, missing, rows_to_process, batch_size, buffers, memory_policy, pattern_stats,
+                                whole_input=True)
+        
+        return self._write_back(df_original, values, missing, numerical_cols), numerical_cols
+    
+    def _impute_by_pattern(self, values, missing, rows_to_process, batch_size, buffers, memory_policy, pattern_stats,
+                           batch_number=0, whole_input=False, group_patterns=True):
+        """
+        Impute rows in batches, giving frequent missingness patterns batches of their own.
+        
+        Rows of a pattern with at least pattern_min_rows rows are imputed in
+        pattern-homogeneous batches that pass the mask once as [1, num_features];
+        the other rows go through mixed batches in row order.
+        
+        With the result cache enabled, the rows are imputed in blocks of
+        result_cache_block_rows rows of values, whatever the chunk size. A block
+        imputed before, with the same values, mask and batch size, takes its
+        imputed values from the cache instead of running the model, so when rows
+        are appended to a file every complete block before them is reused.
+        
+        Args:
+            whole_input (bool): Whether values holds the whole input file. If it
+                also fits in one block, the file entry of the cache covers it and
+                no block entry is kept.
+            group_patterns (bool): Whether frequent patterns get batches of their
+                own; when False every row goes through mixed batches in row order
+        
+        Returns:
+            int: The number of the last batch processed, for continuous logging
+        """
+        block_rows = self.result_cache_block_rows
+        if self.result_cache is None or (whole_input and len(values) <= block_rows):
+            return self._impute_rows_by_pattern(
+                values, missing, rows_to_process, batch_size, buffers, memory_policy, pattern_stats, batch_number,
+                group_patterns
+            )
+        
+        # Split at fixed row ranges of values, which do not move when rows are appended
+        bounds = np.searchsorted(rows_to_process, np.arange(block_rows, len(values), block_rows))
+        for block_rows_to_process in np.split(rows_to_process, bounds):
+            if len(block_rows_to_process) == 0:
+                continue
             
-            return True
+            cache_key = self.result_cache.block_key(values, missing, block_rows_to_process, batch_size)
+            imputed = self.result_cache.fetch_block(cache_key)
+            if imputed is not None:
+                block = values[block_rows_to_process]
+                block[missing[block_rows_to_process]] = imputed
+                values[block_rows_to_process] = block
+                print(f"Reused the imputed values of {len(block_rows_to_process)} rows from the result cache")
+                continue
             
-        except Exception as e:
-            print(f"Error during imputation: {str(e)}")
-            raise
\ No newline at end of file
+            batch_number = self._impute_rows_by_pattern(
+                values, missing, block_rows_to_process, batch_size, buffers, memory_policy, pattern_stats, batch_number,
+                group_patterns
+            )
+            self.result_cache.store_block(cache_key, values[block_rows_to_process][missing[block_rows_to_process]])
+        
+        return batch_number
+    
+    def _impute_rows_by_pattern(self, values, missing, rows_to_process, batch_size, buffers, memory_policy,
+                                pattern_stats, batch_number, group_patterns=True):
+        """Run the model over rows, in pattern batches and then mixed batches; see _impute_by_pattern"""
+        if group_patterns and self.pattern_min_rows > 0:
+            groups, remaining, distinct_patterns = group_by_pattern(missing, rows_to_process, self.pattern_min_rows)
+        else:
+            groups, remaining, distinct_patterns = [], rows_to_process, 0
+        pattern_stats.add(groups, remaining, distinct_patterns, batch_size)
+        
+        if groups:
+            print(f"{len(groups)} of {distinct_patterns} missingness patterns cover "
+                  f"{sum(len(group) for group in groups)} rows and get batches of their own")
+        
+        for group in groups:
+            for i in range(0, len(group), batch_size):
+                batch_number += 1
+                batch_positions = group[i:i+batch_size]
+                print(f"Processing batch {batch_number} with {len(batch_positions)} rows of one pattern")
+                self._impute_batch(values, missing, batch_positions, buffers, memory_policy, shared_mask=True)
+        
+        for i in range(0, len(remaining), batch_size):
+            batch_number += 1
+            batch_positions = remaining[i:i+batch_size]
+            print(f"Processing batch {batch_number} with {len(batch_positions)} rows")
+            self._impute_batch(values, missing, batch_positions, buffers, memory_policy)
+        
+        return batch_number
+    
+    def _numeric_block(self, df, numerical_cols):
+        """
+        Extract the numerical columns as a float64 array plus its missing-value mask.
+        
+        The array is updated in place batch by batch and written back to the
+        DataFrame once at the end, instead of through per-column .loc assignments.
+        Feature columns that schema mode keeps as text are parsed as float32.
+        """
+        if any(not pd.api.types.is_numeric_dtype(dtype) for dtype in df.dtypes[numerical_cols]):
+            values = np.empty((len(df), len(numerical_cols)), dtype=np.float64)
+            for i, name in enumerate(numerical_cols):
+                values[:, i] = parse_feature_text(df[name])
+            return values, np.isnan(values)
+        
+        values = df[numerical_cols].to_numpy(dtype=np.float64, na_value=np.nan, copy=True)
+        missing = np.isnan(values)
+        return values, missing
+    
+    def _write_back(self, df_original, values, missing, numerical_cols):
+        """
+        Copy the imputed numerical block into a copy of the original DataFrame.
+        
+        Only columns that had missing values are replaced, so columns without
+        gaps keep their original dtype. In text columns (schema mode) only the
+        imputed cells are replaced, so observed cells keep their exact text.
+        """
+        df_imputed = df_original.copy()
+        cols_with_missing = missing.any(axis=0)
+        text_cols = np.array([not pd.api.types.is_numeric_dtype(dtype) for dtype in df_original.dtypes[numerical_cols]])
+        
+        numeric_imputed = cols_with_missing & ~text_cols
+        if numeric_imputed.any():
+            imputed_cols = numerical_cols[numeric_imputed]
+            imputed_block = pd.DataFrame(values[:, numeric_imputed], columns=imputed_cols, index=df_original.index)
+            df_imputed[imputed_cols] = imputed_block.astype(df_original.dtypes[imputed_cols])
+        
+        for i in np.flatnonzero(cols_with_missing & text_cols):
+            column = df_original[numerical_cols[i]].to_numpy(dtype=object, copy=True)
+            column[missing[:, i]] = values[missing[:, i], i].astype(str)
+            df_imputed[numerical_cols[i]] = column
+        return df_imputed
+    
+    def _scale_in_place(self, batch, inverse=False):
+        """
+        Scale or unscale a batch buffer in place.
+        
+        ScalerParams works on the buffer itself; an sklearn scaler returns a
+        copy, which is copied back.
+        """
+        if self.scaler_in_place:
+            if inverse:
+                self.scaler.inverse_transform(batch, copy=False)
+            else:
+                self.scaler.transform(batch, copy=False)
+        elif inverse:
+            np.copyto(batch, self.scaler.inverse_transform(batch))
+        else:
+            np.copyto(batch, self.scaler.transform(batch))
+    
+    def _impute_batch(self, values, missing, batch_positions, buffers, memory_policy, shared_mask=False):
+        """
+        Run the model over one batch of rows and fill in their missing values.
+        
+        Args:
+            values (np.ndarray): Numerical block of the frame, updated in place
+            missing (np.ndarray): Boolean mask of missing entries in values
+            batch_positions (np.ndarray): Row positions of this batch
+            buffers (BatchBuffers): Buffers reused across batches
+            memory_policy (MemoryPolicy): Decides when memory is released
+            shared_mask (bool): Every row has the same missingness pattern, so
+                the mask is passed once and broadcast by the model
+        """
+        batch_tensor, mask_tensor, imputed_np = buffers.get(len(batch_positions), values.shape[1])
+        batch_rows, batch_scaled, batch_missing = buffers.host(len(batch_positions))
+        # Tensor views of the staging arrays, for the masked selects
+        rows_view, scaled_view, missing_view = map(torch.from_numpy, (batch_rows, batch_scaled, batch_missing))
+        
+        # Gather the rows and their mask (True where missing) into the staging arrays.
+        # The positions are always in range; mode="clip" skips the buffered bounds check.
+        np.take(values, batch_positions, axis=0, out=batch_rows, mode="clip")
+        np.take(missing, batch_positions, axis=0, out=batch_missing, mode="clip")
+        
+        # Fill missing with zeros and scale in place, unless the backend scales in the graph
+        torch.where(missing_view, buffers.fill_value, rows_view, out=scaled_view)
+        if not self.backend.scales_in_graph:
+            self._scale_in_place(batch_scaled)
+        
+        # Cast into the preallocated tensors; on CPU the mask was gathered straight into its tensor
+        batch_tensor.copy_(torch.from_numpy(batch_scaled))
+        if shared_mask:
+            mask_tensor = mask_tensor[:1]
+        if mask_tensor.device.type != "cpu":
+            mask_tensor.copy_(torch.from_numpy(batch_missing[:len(mask_tensor)]))
+        
+        # Perform imputation into the output buffer
+        self.backend.run(batch_tensor, mask_tensor, imputed_np)
+            
+        # Convert back to original scale
+        if not self.backend.scales_in_graph:
+            self._scale_in_place(imputed_np, inverse=True)
+        
+        # Update only the missing values of the gathered rows, then scatter them back in one assignment.
+        # The predictions are cast into the free scaled buffer first; a select across dtypes is slower.
+        np.copyto(batch_scaled, imputed_np)
+        torch.where(missing_view, scaled_view, rows_view, out=rows_view)
+        values[batch_positions] = batch_rows
+        
+        memory_policy.after_batch()
@@ -0,0 +1,112 @@
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+
+# SQLite database holding one row per imputation job
+JOB_REGISTRY_PATH = os.environ.get("JOB_REGISTRY_PATH", "temp/jobs.db")
+
+# Job states
+STATUS_PROCESSING = "processing"
+STATUS_COMPLETED = "completed"
+STATUS_FAILED = "failed"
+
+class JobRegistry:
+    """
+    Indexed store of imputation jobs: state, file paths, timestamps, row counts and errors.
+    
+    Lookups go through the job_id primary key instead of scanning the upload and
+    result directories. A new connection is opened per operation, so the registry
+    can be used from request handlers, background threads and worker processes.
+    """
+    def __init__(self, db_path):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    filename TEXT NOT NULL,
+                    input_path TEXT NOT NULL,
+                    output_path TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    rows INTEGER,
+                    error TEXT,
+                    metrics TEXT
+                )
+                """
+            )
+    
+    @contextmanager
+    def _connect(self):
+        """
+        Open a connection, commit on success and always close it.
+        """
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+    
+    def _update(self, job_id, **fields):
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {assignments} WHERE job_id = ?", (*fields.values(), job_id))
+    
+    def create_job(self, job_id, filename, input_path, output_path):
+        """
+        Register a newly uploaded job.
+        """
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (job_id, status, filename, input_path, output_path, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, STATUS_PROCESSING, filename, input_path, output_path, time.time())
+            )
+    
+    def mark_started(self, job_id):
+        self._update(job_id, status=STATUS_PROCESSING, started_at=time.time())
+    
+    def mark_completed(self, job_id, metrics):
+        self._update(
+            job_id,
+            status=STATUS_COMPLETED,
+            finished_at=time.time(),
+            rows=metrics.get("rows"),
+            metrics=json.dumps(metrics)
+        )
+    
+    def mark_failed(self, job_id, error):
+        self._update(job_id, status=STATUS_FAILED, finished_at=time.time(), error=error)
+    
+    def get_job(self, job_id):
+        """
+        Get a job by its ID.
+        
+        Returns:
+            dict: The job record, or None if no such job exists
+        """
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        
+        if row is None:
+            return None
+        
+        job = dict(row)
+        job["metrics"] = json.loads(job["metrics"]) if job["metrics"] else None
+        return job
+    
+    def delete_job(self, job_id):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+
+job_registry = JobRegistry(JOB_REGISTRY_PATH)
@@ -0,0 +1,218 @@
+import gc
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from inference.job_registry import job_registry
+
+# Worker processes running imputation jobs at the same time
+IMPUTATION_WORKERS = int(os.environ.get("IMPUTATION_WORKERS", 1))
+
+# Jobs allowed to wait for a free worker before uploads are rejected
+IMPUTATION_QUEUE_SIZE = int(os.environ.get("IMPUTATION_QUEUE_SIZE", 16))
+
+# Intra-op threads per worker, split evenly across workers by default
+IMPUTATION_TORCH_THREADS = int(os.environ.get(
+    "IMPUTATION_TORCH_THREADS",
+    max(1, (os.cpu_count() or 1) // IMPUTATION_WORKERS)
+))
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at capacity"""
+
+def _init_worker(torch_threads):
+    """Pin the number of intra-op threads so workers do not oversubscribe cores"""
+    import torch
+    torch.set_num_threads(torch_threads)
+
+class JobScheduler:
+    """
+    Runs imputation jobs in a fixed-size process pool behind a bounded FIFO queue.
+    
+    Jobs are only handed to the pool when a worker is free, so the scheduler
+    always knows each waiting job's queue position and how long it has waited.
+    """
+    def __init__(self, max_workers, max_queue_size, torch_threads):
+        self.max_workers = max_workers
+        self.max_queue_size = max_queue_size
+        self.torch_threads = torch_threads
+        
+        self._executor = None
+        self._lock = threading.Lock()
+        self._queue = OrderedDict()  # job_id -> (fn, args, enqueued_at)
+        self._running = {}  # job_id -> (enqueued_at, started_at)
+        
+        # Set by a done callback when the pool broke; the supervisor thread replaces the pool
+        self._pool_broken = threading.Event()
+        self._supervisor = None
+        self._stopping = False
+    
+    def start(self):
+        """
+        Start the worker pool. Workers are forked where possible so they share
+        everything the server process has already loaded, such as the model
+        weights, copy-on-write instead of loading their own copy.
+        
+        A supervisor thread is started alongside, which replaces the pool when
+        a worker dies, so the pool is never forked from a done callback.
+        """
+        with self._lock:
+            self._stopping = False
+            self._pool_broken.clear()
+            self._start_pool()
+    
+    def _start_pool(self):
+        """Create the pool and fork its workers right away. Caller holds the lock."""
+        self._start_executor()
+        
+        # Fork the workers now, while the server holds little more than the loaded model
+        self._executor.submit(os.getpid)
+    
+    def _supervise(self):
+        """Replace the pool after it broke and hand it the jobs that waited meanwhile"""
+        while True:
+            self._pool_broken.wait()
+            with self._lock:
+                if self._stopping:
+                    return
+                self._pool_broken.clear()
+                print("Restarting the worker pool")
+                self._start_pool()
+                self._dispatch()
+    
+    def _start_executor(self):
+        if self._executor is not None:
+            return
+        
+        if self._supervisor is None:
+            self._supervisor = threading.Thread(target=self._supervise, name="job-scheduler", daemon=True)
+            self._supervisor.start()
+        
+        # Keep the garbage collector in the workers from writing to inherited
+        # objects, which would copy their memory pages
+        gc.freeze()
+        
+        start_method = "fork" if "fork" in multiprocessing.get_all_start_methods() else None
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context(start_method),
+            initializer=_init_worker,
+            initargs=(self.torch_threads,)
+        )
+        print(f"Job scheduler started with {self.max_workers} workers, "
+              f"{self.torch_threads} torch threads each, queue size {self.max_queue_size}")
+    
+    def shutdown(self):
+        """
+        Stop accepting work and wait for running jobs to finish.
+        
+        Jobs still waiting in the queue, or cancelled before a worker picked
+        them up, are marked failed.
+        """
+        with self._lock:
+            self._stopping = True
+            executor, self._executor = self._executor, None
+            queued = list(self._queue)
+            self._queue.clear()
+        # Let the supervisor thread exit
+        self._pool_broken.set()
+        if self._supervisor is not None:
+            self._supervisor.join()
+            self._supervisor = None
+        
+        for job_id in queued:
+            job_registry.mark_failed(job_id, "Server shut down before the job started")
+        
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+    
+    def has_capacity(self):
+        with self._lock:
+            return len(self._queue) < self.max_queue_size
+    
+    def submit(self, job_id, fn, *args):
+        """
+        Queue a job, starting it right away if a worker is free.
+        
+        Raises:
+            QueueFullError: If the queue is already at capacity
+        """
+        with self._lock:
+            if len(self._queue) >= self.max_queue_size:
+                raise QueueFullError(f"Imputation queue is full ({self.max_queue_size} jobs waiting)")
+            
+            self._queue[job_id] = (fn, args, time.time())
+            self._dispatch()
+    
+    def _dispatch(self):
+        """Hand queued jobs to the pool while workers are free. Caller holds the lock."""
+        if self._stopping or self._pool_broken.is_set():
+            # The supervisor thread dispatches once it has replaced the pool
+            return
+        self._start_executor()
+        
+        while self._queue and len(self._running) < self.max_workers:
+            job_id, (fn, args, enqueued_at) = self._queue.popitem(last=False)
+            self._running[job_id] = (enqueued_at, time.time())
+            
+            executor = self._executor
+            future = executor.submit(fn, *args)
+            future.add_done_callback(lambda f, job_id=job_id, executor=executor: self._on_done(job_id, f, executor))
+    
+    def _on_done(self, job_id, future, executor):
+        error = None if future.cancelled() else future.exception()
+        
+        with self._lock:
+            self._running.pop(job_id, None)
+            
+            if future.cancelled():
+                # Cancelled by shutdown before a worker picked it up
+                job_registry.mark_failed(job_id, "Server shut down before the job started")
+            elif isinstance(error, BrokenProcessPool):
+                # A worker died (e.g. killed for using too much memory); the pool
+                # cannot be reused, so the supervisor thread replaces it
+                print(f"Worker pool broke while running job {job_id}, restarting it")
+                job_registry.mark_failed(job_id, "Worker process terminated unexpectedly")
+                # Every job of the broken pool ends up here; only the first one replaces it
+                if executor is self._executor:
+                    executor.shutdown(wait=False)
+                    self._executor = None
+                    if not self._stopping:
+                        self._pool_broken.set()
+            elif error is not None:
+                print(f"Job {job_id} failed: {str(error)}")
+            
+            if self._queue:
+                self._dispatch()
+    
+    def queue_status(self, job_id):
+        """
+        Get a job's queue position and how long it waited for a worker.
+        
+        Returns:
+            dict: Queue position (0 once running) and wait time in seconds,
+                or None if the scheduler is not tracking the job
+        """
+        now = time.time()
+        
+        with self._lock:
+            for position, (queued_id, (_, _, enqueued_at)) in enumerate(self._queue.items(), start=1):
+                if queued_id == job_id:
+                    return {
+                        "queue_position": position,
+                        "wait_time_seconds": round(now - enqueued_at, 3),
+                    }
+            
+            if job_id in self._running:
+                enqueued_at, started_at = self._running[job_id]
+                return {
+                    "queue_position": 0,
+                    "wait_time_seconds": round(started_at - enqueued_at, 3),
+                }
+        
+        return None
+
+job_scheduler = JobScheduler(IMPUTATION_WORKERS, IMPUTATION_QUEUE_SIZE, IMPUTATION_TORCH_THREADS)
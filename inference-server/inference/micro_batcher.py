@@ -0,0 +1,171 @@
+import asyncio
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from inference.batch_memory import BatchBuffers, MemoryPolicy
+
+# Largest number of rows coalesced into one forward pass
+MICROBATCH_MAX_BATCH_SIZE = int(os.environ.get("MICROBATCH_MAX_BATCH_SIZE", 64))
+
+# Longest time the first request of a batch waits for others to join it
+MICROBATCH_MAX_WAIT_MS = float(os.environ.get("MICROBATCH_MAX_WAIT_MS", 5))
+
+# Number of recent requests and batches kept for latency and fill statistics
+STATS_WINDOW = 10000
+
+class MicroBatcher:
+    """
+    Coalesces concurrent row-imputation requests into single model forward passes.
+    
+    Requests are queued on the event loop. The first request of a batch waits up
+    to max_wait_ms for others to arrive, or until max_batch_size rows are
+    collected, and the batch then runs on a dedicated inference thread.
+    """
+    def __init__(self, imputation_service, max_batch_size, max_wait_ms):
+        self.imputation_service = imputation_service
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        
+        self._queue = None
+        self._task = None
+        self._executor = None
+        self._carry = None
+        self._buffers = None
+        self._memory_policy = None
+        
+        self._latencies_ms = deque(maxlen=STATS_WINDOW)
+        self._batch_rows = deque(maxlen=STATS_WINDOW)
+        self._requests = 0
+        self._batches = 0
+    
+    def start(self):
+        """
+        Start the batching loop. Must be called from the running event loop.
+        """
+        self._queue = asyncio.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="micro-batcher")
+        self._buffers = BatchBuffers(self.max_batch_size, self.imputation_service.device)
+        self._memory_policy = MemoryPolicy(self.imputation_service.gc_watermark_mb, self.imputation_service.device)
+        self._task = asyncio.create_task(self._run())
+        print(f"Micro-batcher started: max batch size {self.max_batch_size}, max wait {self.max_wait * 1000:.1f} ms")
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+    
+    async def submit(self, rows):
+        """
+        Impute a block of rows, sharing a forward pass with concurrent requests.
+        
+        Args:
+            rows (np.ndarray): Rows to impute, NaN where values are missing
+            
+        Returns:
+            np.ndarray: The rows with missing values imputed
+            
+        Raises:
+            ValueError: When there are more rows than fit in one batch
+        """
+        if self._task is None:
+            raise RuntimeError("Micro-batcher is not running")
+        if len(rows) > self.max_batch_size:
+            raise ValueError(f"{len(rows)} rows submitted, at most {self.max_batch_size} fit in one batch")
+        
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((rows, future, time.perf_counter()))
+        return await future
+    
+    async def _next_batch(self):
+        """Collect requests until the batch is full or the wait deadline passes"""
+        loop = asyncio.get_running_loop()
+        
+        if self._carry is not None:
+            first, self._carry = self._carry, None
+        else:
+            first = await self._queue.get()
+        
+        batch = [first]
+        num_rows = len(first[0])
+        deadline = loop.time() + self.max_wait
+        
+        while num_rows < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            
+            if num_rows + len(item[0]) > self.max_batch_size:
+                # Keep the request for the next batch rather than overfilling this one
+                self._carry = item
+                break
+            
+            batch.append(item)
+            num_rows += len(item[0])
+        
+        return batch
+    
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        
+        while True:
+            batch = await self._next_batch()
+            futures = [future for _, future, _ in batch]
+            
+            try:
+                block = np.concatenate([rows for rows, _, _ in batch])
+                imputed = await loop.run_in_executor(
+                    self._executor,
+                    self.imputation_service.impute_rows,
+                    block,
+                    self._buffers,
+                    self._memory_policy
+                )
+            except Exception as e:
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            
+            finished = time.perf_counter()
+            self._batches += 1
+            self._batch_rows.append(len(block))
+            
+            offset = 0
+            for rows, future, submitted in batch:
+                if not future.done():
+                    future.set_result(imputed[offset:offset + len(rows)])
+                offset += len(rows)
+                self._requests += 1
+                self._latencies_ms.append((finished - submitted) * 1000)
+    
+    def stats(self):
+        """
+        Latency percentiles and batch fill statistics over the recent window.
+        """
+        latencies = np.array(self._latencies_ms)
+        batch_rows = np.array(self._batch_rows)
+        
+        return {
+            "requests": self._requests,
+            "batches": self._batches,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "p50_latency_ms": round(float(np.percentile(latencies, 50)), 3) if len(latencies) else None,
+            "p99_latency_ms": round(float(np.percentile(latencies, 99)), 3) if len(latencies) else None,
+            "mean_batch_rows": round(float(batch_rows.mean()), 2) if len(batch_rows) else None,
+            "mean_batch_fill": round(float(batch_rows.mean() / self.max_batch_size), 3) if len(batch_rows) else None,
+            "requests_per_batch": round(self._requests / self._batches, 2) if self._batches else None,
+        }
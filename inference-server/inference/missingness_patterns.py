@@ -0,0 +1,85 @@
+import numpy as np
+
+
+def group_by_pattern(missing, rows, min_rows):
+    """
+    Group rows by their missingness pattern.
+
+    Args:
+        missing (np.ndarray): Boolean mask of missing entries [num_rows, num_features]
+        rows (np.ndarray): Positions of the rows to group, in row order
+        min_rows (int): Smallest number of rows for a pattern to get its own group
+
+    Returns:
+        tuple: List of row-position arrays, one per frequent pattern and most
+            common first; the remaining rows in row order; the number of
+            distinct patterns among rows
+    """
+    if len(rows) == 0:
+        return [], rows, 0
+
+    # One packed byte string per row, so patterns compare as short keys
+    packed = np.packbits(missing[rows], axis=1)
+    _, inverse, counts = np.unique(packed, axis=0, return_inverse=True, return_counts=True)
+    inverse = inverse.reshape(-1)
+
+    frequent = counts >= min_rows
+    if not frequent.any():
+        return [], rows, len(counts)
+
+    # Stable sort keeps each group's rows in row order
+    order = np.argsort(inverse, kind="stable")
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+
+    groups = []
+    for pattern_id in sorted(np.flatnonzero(frequent), key=lambda p: -counts[p]):
+        groups.append(rows[order[starts[pattern_id]:starts[pattern_id] + counts[pattern_id]]])
+
+    remaining = rows[~frequent[inverse]]
+    return groups, remaining, len(counts)
+
+
+class PatternStats:
+    """
+    Per-job counts of how rows were routed by missingness pattern.
+    """
+    def __init__(self, min_rows):
+        """
+        Args:
+            min_rows (int): Smallest number of rows for a pattern to get its own
+                batches; 0 disables grouping
+        """
+        self.min_rows = min_rows
+        self.fully_observed_rows = 0
+        self.distinct_patterns = 0
+        self.grouped_patterns = 0
+        self.grouped_rows = 0
+        self.grouped_batches = 0
+        self.mixed_rows = 0
+        self.mixed_batches = 0
+
+    def count_fully_observed(self, num_rows):
+        """Record rows that skipped the model because nothing was missing"""
+        self.fully_observed_rows += num_rows
+
+    def add(self, groups, remaining, distinct_patterns, batch_size):
+        """Record how one block of rows with missing values was split into batches"""
+        self.distinct_patterns += distinct_patterns
+        self.grouped_patterns += len(groups)
+        self.grouped_rows += sum(len(group) for group in groups)
+        self.grouped_batches += sum(-(-len(group) // batch_size) for group in groups)
+        self.mixed_rows += len(remaining)
+        self.mixed_batches += -(-len(remaining) // batch_size)
+
+    def metrics(self):
+        # Patterns are counted per block, so a pattern that spans streamed chunks counts once per chunk
+        return {
+            "min_rows": self.min_rows,
+            "fully_observed_rows": self.fully_observed_rows,
+            "distinct_patterns": self.distinct_patterns,
+            "grouped_patterns": self.grouped_patterns,
+            "grouped_rows": self.grouped_rows,
+            "grouped_batches": self.grouped_batches,
+            "mixed_rows": self.mixed_rows,
+            "mixed_batches": self.mixed_batches,
+        }
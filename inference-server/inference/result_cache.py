@@ -0,0 +1,238 @@
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import time
+from contextlib import contextmanager
+import numpy as np
+
+# Counters kept per process for job metrics and in the index for the whole cache
+CACHE_COUNTERS = ("file_hits", "file_misses", "block_hits", "block_misses", "evictions")
+
+
+class ResultCache:
+    """
+    Content-addressed disk cache of imputation results with size-bounded LRU eviction.
+
+    Two kinds of entries share the space:
+        file   A whole result file, keyed by the SHA-256 of the input file.
+               An identical re-upload is served without parsing it or
+               running the model.
+        block  The imputed values of a fixed range of rows, keyed by exactly the
+               values and missing-value mask the model would see. When rows
+               are appended to a file, every block that did not change is
+               reused and only the new blocks are imputed.
+
+    Every key also covers the model fingerprint: the checkpoint and scaler
+    hashes plus the settings that change results. The index and the counters
+    live in SQLite next to the entries, so the server and the job workers
+    share one cache.
+    """
+    def __init__(self, cache_dir, max_bytes, fingerprint):
+        """
+        Args:
+            cache_dir (str): Directory of the entries and their index
+            max_bytes (int): Size the entries are evicted down to
+            fingerprint (str): Hash of everything besides the input that decides the results
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.fingerprint = fingerprint
+        self.counters = dict.fromkeys(CACHE_COUNTERS, 0)
+        for kind in ("file", "block"):
+            os.makedirs(os.path.join(cache_dir, kind), exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_access REAL NOT NULL,
+                    metrics TEXT
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)")
+            conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(os.path.join(self.cache_dir, "index.db"), timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _path(self, kind, key):
+        return os.path.join(self.cache_dir, kind, key + (".npy" if kind == "block" else ""))
+
+    def _count(self, conn, name):
+        self.counters[name] += 1
+        conn.execute(
+            "INSERT INTO counters (name, value) VALUES (?, 1) ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,)
+        )
+
+    def _lookup(self, kind, key):
+        """Mark an entry as used and return its index row, counting the hit or miss"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is not None and not os.path.exists(self._path(kind, key)):
+                # Evicted by another process between its delete and ours
+                conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                row = None
+            if row is not None:
+                conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._count(conn, f"{kind}_hits" if row is not None else f"{kind}_misses")
+        return row
+
+    def _insert(self, kind, key, metrics=None):
+        size = os.path.getsize(self._path(kind, key))
+        if size > self.max_bytes:
+            # It would only push everything else out before being evicted itself
+            os.remove(self._path(kind, key))
+            return
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, kind, size, last_access, metrics) VALUES (?, ?, ?, ?, ?)",
+                (key, kind, size, time.time(), json.dumps(metrics) if metrics is not None else None)
+            )
+            self._evict(conn)
+
+    def _evict(self, conn):
+        """Delete the least recently used entries until the cache fits. Caller holds a transaction."""
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for row in conn.execute("SELECT key, kind, size FROM entries ORDER BY last_access").fetchall():
+            if total <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM entries WHERE key = ?", (row["key"],))
+            try:
+                os.remove(self._path(row["kind"], row["key"]))
+            except FileNotFoundError:
+                pass
+            total -= row["size"]
+            self._count(conn, "evictions")
+
+    def file_key(self, input_file_path, **settings):
+        """
+        Key of a whole result: the input file's content plus the output settings.
+
+        Args:
+            input_file_path (str): Input file, hashed in full
+            settings: Anything else that changes the output bytes, such as
+                the output format, compression, chunk size and batch size
+        """
+        digest = hashlib.sha256()
+        digest.update(self.fingerprint.encode())
+        digest.update(json.dumps(settings, sort_keys=True).encode())
+        with open(input_file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def fetch_file(self, key, output_file_path):
+        """
+        Serve a cached result file by linking it to the output path.
+
+        Returns:
+            dict: Metrics of the job that produced the result, or None on a miss
+        """
+        row = self._lookup("file", key)
+        if row is None:
+            return None
+        try:
+            os.link(self._path("file", key), output_file_path)
+        except FileNotFoundError:
+            return None
+        except OSError:
+            # Another file system, or no hard links
+            shutil.copyfile(self._path("file", key), output_file_path)
+        return json.loads(row["metrics"])
+
+    def store_file(self, key, output_file_path, metrics):
+        """Add a finished result file, linked rather than copied, with the metrics of its job"""
+        path = self._path("file", key)
+        partial_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.link(output_file_path, partial_path)
+        except OSError:
+            shutil.copyfile(output_file_path, partial_path)
+        os.replace(partial_path, path)
+        self._insert("file", key, metrics)
+
+    def block_key(self, values, missing, rows, batch_size):
+        """
+        Key of a block of rows: their values and mask, plus the batch size
+        that splits them into forward passes.
+        """
+        block_missing = missing[rows]
+        digest = hashlib.sha256()
+        digest.update(self.fingerprint.encode())
+        digest.update(np.array([batch_size, *block_missing.shape], dtype=np.int64).tobytes())
+        digest.update(np.packbits(block_missing).tobytes())
+        # Missing entries are NaN in any bit pattern; only the observed values count
+        digest.update(np.where(block_missing, 0.0, values[rows]).tobytes())
+        return digest.hexdigest()
+
+    def fetch_block(self, key):
+        """
+        Returns:
+            np.ndarray: The imputed entries of the block in row-major order, or None on a miss
+        """
+        if self._lookup("block", key) is None:
+            return None
+        try:
+            return np.load(self._path("block", key), allow_pickle=False)
+        except FileNotFoundError:
+            return None
+
+    def store_block(self, key, imputed):
+        path = self._path("block", key)
+        partial_path = f"{path}.{os.getpid()}.tmp"
+        with open(partial_path, "wb") as f:
+            np.save(f, imputed, allow_pickle=False)
+        os.replace(partial_path, path)
+        self._insert("block", key)
+
+    def metrics(self, since=None):
+        """
+        Hits and misses of this process, optionally since an earlier snapshot.
+        """
+        counters = dict(self.counters)
+        if since is not None:
+            counters = {name: counters[name] - since[name] for name in CACHE_COUNTERS}
+        return counters
+
+    def stats(self):
+        """
+        Size and counters of the whole cache, across every process using it.
+        """
+        with self._connect() as conn:
+            entries = {
+                row["kind"]: {"entries": row["entries"], "bytes": row["bytes"]}
+                for row in conn.execute("SELECT kind, COUNT(*) AS entries, SUM(size) AS bytes FROM entries GROUP BY kind")
+            }
+            counters = dict.fromkeys(CACHE_COUNTERS, 0)
+            counters.update({row["name"]: row["value"] for row in conn.execute("SELECT name, value FROM counters")})
+
+        stats = {"max_bytes": self.max_bytes}
+        for kind in ("file", "block"):
+            kind_entries = entries.get(kind, {"entries": 0, "bytes": 0})
+            hits, misses = counters[f"{kind}_hits"], counters[f"{kind}_misses"]
+            stats[kind] = {
+                **kind_entries,
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            }
+        stats["bytes"] = sum(stats[kind]["bytes"] for kind in ("file", "block"))
+        stats["evictions"] = counters["evictions"]
+        return stats
@@ -0,0 +1,141 @@
+import gzip
+import zlib
+
+# Compression of CSV results; Parquet and Arrow results are written as they are
+RESULT_COMPRESSIONS = ("none", "gzip", "zstd")
+
+# Suffix appended to compressed result files, which is how their compression is recognized
+COMPRESSION_SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+
+# Fast levels: imputed floats barely compress better at higher levels, which cost several times more
+GZIP_LEVEL = 1
+ZSTD_LEVEL = 3
+
+
+def check_compression(compression):
+    """
+    Validate a RESULT_COMPRESSION setting.
+
+    Raises:
+        ValueError: For an unknown compression
+        ImportError: For zstd without the zstandard package
+    """
+    if compression not in RESULT_COMPRESSIONS:
+        raise ValueError(f"Unknown result compression: {compression}")
+    if compression == "zstd":
+        try:
+            import zstandard  # noqa: F401
+        except ImportError as e:
+            raise ImportError("zstd result compression requires the zstandard package") from e
+
+
+def result_path(path, compression):
+    """Result path with the suffix of its compression"""
+    return path + COMPRESSION_SUFFIXES.get(compression, "")
+
+
+def compression_of(path):
+    """
+    Compression of a result file, from its suffix.
+
+    Returns:
+        str: "gzip" or "zstd", which are also the Content-Encoding tokens, or None
+    """
+    for compression, suffix in COMPRESSION_SUFFIXES.items():
+        if path.endswith(suffix):
+            return compression
+    return None
+
+
+def pandas_compression(path):
+    """The to_csv compression argument for a result path"""
+    compression = compression_of(path)
+    if compression == "gzip":
+        return {"method": "gzip", "compresslevel": GZIP_LEVEL, "mtime": 0}
+    if compression == "zstd":
+        return {"method": "zstd", "level": ZSTD_LEVEL}
+    return None
+
+
+class ResultWriter:
+    """
+    Appends chunks of CSV text to a result file, compressing them as one stream.
+
+    The compressor is flushed after every chunk, so the bytes written so far
+    always decode up to the end of the last chunk and can be sent to a client
+    while the job is still running. The file is still a single gzip member or
+    zstd frame, which every client decodes.
+    """
+    def __init__(self, path, compression):
+        """
+        Args:
+            path (str): File to write
+            compression (str): "gzip", "zstd" or None
+        """
+        self.compression = compression
+        self._compressor = None
+        if compression == "gzip":
+            # wbits=31 writes the gzip header and trailer around the deflate stream
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+            self._flush_mode = zlib.Z_SYNC_FLUSH
+        elif compression == "zstd":
+            import zstandard
+            self._compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+            self._flush_mode = zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        self._file = open(path, "wb")
+
+    def write(self, text):
+        data = text.encode("utf-8")
+        if self._compressor is not None:
+            data = self._compressor.compress(data) + self._compressor.flush(self._flush_mode)
+        self._file.write(data)
+        self._file.flush()
+
+    def close(self):
+        try:
+            if self._compressor is not None:
+                self._file.write(self._compressor.flush())
+        finally:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class StreamDecompressor:
+    """
+    Decompresses a result file piece by piece, as its bytes are read while it is still being written.
+    """
+    def __init__(self, compression):
+        """
+        Args:
+            compression (str): "gzip" or "zstd"
+        """
+        if compression == "gzip":
+            self._decompressor = zlib.decompressobj(31)
+        else:
+            import zstandard
+            self._decompressor = zstandard.ZstdDecompressor().decompressobj()
+
+    def decompress(self, data):
+        """Plain bytes of the data, as far as it decodes so far"""
+        return self._decompressor.decompress(data)
+
+
+def iter_decompressed(path, compression, chunk_size=1024 * 1024):
+    """
+    Read a compressed result file back as plain bytes, for clients that do not accept its encoding.
+    """
+    if compression == "gzip":
+        source = gzip.open(path, "rb")
+    else:
+        import zstandard
+        source = zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), read_across_frames=True,
+                                                            closefd=True)
+    with source:
+        while chunk := source.read(chunk_size):
+            yield chunk
+
@@ -0,0 +1,145 @@
+import os
+import numpy as np
+
+# Job file formats, detected from the file extension; anything else is read as CSV
+TABLE_FORMATS = ("csv", "parquet", "arrow")
+FORMAT_EXTENSIONS = {
+    ".parquet": "parquet",
+    ".pq": "parquet",
+    ".arrow": "arrow",
+    ".feather": "arrow",
+    ".ipc": "arrow",
+}
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.file",
+}
+
+
+def detect_format(path):
+    """File format of a job file, from its extension"""
+    return FORMAT_EXTENSIONS.get(os.path.splitext(path)[1].lower(), "csv")
+
+
+def media_type(path):
+    """Media type a job file is served with"""
+    return MEDIA_TYPES[detect_format(path)]
+
+
+class TableReader:
+    """
+    Reads a Parquet or Arrow IPC file one block at a time.
+
+    Parquet files are read by row group. Arrow IPC files are read by record
+    batch, in either the file (Feather v2) or the stream layout; the writer
+    reproduces the layout of the input.
+    """
+    def __init__(self, path, file_format):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.file_format = file_format
+        self.is_stream = False
+        if file_format == "parquet":
+            self._parquet = pq.ParquetFile(path)
+            self.schema = self._parquet.schema_arrow
+            self.num_blocks = self._parquet.num_row_groups
+        else:
+            self._source = pa.memory_map(path)
+            try:
+                reader = pa.ipc.open_file(self._source)
+                self._batches = None
+                self.num_blocks = reader.num_record_batches
+            except pa.ArrowInvalid:
+                # Stream layout: batches can only be reached in order, but they
+                # are views into the memory map, so collecting them copies nothing
+                self._source.seek(0)
+                reader = pa.ipc.open_stream(self._source)
+                self._batches = list(reader)
+                self.is_stream = True
+                self.num_blocks = len(self._batches)
+            self._ipc = reader
+            self.schema = reader.schema
+
+    def read_block(self, index):
+        """
+        Read one row group or record batch.
+
+        Returns:
+            pyarrow.Table: The rows of the block
+        """
+        import pyarrow as pa
+
+        if self.file_format == "parquet":
+            return self._parquet.read_row_group(index)
+        batch = self._batches[index] if self.is_stream else self._ipc.get_batch(index)
+        return pa.Table.from_batches([batch])
+
+    def open_writer(self, path, schema):
+        """
+        Open a writer for the output file, in the same format and layout as the input.
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if self.file_format == "parquet":
+            return pq.ParquetWriter(path, schema)
+        if self.is_stream:
+            return pa.ipc.new_stream(path, schema)
+        return pa.ipc.new_file(path, schema)
+
+    def close(self):
+        if self.file_format != "parquet":
+            self._source.close()
+
+
+def numeric_columns(schema):
+    """
+    Names of the integer and floating point columns of an Arrow schema.
+
+    Matches pandas' select_dtypes(include=['number']) on the CSV path: booleans
+    and everything else pass through untouched.
+    """
+    import pyarrow as pa
+    return [field.name for field in schema if pa.types.is_integer(field.type) or pa.types.is_floating(field.type)]
+
+
+def table_numeric_block(table, numerical_cols):
+    """
+    Extract numerical columns of an Arrow table as a float64 array plus its missing-value mask.
+
+    Nulls and floating point NaNs both count as missing.
+    """
+    import pyarrow as pa
+
+    values = np.empty((table.num_rows, len(numerical_cols)), dtype=np.float64)
+    for j, name in enumerate(numerical_cols):
+        column = table.column(name).cast(pa.float64(), safe=False)
+        values[:, j] = column.to_numpy(zero_copy_only=False)
+    missing = np.isnan(values)
+    return values, missing
+
+
+def table_write_back(table, values, missing, numerical_cols):
+    """
+    Fill the missing entries of an Arrow table with the imputed values, keeping every column's type.
+
+    Imputed values in integer columns are rounded to the nearest integer.
+    Observed values are taken from the original column, so they are not
+    round-tripped through float64; columns without missing values are not
+    touched.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    for j in np.flatnonzero(missing.any(axis=0)):
+        index = table.schema.get_field_index(numerical_cols[j])
+        field = table.schema.field(index)
+        imputed = values[:, j]
+        if pa.types.is_integer(field.type):
+            imputed = np.rint(imputed)
+        imputed = pa.array(imputed).cast(field.type, safe=False)
+        column = pc.if_else(pa.array(missing[:, j]), imputed, table.column(index).combine_chunks())
+        table = table.set_column(index, field, column)
+    return table
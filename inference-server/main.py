@@ -1,19 +1,50 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 import uvicorn
+import asyncio
 import os
 from dotenv import load_dotenv
 
 from inference.imputation_routes import router as inference_router
+from inference.job_scheduler import job_scheduler
+from inference.imputation_controller import imputation_service, micro_batcher
 
 # Load environment variables
 load_dotenv()
 
+warm_up_error = None
+
+async def warm_up():
+    """Load and warm up the model, then start the job workers"""
+    global warm_up_error
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, imputation_service.warm_up)
+    except Exception as e:
+        warm_up_error = str(e)
+        print(f"Model warm-up failed: {warm_up_error}")
+        return
+    
+    # Workers are forked only after warm-up so they share the loaded weights
+    job_scheduler.start()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Warm up the model in the background and drain the workers on shutdown"""
+    micro_batcher.start()
+    warm_up_task = asyncio.create_task(warm_up())
+    yield
+    await warm_up_task
+    await micro_batcher.stop()
+    job_scheduler.shutdown()
+
 # Create FastAPI app
 app = FastAPI(
     title="Tabular Data Imputation API",
     description="API for imputing missing values in tabular data using transformer models",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Set up CORS
@@ -33,6 +64,16 @@ app.include_router(inference_router, prefix="/api/v1")
 async def root():
     return {"message": "Welcome to the Tabular Data Imputation API"}
 
+# Readiness endpoint
+@app.get("/ready")
+async def ready():
+    """Report ready only once the model has been loaded and warmed up"""
+    if imputation_service.ready:
+        return {"status": "ready"}
+    if warm_up_error is not None:
+        return JSONResponse(status_code=503, content={"status": "failed", "error": warm_up_error})
+    return JSONResponse(status_code=503, content={"status": "warming_up"})
+
 if __name__ == "__main__":
     port = int(os.getenv("PORT", 8000))
     host = os.getenv("HOST", "0.0.0.0")
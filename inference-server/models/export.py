@@ -0,0 +1,274 @@
+"""
+Export the imputation model to a TorchScript or ONNX artifact next to its checkpoint,
+or the scaler's parameters to a .npz that loads without unpickling.
+
+TorchScript: the model is traced for the checkpoint's feature count, then
+scripted behind the same forward signature the service uses and frozen.
+ONNX: the model is exported with (values, mask) inputs and a dynamic batch
+axis, for the onnxruntime inference backend.
+
+Both artifacts record the SHA-256 of the checkpoint they came from, so a
+stale export is ignored. The scaler parameters record the SHA-256 of the
+pickled scaler instead.
+
+Usage (from the inference-server directory):
+    python -m models.export --model-path models/tabular_transformer_relpos.pth
+    python -m models.export --model-path models/tabular_transformer_relpos.pth --format onnx
+    python -m models.export --model-path models/tabular_transformer_relpos.pth --format scaler \
+        --scaler-path models/scaler.pkl
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+import warnings
+from typing import Optional
+import torch
+import torch.nn as nn
+from models.inference_graph import build_inference_model
+from models.transformer_model import ATTENTION_BACKENDS, set_attention_backend
+
+ARTIFACT_SUFFIX = ".torchscript.pt"
+ONNX_SUFFIX = ".onnx"
+EXPORT_FORMATS = ("torchscript", "onnx", "scaler")
+
+# Metadata stored in the artifact's extra files
+EXTRA_FILES = ("source_sha256", "config", "model_type", "attention_backend", "torch_version")
+
+
+class _MaskedForward(nn.Module):
+    """
+    Forward without column indices, which tracing cannot take as None.
+    
+    Create it in eval mode: the ONNX exporter applies the wrapper's training
+    flag to the whole model.
+    """
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, x, mask):
+        return self.model(x, None, mask)
+
+
+class CompiledImputationModel(nn.Module):
+    """
+    Scripted wrapper that keeps the model's (x, column_indices, mask) signature.
+    """
+    def __init__(self, traced):
+        super().__init__()
+        self.model = traced
+
+    def forward(self, x: torch.Tensor, column_indices: Optional[torch.Tensor] = None,
+                mask: Optional[torch.Tensor] = None) -> torch.Tensor:
+        if column_indices is not None:
+            raise RuntimeError("The compiled model only supports the training column order")
+        if mask is None:
+            raise RuntimeError("The compiled model requires a missing value mask")
+        return self.model(x, mask)
+
+
+def artifact_path(model_path):
+    """Path of the compiled artifact that belongs to a checkpoint"""
+    return os.path.splitext(model_path)[0] + ARTIFACT_SUFFIX
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    """SHA-256 hex digest of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def export_torchscript(model_path, output_path=None, attention_backend="reference"):
+    """
+    Trace, script and freeze the model in a checkpoint and save it as TorchScript.
+
+    Args:
+        model_path: Checkpoint with "config", "model_state_dict" and optionally "model_type"
+        output_path: Where to write the artifact; next to the checkpoint by default
+        attention_backend: Attention backend baked into the trace
+
+    Returns:
+        Path of the written artifact
+    """
+    output_path = output_path or artifact_path(model_path)
+    checkpoint = torch.load(model_path, map_location="cpu")
+    config = checkpoint["config"]
+    num_features = config.get("num_features", 39)  # Default to 39 if not stored
+
+    model, _ = build_inference_model(checkpoint, torch.device("cpu"))
+    set_attention_backend(model, attention_backend)
+
+    # Example batch shaped like the service's buffers: float32 values, bool mask
+    x = torch.randn(8, num_features)
+    mask = torch.rand(8, num_features) < 0.2
+
+    with torch.no_grad(), warnings.catch_warnings():
+        # Python-side checks (cached bias, attention fast path) are fixed for inference
+        warnings.simplefilter("ignore")
+        model(x, None, mask)
+        traced = torch.jit.trace(_MaskedForward(model).eval(), (x, mask))
+        compiled = torch.jit.freeze(torch.jit.script(CompiledImputationModel(traced).eval()))
+
+    extra_files = {
+        "source_sha256": file_sha256(model_path),
+        "config": json.dumps(config),
+        "model_type": checkpoint.get("model_type", "single"),
+        "attention_backend": attention_backend,
+        "torch_version": torch.__version__,
+    }
+    torch.jit.save(compiled, output_path, _extra_files=extra_files)
+    return output_path
+
+
+def onnx_path(model_path):
+    """Path of the ONNX artifact that belongs to a checkpoint"""
+    return os.path.splitext(model_path)[0] + ONNX_SUFFIX
+
+
+def export_onnx(model_path, output_path=None, opset_version=17):
+    """
+    Export the model in a checkpoint to ONNX with a dynamic batch axis.
+
+    The graph takes "values" (float32, scaled, missing entries set to 0) and
+    "mask" (int32, 1 where missing), both [batch, num_features], and returns
+    "imputed" with the same shape. The mask may also be [1, num_features] for
+    a batch whose rows share one missingness pattern. The reference attention backend is used,
+    since the exporter lowers the step-by-step ops directly.
+
+    Args:
+        model_path: Checkpoint with "config", "model_state_dict" and optionally "model_type"
+        output_path: Where to write the model; next to the checkpoint by default
+        opset_version: ONNX opset to target
+
+    Returns:
+        Path of the written model
+    """
+    import onnx
+
+    output_path = output_path or onnx_path(model_path)
+    checkpoint = torch.load(model_path, map_location="cpu")
+    config = checkpoint["config"]
+    num_features = config.get("num_features", 39)  # Default to 39 if not stored
+
+    model, _ = build_inference_model(checkpoint, torch.device("cpu"))
+    x = torch.randn(8, num_features)
+    mask = (torch.rand(8, num_features) < 0.2).int()
+
+    with torch.no_grad(), warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        model(x, None, mask)
+        torch.onnx.export(
+            _MaskedForward(model).eval(),
+            (x, mask),
+            output_path,
+            input_names=["values", "mask"],
+            output_names=["imputed"],
+            # The mask has its own batch axis so a single broadcast pattern row is accepted
+            dynamic_axes={"values": {0: "batch"}, "mask": {0: "mask_batch"}, "imputed": {0: "batch"}},
+            opset_version=opset_version,
+            dynamo=False,
+        )
+
+    # Same metadata as the TorchScript extra files, as ONNX metadata properties
+    onnx_model = onnx.load(output_path)
+    metadata = {
+        "source_sha256": file_sha256(model_path),
+        "config": json.dumps(config),
+        "model_type": checkpoint.get("model_type", "single"),
+        "torch_version": torch.__version__,
+    }
+    for key, value in metadata.items():
+        onnx_model.metadata_props.add(key=key, value=value)
+    onnx.save(onnx_model, output_path)
+    return output_path
+
+
+def export_scaler_params(model_path, scaler_path, output_path=None):
+    """
+    Extract the parameters of a pickled sklearn scaler into a .npz next to the checkpoint.
+
+    Args:
+        model_path: Checkpoint the parameters belong to
+        scaler_path: Pickled, fitted sklearn scaler
+        output_path: Where to write the parameters; next to the checkpoint by default
+
+    Returns:
+        Path of the written parameters
+    """
+    import pickle
+    from models.scaler_params import ScalerParams, scaler_params_path
+
+    output_path = output_path or scaler_params_path(model_path)
+    with open(scaler_path, "rb") as f:
+        scaler = pickle.load(f)
+    ScalerParams.from_sklearn(scaler, file_sha256(scaler_path)).save(output_path)
+    return output_path
+
+
+def load_torchscript(model_path, device, attention_backend="reference"):
+    """
+    Load the compiled artifact for a checkpoint if it matches it.
+
+    Args:
+        model_path: Checkpoint the artifact must have been exported from
+        device: Device to map the artifact to
+        attention_backend: Backend the service is configured with
+
+    Returns:
+        Tuple of (module, metadata), or None when there is no usable artifact
+    """
+    path = artifact_path(model_path)
+    if not os.path.exists(path):
+        return None
+
+    extra_files = dict.fromkeys(EXTRA_FILES, "")
+    module = torch.jit.load(path, map_location=device, _extra_files=extra_files)
+    extra_files = {name: value.decode() for name, value in extra_files.items()}
+
+    if extra_files["source_sha256"] != file_sha256(model_path):
+        print(f"Compiled model {path} is stale: checkpoint hash does not match")
+        return None
+    if extra_files["attention_backend"] != attention_backend:
+        print(f"Compiled model {path} uses the {extra_files['attention_backend']} attention backend, "
+              f"not {attention_backend}")
+        return None
+
+    metadata = {
+        "path": path,
+        "config": json.loads(extra_files["config"]),
+        "model_type": extra_files["model_type"],
+        "torch_version": extra_files["torch_version"],
+    }
+    return module.eval(), metadata
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model-path", default=os.environ.get("MODEL_PATH", "models/tabular_transformer_relpos.pth"))
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="torchscript")
+    parser.add_argument("--output-path",
+                        help="Defaults to the checkpoint path with a .torchscript.pt, .onnx or .scaler.npz suffix")
+    parser.add_argument("--scaler-path", default=os.environ.get("SCALER_PATH", "models/scaler.pkl"),
+                        help="Scaler to export with --format scaler")
+    parser.add_argument("--attention-backend", choices=ATTENTION_BACKENDS,
+                        default=os.environ.get("ATTENTION_BACKEND", "reference"),
+                        help="TorchScript only; ONNX always uses the reference backend")
+    args = parser.parse_args()
+
+    start_time = time.time()
+    if args.format == "onnx":
+        path = export_onnx(args.model_path, args.output_path)
+    elif args.format == "scaler":
+        path = export_scaler_params(args.model_path, args.scaler_path, args.output_path)
+    else:
+        path = export_torchscript(args.model_path, args.output_path, args.attention_backend)
+    print(f"Exported {args.model_path} to {path} in {time.time() - start_time:.2f} seconds")
+
+
+if __name__ == "__main__":
+    main()
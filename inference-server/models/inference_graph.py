@@ -0,0 +1,117 @@
+import time
+import torch
+from models.transformer_model import EnsembleModel, MultiHeadAttentionWithRelPos, TabularTransformerWithRelPos
+
+# Submodules of MultiHeadAttentionWithRelPos that forward never calls: the fixed
+# -|i-j| * 0.1 distance bias replaced the learned relative position encoding
+UNUSED_ATTENTION_MODULES = ("rel_pos_encoding", "rel_pos_proj")
+
+
+def _instantiate(config, model_type, init_weights=True):
+    """
+    Create the model described by a checkpoint config.
+
+    Args:
+        config: Checkpoint config with the architecture hyperparameters
+        model_type: "ensemble" for EnsembleModel, anything else for a single model
+        init_weights: Whether to run the model's weight initialization; skip it
+            when a checkpoint is loaded right after
+
+    Returns:
+        Untrained model
+    """
+    num_features = config.get("num_features", 39)  # Default to 39 if not stored
+
+    if model_type == "ensemble":
+        return EnsembleModel(
+            num_features=num_features,
+            config=config,
+            num_models=3,  # Default ensemble size from the notebook
+            init_weights=init_weights
+        )
+
+    return TabularTransformerWithRelPos(
+        num_features=num_features,
+        d_model=config["d_model"],
+        nhead=config["num_heads"],
+        num_layers=config["num_layers"],
+        dim_feedforward=config["dim_feedforward"],
+        dropout=config["dropout"],
+        activation=config["activation"],
+        max_seq_len=max(2 * num_features, 100),
+        init_weights=init_weights
+    )
+
+
+def _parameter_stats(model):
+    """Count (parameters, bytes) of a model; shared weights are counted once"""
+    params = list(model.parameters())
+    return sum(p.numel() for p in params), sum(p.numel() * p.element_size() for p in params)
+
+
+def prune_unused_modules(model):
+    """
+    Remove the attention submodules that forward never reaches.
+
+    Args:
+        model: Model containing MultiHeadAttentionWithRelPos blocks
+
+    Returns:
+        Tuple of state dict key prefixes that belonged to the removed modules
+    """
+    # Every alias of a shared layer has its own keys in the state dict
+    prefixes = []
+    for name, module in model.named_modules(remove_duplicate=False):
+        if isinstance(module, MultiHeadAttentionWithRelPos):
+            prefixes.extend(f"{name}.{attr}." for attr in UNUSED_ATTENTION_MODULES if hasattr(module, attr))
+
+    for module in model.modules():
+        if isinstance(module, MultiHeadAttentionWithRelPos):
+            for attr in UNUSED_ATTENTION_MODULES:
+                if hasattr(module, attr):
+                    delattr(module, attr)
+
+    return tuple(prefixes)
+
+
+def build_inference_model(checkpoint, device):
+    """
+    Build an eval-mode model from a checkpoint with only the weights inference uses.
+
+    The model is created without its Kaiming initialization pass, since the
+    checkpoint overwrites those weights anyway. The unused attention modules
+    are removed and the checkpoint tensors are assigned in place of the
+    placeholder parameters instead of being copied into them.
+
+    Args:
+        checkpoint: Loaded checkpoint dict with "config", "model_state_dict"
+            and optionally "model_type"
+        device: Device the checkpoint tensors were mapped to
+
+    Returns:
+        Tuple of (model, report), where report holds the parameter and memory savings
+    """
+    start_time = time.time()
+
+    model = _instantiate(checkpoint["config"], checkpoint.get("model_type"), init_weights=False)
+    params_before, bytes_before = _parameter_stats(model)
+
+    pruned_prefixes = prune_unused_modules(model)
+    params_after, bytes_after = _parameter_stats(model)
+
+    # Drop the checkpoint entries of the removed modules, then load the rest strictly
+    state_dict = {
+        key: value for key, value in checkpoint["model_state_dict"].items()
+        if not key.startswith(pruned_prefixes)
+    }
+    model.load_state_dict(state_dict, assign=True)
+    model.to(device).eval()
+
+    report = {
+        "parameters_before": params_before,
+        "parameters_after": params_after,
+        "pruned_parameters": params_before - params_after,
+        "saved_mb": (bytes_before - bytes_after) / 1024 ** 2,
+        "build_seconds": time.time() - start_time,
+    }
+    return model, report
@@ -0,0 +1,106 @@
+from collections import OrderedDict
+import numpy as np
+import torch
+
+
+class MaskPatternCache:
+    """
+    LRU cache of mask-only tensors, keyed by the missingness pattern they were built from.
+
+    Only tensors that depend on nothing but the mask (and fixed buffers such as
+    the distance bias) belong here; anything computed from weights would go
+    stale when the weights change. Only masks shared by a whole batch
+    ([1, num_features]) are cached: they repeat across pattern-homogeneous
+    batches and across layers, and their entries are small.
+
+    It does not reliably pay off on CPU. Rebuilding a [1, F, F] mask tensor
+    costs about as much as the host-side key of a lookup, and
+    mask_cache_benchmark has measured pattern batches between 0.88x and 1.2x
+    with the cache. Per-row masks always build their tensors; their
+    missingness encodings already come from the encoder's lookup table.
+    Leave the cache off unless the benchmark shows a gain on the target
+    hardware.
+    """
+    def __init__(self, max_entries):
+        """
+        Args:
+            max_entries (int): Entries kept before the least recently used one is evicted
+        """
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+
+    def get(self, name, mask, build, *key_parts):
+        """
+        Get a cached tensor for a mask pattern, building it on a miss.
+
+        The key reads the mask on the host, so on GPU every lookup synchronizes.
+
+        Args:
+            name (str): Kind of tensor, so different tensors of one pattern do not collide
+            mask (torch.Tensor): Missing value mask [1, num_features]
+            build (callable): Builds the tensor when it is not cached
+            *key_parts: Anything else the tensor depends on, e.g. its dtype
+
+        Returns:
+            torch.Tensor: The cached or newly built tensor
+        """
+        pattern = np.packbits(mask.detach().cpu().numpy().astype(bool), axis=-1).tobytes()
+        key = (name, tuple(mask.shape), str(mask.device), pattern) + key_parts
+
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        value = build()
+        self._entries[key] = value
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return value
+
+    def clear(self):
+        """Drop every entry; the counters are kept"""
+        self._entries.clear()
+
+    def metrics(self, since=None):
+        """
+        Summary of cache usage.
+
+        Args:
+            since (dict): Earlier metrics; counters are reported relative to them
+
+        Returns:
+            dict: Entries, hits, misses, evictions and hit rate
+        """
+        hits, misses, evictions = self.hits, self.misses, self.evictions
+        if since is not None:
+            hits -= since["hits"]
+            misses -= since["misses"]
+            evictions -= since["evictions"]
+        lookups = hits + misses
+        return {
+            "max_entries": self.max_entries,
+            "entries": len(self._entries),
+            "hits": hits,
+            "misses": misses,
+            "evictions": evictions,
+            "hit_rate": round(hits / lookups, 4) if lookups else None,
+        }
+
+
+def cached_mask_tensor(cache, name, mask, build, *key_parts):
+    """
+    Look a mask-only tensor up in a model's cache, or just build it when caching does not apply.
+
+    Per-row masks and traced exports always build the tensor: a trace must not
+    bake in a lookup.
+    """
+    if cache is None or mask.dim() != 2 or mask.size(0) != 1 or torch.jit.is_tracing():
+        return build()
+    return cache.get(name, mask, build, *key_parts)
@@ -0,0 +1,92 @@
+import copy
+import torch
+import torch.nn as nn
+
+QUANTIZATION_MODES = ("none", "int8", "bf16")
+
+# Linear layers narrower than this on either side (the scalar value embedding,
+# the final projection to one value) cost little and lose the most precision
+MIN_QUANTIZED_FEATURES = 16
+
+
+class AutocastModel(nn.Module):
+    """
+    Wrapper that runs a reduced-precision model under autocast and returns float32.
+    """
+    def __init__(self, model, dtype):
+        super().__init__()
+        self.model = model
+        self.dtype = dtype
+
+    def forward(self, *args, **kwargs):
+        device_type = next(self.model.parameters()).device.type
+        with torch.autocast(device_type=device_type, dtype=self.dtype):
+            return self.model(*args, **kwargs).float()
+
+
+def quantize_model(model, mode):
+    """
+    Create a reduced-precision copy of an eval-mode model.
+
+    Args:
+        model: float32 model to copy
+        mode: "int8" for dynamic INT8 on the wide nn.Linear layers, "bf16" for
+            bfloat16 weights run under autocast
+
+    Returns:
+        Quantized copy; the original model is left untouched
+    """
+    if mode == "int8":
+        # Only plain nn.Linear: nn.MultiheadAttention keeps its own out_proj subclass in float
+        layers = {
+            name for name, module in model.named_modules()
+            if type(module) is nn.Linear
+            and min(module.in_features, module.out_features) >= MIN_QUANTIZED_FEATURES
+        }
+        return torch.ao.quantization.quantize_dynamic(copy.deepcopy(model), layers, dtype=torch.qint8)
+    if mode == "bf16":
+        return AutocastModel(copy.deepcopy(model).to(torch.bfloat16), torch.bfloat16).eval()
+    raise ValueError(f"Unknown quantization mode: {mode}")
+
+
+def nrmse(reference, candidate, mask):
+    """
+    Root mean squared error over the masked positions, normalized by the reference spread.
+
+    Args:
+        reference: float32 model predictions [batch_size, num_features]
+        candidate: Quantized model predictions [batch_size, num_features]
+        mask: Positions that were imputed [batch_size, num_features]
+
+    Returns:
+        NRMSE as a float
+    """
+    selected = mask.bool()
+    reference = reference[selected].double()
+    candidate = candidate[selected].double()
+    rmse = torch.sqrt(torch.mean((candidate - reference) ** 2))
+    return (rmse / reference.std().clamp_min(1e-12)).item()
+
+
+def accuracy_gate(reference_model, quantized_model, values, mask, batch_size=256):
+    """
+    Compare a quantized model against the float32 model on a held-out sample.
+
+    Args:
+        reference_model: float32 model
+        quantized_model: Candidate from quantize_model
+        values: Scaled inputs with missing entries set to 0 [num_rows, num_features]
+        mask: Missing value mask, 1 where the model imputes [num_rows, num_features]
+        batch_size: Rows per forward pass
+
+    Returns:
+        NRMSE of the quantized predictions at the masked positions
+    """
+    reference, candidate = [], []
+    with torch.no_grad():
+        for start in range(0, values.size(0), batch_size):
+            batch = values[start:start + batch_size]
+            batch_mask = mask[start:start + batch_size]
+            reference.append(reference_model(batch, None, batch_mask))
+            candidate.append(quantized_model(batch, None, batch_mask))
+    return nrmse(torch.cat(reference), torch.cat(candidate), mask)
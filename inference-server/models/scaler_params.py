@@ -0,0 +1,207 @@
+"""
+Scaler parameters extracted from a fitted sklearn scaler, stored without pickle.
+
+The parameters are saved as a .npz next to the checkpoint and loaded with
+allow_pickle=False, so serving does not unpickle the scaler. ScalerParams
+repeats the scaler's own float64 operations, so it transforms exactly like
+the sklearn object without its per-call validation. TensorScaler applies the
+same parameters as float32 tensors inside the model graph, on the model
+device.
+
+Usage (from the inference-server directory):
+    python -m models.export --format scaler --model-path models/tabular_transformer_relpos.pth \\
+        --scaler-path models/scaler.pkl
+"""
+import os
+import numpy as np
+import torch
+import torch.nn as nn
+
+SCALER_PARAMS_SUFFIX = ".scaler.npz"
+
+# "affine": (x - center) / scale, for StandardScaler, RobustScaler and MaxAbsScaler
+# "minmax": x * scale + min, for MinMaxScaler
+SCALER_KINDS = ("affine", "minmax")
+
+
+def scaler_params_path(model_path):
+    """Path of the scaler parameters that belong to a checkpoint"""
+    return os.path.splitext(model_path)[0] + SCALER_PARAMS_SUFFIX
+
+
+class ScalerParams:
+    """
+    Per-feature scaling parameters, with the transform and inverse_transform of the scaler they came from.
+    """
+    def __init__(self, kind, offset, scale, feature_names=None, source_sha256=None, params_in_input_dtype=True):
+        """
+        Args:
+            kind (str): One of SCALER_KINDS
+            offset (np.ndarray): Center ("affine") or min ("minmax") per feature
+            scale (np.ndarray): Scale per feature
+            feature_names (list): Names the scaler was fitted with, if any
+            source_sha256 (str): Hash of the pickled scaler the parameters came from
+            params_in_input_dtype (bool): Cast the parameters to float32 for
+                float32 input, as StandardScaler does; the other scalers apply
+                them in float64 and round the result
+        """
+        if kind not in SCALER_KINDS:
+            raise ValueError(f"Unknown scaler kind: {kind}")
+        self.kind = kind
+        self.offset = np.asarray(offset, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self.n_features_in_ = len(self.scale)
+        self.source_sha256 = source_sha256
+        self.params_in_input_dtype = bool(params_in_input_dtype)
+        self.path = None
+        if feature_names is not None:
+            self.feature_names_in_ = np.asarray(feature_names, dtype=object)
+
+    @classmethod
+    def from_sklearn(cls, scaler, source_sha256=None):
+        """
+        Extract the parameters of a fitted sklearn scaler.
+
+        Raises:
+            ValueError: For scalers other than StandardScaler, RobustScaler,
+                MaxAbsScaler and MinMaxScaler, or ones that clip
+        """
+        name = type(scaler).__name__
+        if getattr(scaler, "clip", False):
+            raise ValueError(f"{name} with clip=True is not supported")
+
+        num_features = scaler.n_features_in_
+        if name == "MinMaxScaler":
+            kind, offset, scale = "minmax", scaler.min_, scaler.scale_
+        elif name == "StandardScaler":
+            kind = "affine"
+            offset = scaler.mean_ if scaler.with_mean else None
+            scale = scaler.scale_ if scaler.with_std else None
+        elif name == "RobustScaler":
+            kind = "affine"
+            offset = scaler.center_ if scaler.with_centering else None
+            scale = scaler.scale_ if scaler.with_scaling else None
+        elif name == "MaxAbsScaler":
+            kind, offset, scale = "affine", None, scaler.scale_
+        else:
+            raise ValueError(f"{name} is not supported")
+
+        # Disabled centering or scaling: subtracting 0 and dividing by 1 leave values bit for bit unchanged
+        offset = np.zeros(num_features) if offset is None else offset
+        scale = np.ones(num_features) if scale is None else scale
+        return cls(kind, offset, scale, getattr(scaler, "feature_names_in_", None), source_sha256,
+                   params_in_input_dtype=name == "StandardScaler")
+
+    @classmethod
+    def load(cls, path):
+        """Load parameters saved with save(), without unpickling anything"""
+        with np.load(path, allow_pickle=False) as data:
+            params = cls(
+                str(data["kind"]),
+                data["offset"],
+                data["scale"],
+                [str(name) for name in data["feature_names"]] if "feature_names" in data else None,
+                str(data["source_sha256"]) if "source_sha256" in data else None,
+                bool(data["params_in_input_dtype"]),
+            )
+        params.path = path
+        return params
+
+    def save(self, path):
+        arrays = {
+            "kind": np.array(self.kind),
+            "offset": self.offset,
+            "scale": self.scale,
+            "params_in_input_dtype": np.array(self.params_in_input_dtype),
+        }
+        if hasattr(self, "feature_names_in_"):
+            arrays["feature_names"] = np.array([str(name) for name in self.feature_names_in_])
+        if self.source_sha256 is not None:
+            arrays["source_sha256"] = np.array(self.source_sha256)
+        with open(path, "wb") as f:
+            np.savez(f, **arrays)
+
+    def _params_for(self, X, copy):
+        """
+        X as a float array, copied unless copy is False and it already is
+        one, and the parameters in the dtype the scaler applies them in.
+        """
+        X = np.array(X) if copy else np.asarray(X)
+        if X.dtype not in (np.float32, np.float64):
+            X = X.astype(np.float64)
+        if not self.params_in_input_dtype:
+            return X, self.offset, self.scale
+        return X, self.offset.astype(X.dtype, copy=False), self.scale.astype(X.dtype, copy=False)
+
+    def transform(self, X, copy=True):
+        """
+        Scale rows of features with the same operations as the sklearn scaler.
+
+        Args:
+            X (np.ndarray): Rows of features
+            copy (bool): False scales a float array in place
+        """
+        X, offset, scale = self._params_for(X, copy)
+        if self.kind == "minmax":
+            X *= scale
+            X += offset
+        else:
+            X -= offset
+            X /= scale
+        return X
+
+    def inverse_transform(self, X, copy=True):
+        """Undo transform with the same operations as the sklearn scaler; copy as in transform"""
+        X, offset, scale = self._params_for(X, copy)
+        if self.kind == "minmax":
+            X -= offset
+            X /= scale
+        else:
+            X *= scale
+            X += offset
+        return X
+
+
+class TensorScaler(nn.Module):
+    """
+    ScalerParams as float32 buffers, applied to tensors on the model device.
+    """
+    def __init__(self, params):
+        super().__init__()
+        self.kind = params.kind
+        self.register_buffer("offset", torch.tensor(params.offset, dtype=torch.float32))
+        self.register_buffer("scale", torch.tensor(params.scale, dtype=torch.float32))
+
+    def transform(self, x):
+        if self.kind == "minmax":
+            return torch.addcmul(self.offset, x, self.scale)
+        return (x - self.offset) / self.scale
+
+    def inverse_transform(self, x):
+        if self.kind == "minmax":
+            return (x - self.offset) / self.scale
+        return torch.addcmul(self.offset, x, self.scale)
+
+
+def load_scaler_params(model_path, scaler_path):
+    """
+    Load the scaler parameters exported next to a checkpoint if they match the scaler.
+
+    The parameters are used when the pickled scaler has the hash they were
+    exported from, or when there is no pickled scaler at all, so a server can
+    ship with only the .npz.
+
+    Returns:
+        ScalerParams, or None when there are no usable parameters
+    """
+    from models.export import file_sha256
+
+    path = scaler_params_path(model_path)
+    if not os.path.exists(path):
+        return None
+
+    params = ScalerParams.load(path)
+    if os.path.exists(scaler_path) and params.source_sha256 != file_sha256(scaler_path):
+        print(f"Scaler parameters {path} are stale: scaler hash does not match")
+        return None
+    return params
@@ -2,6 +2,7 @@ import torch
 import torch.nn as nn
 import torch.nn.functional as F
 import math
+from models.mask_cache import cached_mask_tensor
 
 class FeatureCorrelationModule(nn.Module):
     """
@@ -17,6 +18,9 @@ class FeatureCorrelationModule(nn.Module):
         self.correlation_norm = nn.LayerNorm(d_model)
         self.dropout = nn.Dropout(dropout)
         
+        # Optional MaskPatternCache, set with set_mask_cache
+        self.mask_cache = None
+        
     def forward(self, x, mask=None):
         """
         Args:
@@ -34,10 +38,13 @@ class FeatureCorrelationModule(nn.Module):
      
         if mask is not None:
       
-            obs_mask = 1 - mask.float()
-            mask_matrix = torch.bmm(obs_mask.unsqueeze(2), obs_mask.unsqueeze(1))
+            def build_unobserved_pairs():
+                obs_mask = 1 - mask.float()
+                mask_matrix = torch.bmm(obs_mask.unsqueeze(2), obs_mask.unsqueeze(1))
+                return mask_matrix == 0
             
-            masked_corr = corr_matrix.masked_fill(mask_matrix == 0, -1e9)
+            unobserved_pairs = cached_mask_tensor(self.mask_cache, "unobserved_pairs", mask, build_unobserved_pairs)
+            masked_corr = corr_matrix.masked_fill(unobserved_pairs, -1e9)
            
             corr_weights = F.softmax(masked_corr, dim=-1)
         else:
@@ -92,6 +99,49 @@ class FeatureValueDependentEncoder(nn.Module):
             nn.LayerNorm(d_model)
         )
         
+        # Cached missingness_encoder outputs for 0 and 1 [2, d_model]; built on the first eval forward
+        self.register_buffer("missingness_table", torch.empty(0), persistent=False)
+    
+    def train(self, mode=True):
+        # The weights may change while training, so the table is rebuilt on the next eval forward
+        if mode:
+            self.missingness_table = torch.empty(0, device=self.missingness_table.device)
+        return super().train(mode)
+    
+    def _load_from_state_dict(self, state_dict, prefix, local_metadata, strict,
+                              missing_keys, unexpected_keys, error_msgs):
+        """Drop the cached table, which was built from the weights being replaced"""
+        self.missingness_table = torch.empty(0, device=self.missingness_table.device)
+        super()._load_from_state_dict(state_dict, prefix, local_metadata, strict,
+                                      missing_keys, unexpected_keys, error_msgs)
+    
+    def _encode_missingness(self, mask):
+        """
+        Encode the mask with missingness_encoder.
+        
+        The encoder sees a single 0/1 value per feature, so in eval mode it is
+        run once over both values and the [2, d_model] result is kept in
+        missingness_table and selected per feature, instead of running the MLP
+        over every entry. Training keeps the per-entry path so dropout stays per
+        entry.
+        
+        Args:
+            mask: Missing value mask [batch_size, num_features]
+            
+        Returns:
+            Mask encoding [batch_size, num_features, d_model]
+        """
+        if self.training:
+            return self.missingness_encoder(mask.float().unsqueeze(-1))
+        
+        table = self.missingness_table
+        if table.dim() != 2 or table.device != mask.device:
+            with torch.no_grad():
+                mask_values = torch.tensor([[0.0], [1.0]], device=mask.device)
+                table = self.missingness_encoder(mask_values)
+            self.missingness_table = table
+        return torch.where(mask.bool().unsqueeze(-1), table[1], table[0])
+        
     def forward(self, x, mask=None):
         """
         Args:
@@ -106,10 +156,12 @@ class FeatureValueDependentEncoder(nn.Module):
         
         if mask is not None:
          
-            mask_encoding = self.missingness_encoder(mask.float().unsqueeze(-1))
+            mask_encoding = self._encode_missingness(mask)
 
  
             batch_size, num_features, d_model = value_encoding.size()
+            # A [1, num_features] mask shared by the whole batch is encoded once, then broadcast
+            mask_encoding = mask_encoding.expand(batch_size, -1, -1)
             v_enc = value_encoding.transpose(0, 1)
             m_enc = mask_encoding.transpose(0, 1)
 
@@ -159,21 +211,31 @@ class RelativePositionEncoding(nn.Module):
         
         return rel_pos_encoded
     
+ATTENTION_BACKENDS = ("reference", "sdpa")
+
+
 class MultiHeadAttentionWithRelPos(nn.Module):
     """
     Multi-head attention with relative positional encoding.
+    
+    The "reference" backend computes attention step by step. The "sdpa" backend
+    folds the distance bias and the key padding mask into one float mask and
+    calls the fused scaled_dot_product_attention kernel instead. The outputs
+    match; a row whose keys are all masked comes back as NaN from both, which
+    the fused kernel would otherwise turn into zeros.
     """
-    def __init__(self, d_model, num_heads, dropout=0.1, max_seq_len=1000):
+    def __init__(self, d_model, num_heads, dropout=0.1, max_seq_len=1000, attention_backend="reference"):
         super().__init__()
         assert d_model % num_heads == 0, "d_model must be divisible by num_heads"
+        assert attention_backend in ATTENTION_BACKENDS, f"Unknown attention backend: {attention_backend}"
         
+        self.attention_backend = attention_backend
         self.d_model = d_model
         self.num_heads = num_heads
         self.head_dim = d_model // num_heads
         
-        self.q_proj = nn.Linear(d_model, d_model)
-        self.k_proj = nn.Linear(d_model, d_model)
-        self.v_proj = nn.Linear(d_model, d_model)
+        # Query, key and value projections packed into one [3 * d_model, d_model] weight
+        self.qkv_proj = nn.Linear(d_model, 3 * d_model)
         self.out_proj = nn.Linear(d_model, d_model)
         
 
@@ -185,6 +247,56 @@ class MultiHeadAttentionWithRelPos(nn.Module):
         
         self.dropout = nn.Dropout(dropout)
         
+        # Cached distance bias [1, 1, seq_len, seq_len]; depends only on the sequence length
+        self.register_buffer("rel_bias", torch.empty(0), persistent=False)
+        
+        # Optional MaskPatternCache, set with set_mask_cache
+        self.mask_cache = None
+    
+    def _load_from_state_dict(self, state_dict, prefix, local_metadata, strict,
+                              missing_keys, unexpected_keys, error_msgs):
+        """Pack the separate q_proj/k_proj/v_proj weights of older checkpoints into qkv_proj"""
+        for suffix in ("weight", "bias"):
+            keys = [f"{prefix}{name}_proj.{suffix}" for name in ("q", "k", "v")]
+            if all(key in state_dict for key in keys):
+                state_dict[f"{prefix}qkv_proj.{suffix}"] = torch.cat([state_dict.pop(key) for key in keys], dim=0)
+        super()._load_from_state_dict(state_dict, prefix, local_metadata, strict,
+                                      missing_keys, unexpected_keys, error_msgs)
+    
+    def _project_qkv(self, query, key, value):
+        """
+        Project the inputs to heads, with a single GEMM when it is self-attention.
+        
+        Returns:
+            q, k, v tensors [batch_size, num_heads, seq_len, head_dim]
+        """
+        batch_size = query.size(0)
+        seq_len = query.size(1)
+        
+        if query is key and key is value:
+            qkv = self.qkv_proj(query).view(batch_size, seq_len, 3, self.num_heads, self.head_dim)
+            q, k, v = qkv.permute(2, 0, 3, 1, 4).unbind(0)
+            return q, k, v
+        
+        # Distinct inputs: apply each slice of the packed weight separately
+        weights = self.qkv_proj.weight.chunk(3, dim=0)
+        biases = self.qkv_proj.bias.chunk(3, dim=0)
+        q, k, v = (
+            F.linear(x, weight, bias).view(batch_size, seq_len, self.num_heads, self.head_dim).transpose(1, 2)
+            for x, weight, bias in zip((query, key, value), weights, biases)
+        )
+        return q, k, v
+    
+    def _get_rel_bias(self, seq_len, device, dtype):
+        """Get the relative distance bias, rebuilding the cached buffer only when seq_len, device or dtype change"""
+        rel_bias = self.rel_bias
+        if rel_bias.dim() != 4 or rel_bias.size(-1) != seq_len or rel_bias.device != device or rel_bias.dtype != dtype:
+            positions = torch.arange(seq_len, device=device)
+            relative_positions = positions.unsqueeze(1) - positions.unsqueeze(0)
+            rel_bias = (-torch.abs(relative_positions) * 0.1).to(dtype)
+            self.rel_bias = rel_bias.unsqueeze(0).unsqueeze(0)
+        return self.rel_bias
+        
     def forward(self, query, key, value, key_padding_mask=None, need_weights=False):
         """
         Forward pass with relative positional encoding.
@@ -200,20 +312,15 @@ class MultiHeadAttentionWithRelPos(nn.Module):
         batch_size = query.size(0)
         seq_len = query.size(1)
 
-        q = self.q_proj(query).view(batch_size, seq_len, self.num_heads, self.head_dim).transpose(1, 2)
-        k = self.k_proj(key).view(batch_size, seq_len, self.num_heads, self.head_dim).transpose(1, 2)
-        v = self.v_proj(value).view(batch_size, seq_len, self.num_heads, self.head_dim).transpose(1, 2)
+        q, k, v = self._project_qkv(query, key, value)
 
-        attn_scores = torch.matmul(q, k.transpose(-2, -1)) * self.scale  # [batch, heads, seq_len, seq_len]
+        if self.attention_backend == "sdpa" and not need_weights:
+            return self._sdpa_attention(q, k, v, key_padding_mask)
 
-        rel_bias = torch.zeros((seq_len, seq_len), device=query.device)
-        positions = torch.arange(seq_len, device=query.device)
-        relative_positions = positions.unsqueeze(1) - positions.unsqueeze(0)
+        attn_scores = torch.matmul(q, k.transpose(-2, -1)) * self.scale  # [batch, heads, seq_len, seq_len]
 
-        rel_bias = -torch.abs(relative_positions) * 0.1
-        
- 
-        attn_scores = attn_scores + rel_bias.unsqueeze(0).unsqueeze(0)
+        # Fixed distance bias -|i-j| * 0.1, built once per sequence length
+        attn_scores = attn_scores + self._get_rel_bias(seq_len, query.device, attn_scores.dtype)
         
         if key_padding_mask is not None:
      
@@ -233,6 +340,44 @@ class MultiHeadAttentionWithRelPos(nn.Module):
             return output, attn_weights
         else:
             return output
+    
+    def _sdpa_attention(self, q, k, v, key_padding_mask):
+        """
+        Attention through the fused kernel, with the same bias and masking as the reference path.
+        
+        Args:
+            q, k, v: Projected heads [batch_size, num_heads, seq_len, head_dim]
+            key_padding_mask: Mask for padded values [batch_size, seq_len]
+            
+        Returns:
+            Output tensor [batch_size, seq_len, d_model]
+        """
+        batch_size, _, seq_len, _ = q.shape
+        
+        # Fold the distance bias and the padding mask into one additive float mask
+        attn_mask = self._get_rel_bias(seq_len, q.device, q.dtype)
+        if key_padding_mask is not None:
+            rel_bias = attn_mask
+            attn_mask = cached_mask_tensor(
+                self.mask_cache, "sdpa_mask", key_padding_mask,
+                lambda: rel_bias.masked_fill(key_padding_mask.unsqueeze(1).unsqueeze(2), float('-inf')),
+                q.dtype
+            )
+        
+        output = F.scaled_dot_product_attention(
+            q, k, v,
+            attn_mask=attn_mask,
+            dropout_p=self.dropout.p if self.training else 0.0,
+            scale=self.scale,
+        )
+        if key_padding_mask is not None:
+            # Softmax over keys that are all masked is NaN in the reference path; keep it so here
+            fully_masked = key_padding_mask.all(dim=-1).view(-1, 1, 1, 1)
+            output = output.masked_fill(fully_masked, float('nan'))
+        output = output.transpose(1, 2).contiguous().view(batch_size, seq_len, self.d_model)
+        
+        # Final linear projection
+        return self.out_proj(output)
         
 class RelativePositionTransformerLayer(nn.Module):
     """
@@ -331,7 +476,8 @@ class TabularTransformerWithRelPos(nn.Module):
                  dim_feedforward=512, 
                  dropout=0.1, 
                  activation='gelu',
-                 max_seq_len=1000):
+                 max_seq_len=1000,
+                 init_weights=True):
         super().__init__()
         
         self.d_model = d_model
@@ -349,6 +495,9 @@ class TabularTransformerWithRelPos(nn.Module):
         
         # Column embedding (learnable)
         self.column_embedding = nn.Embedding(num_features, d_model)
+        
+        # Default column order, so callers do not have to rebuild it for every batch
+        self.register_buffer("column_indices", torch.arange(num_features), persistent=False)
    
         self.missing_embedding = nn.Parameter(torch.randn(1, d_model))
 
@@ -381,8 +530,9 @@ class TabularTransformerWithRelPos(nn.Module):
             nn.Linear(d_model // 2, 1)
         )
         
-        # Initialize weights
-        self._init_weights()
+        # Initialize weights, unless a checkpoint is about to replace them
+        if init_weights:
+            self._init_weights()
         
     def _init_weights(self):
         """Initialize weights using Kaiming initialization for better convergence"""
@@ -402,14 +552,16 @@ class TabularTransformerWithRelPos(nn.Module):
         attn_mask = mask.bool()
         return attn_mask
                 
-    def forward(self, x, column_indices, mask=None):
+    def forward(self, x, column_indices=None, mask=None):
         """
         Forward pass with enhanced correlation modeling for MNAR patterns.
         
         Args:
             x: Input tensor [batch_size, num_features]
-            column_indices: Tensor of column indices [num_features]
-            mask: Optional mask for missing values [batch_size, num_features]
+            column_indices: Optional tensor of column indices [num_features];
+                None means the columns are in training order
+            mask: Optional mask for missing values [batch_size, num_features],
+                or [1, num_features] when every row has the same pattern
             
         Returns:
             Tensor of predicted values [batch_size, num_features]
@@ -422,8 +574,11 @@ class TabularTransformerWithRelPos(nn.Module):
         # Embed feature values
         x_embedded = self.value_embedding(x)
         
-        # Add column embeddings
-        col_embed = self.column_embedding(column_indices).unsqueeze(0).expand(batch_size, -1, -1)
+        # Add column embeddings; in training order they are the embedding table itself
+        if column_indices is None or column_indices is self.column_indices:
+            col_embed = self.column_embedding.weight.unsqueeze(0).expand(batch_size, -1, -1)
+        else:
+            col_embed = self.column_embedding(column_indices).unsqueeze(0).expand(batch_size, -1, -1)
         x_embedded = x_embedded + col_embed
         
         # Handle missing values if mask is provided
@@ -455,7 +610,7 @@ class EnsembleModel(nn.Module):
     """
     Ensemble of transformer models for improved prediction.
     """
-    def __init__(self, num_features, config, num_models=3):
+    def __init__(self, num_features, config, num_models=3, init_weights=True):
         super().__init__()
         self.num_models = num_models
 
@@ -468,11 +623,12 @@ class EnsembleModel(nn.Module):
                 dim_feedforward=config["dim_feedforward"],
                 dropout=config["dropout"],
                 activation=config["activation"],
-                max_seq_len=max(2 * num_features, 100)
+                max_seq_len=max(2 * num_features, 100),
+                init_weights=init_weights
             ) for _ in range(num_models)
         ])
         
-    def forward(self, x, column_indices, mask=None):
+    def forward(self, x, column_indices=None, mask=None):
 
         all_preds = []
         for model in self.models:
@@ -483,4 +639,40 @@ class EnsembleModel(nn.Module):
         all_preds = torch.cat(all_preds, dim=0)
         avg_preds = torch.mean(all_preds, dim=0)
         
-        return avg_preds
\ No newline at end of file
+        return avg_preds
+
+
+def set_attention_backend(model, backend):
+    """
+    Switch every relative-position attention block in a model to the given backend.
+    
+    Args:
+        model: Module containing MultiHeadAttentionWithRelPos blocks
+        backend: One of ATTENTION_BACKENDS
+        
+    Returns:
+        The model, for chaining
+    """
+    if backend not in ATTENTION_BACKENDS:
+        raise ValueError(f"Unknown attention backend: {backend}")
+    for module in model.modules():
+        if isinstance(module, MultiHeadAttentionWithRelPos):
+            module.attention_backend = backend
+    return model
+
+
+def set_mask_cache(model, cache):
+    """
+    Share one mask pattern cache between every module of a model that can use it.
+    
+    Args:
+        model: Model containing the mask-consuming modules
+        cache: MaskPatternCache, or None to turn caching off
+        
+    Returns:
+        The model, for chaining
+    """
+    for module in model.modules():
+        if isinstance(module, (FeatureCorrelationModule, MultiHeadAttentionWithRelPos)):
+            module.mask_cache = cache
+    return model
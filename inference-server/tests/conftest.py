@@ -0,0 +1,64 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+import torch
+from models.transformer_model import TabularTransformerWithRelPos
+
+NUM_FEATURES = 39
+SCALER_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "models", "scaler.pkl")
+
+# Small enough for a test, with every part of the real architecture
+TINY_CONFIG = {
+    "d_model": 32,
+    "num_heads": 4,
+    "num_layers": 2,
+    "dim_feedforward": 64,
+    "dropout": 0.1,
+    "activation": "gelu",
+    "num_features": NUM_FEATURES,
+}
+
+
+def tiny_model(seed=0):
+    """A randomly initialised model with TINY_CONFIG, in eval mode"""
+    torch.manual_seed(seed)
+    config = TINY_CONFIG
+    model = TabularTransformerWithRelPos(
+        NUM_FEATURES, config["d_model"], config["num_heads"], config["num_layers"],
+        config["dim_feedforward"], config["dropout"], config["activation"], max_seq_len=100
+    )
+    return model.eval()
+
+
+@pytest.fixture
+def tiny_checkpoint(tmp_path):
+    """Path of a checkpoint holding a tiny model"""
+    path = tmp_path / "tiny.pth"
+    torch.save({"model_state_dict": tiny_model().state_dict(), "config": TINY_CONFIG, "model_type": "single"}, path)
+    return str(path)
+
+
+@pytest.fixture
+def service_env(monkeypatch, tiny_checkpoint):
+    """Point ImputationService at the tiny checkpoint and the repository's scaler"""
+    monkeypatch.setenv("MODEL_PATH", tiny_checkpoint)
+    monkeypatch.setenv("SCALER_PATH", SCALER_PATH)
+    monkeypatch.setenv("WARMUP_BATCH_SIZES", "")
+    return tiny_checkpoint
+
+
+def pattern_rows(num_rows, seed=0):
+    """
+    Rows with a few frequent missingness patterns mixed with random ones.
+
+    Returns:
+        pd.DataFrame: NUM_FEATURES feature columns, NaN where missing
+    """
+    rng = np.random.default_rng(seed)
+    values = rng.normal(size=(num_rows, NUM_FEATURES)) * 10 + 50
+    frequent = rng.random((3, NUM_FEATURES)) < 0.3
+    choice = rng.integers(0, 5, num_rows)
+    missing = np.where((choice < 3)[:, None], frequent[np.minimum(choice, 2)], rng.random(values.shape) < 0.2)
+    values[missing] = np.nan
+    return pd.DataFrame(values, columns=[f"f{i}" for i in range(NUM_FEATURES)])
@@ -0,0 +1,52 @@
+"""The sdpa attention backend must predict what the reference backend does"""
+import pytest
+import torch
+from models.transformer_model import set_attention_backend
+from conftest import NUM_FEATURES, tiny_model
+
+
+def _outputs(model, x, mask):
+    outputs = {}
+    with torch.no_grad():
+        for backend in ("reference", "sdpa"):
+            set_attention_backend(model, backend)
+            outputs[backend] = model(x, None, mask)
+    return outputs["reference"], outputs["sdpa"]
+
+
+def test_sdpa_matches_reference():
+    model = tiny_model()
+    torch.manual_seed(1)
+    x = torch.randn(32, NUM_FEATURES)
+    mask = (torch.rand(32, NUM_FEATURES) < 0.2).int()
+    mask[:, 0] = 0
+
+    reference, sdpa = _outputs(model, x, mask)
+    torch.testing.assert_close(sdpa, reference, atol=1e-5, rtol=1e-4)
+
+
+def test_sdpa_matches_reference_with_shared_mask():
+    model = tiny_model()
+    torch.manual_seed(1)
+    x = torch.randn(32, NUM_FEATURES)
+    mask = (torch.rand(1, NUM_FEATURES) < 0.2).int()
+
+    reference, sdpa = _outputs(model, x, mask)
+    torch.testing.assert_close(sdpa, reference, atol=1e-5, rtol=1e-4)
+
+
+@pytest.mark.parametrize("batch_size", [1, 8])
+def test_fully_masked_rows_are_nan(batch_size):
+    # The last row has every feature missing, so there is nothing to attend to
+    model = tiny_model()
+    torch.manual_seed(1)
+    x = torch.randn(batch_size, NUM_FEATURES)
+    mask = (torch.rand(batch_size, NUM_FEATURES) < 0.2).int()
+    mask[:, 0] = 0
+    mask[-1] = 1
+    x[-1] = 0
+
+    reference, sdpa = _outputs(model, x, mask)
+    assert reference[-1].isnan().all()
+    assert sdpa[-1].isnan().all()
+    torch.testing.assert_close(sdpa[:-1], reference[:-1], atol=1e-5, rtol=1e-4)
@@ -0,0 +1,44 @@
+"""CSV schema mode: feature names are required, and streamed files parse like whole ones"""
+import numpy as np
+import pytest
+import torch
+from inference.imputation_service import ImputationService
+from conftest import TINY_CONFIG, pattern_rows, tiny_model
+
+
+def test_schema_mode_without_feature_names_fails_at_load(monkeypatch, service_env):
+    monkeypatch.setenv("CSV_SCHEMA_MODE", "1")
+    service = ImputationService()
+
+    with pytest.raises(ValueError, match="feature names"):
+        service.warm_up()
+
+
+def test_schema_mode_streaming_matches_whole_file(tmp_path, monkeypatch, service_env):
+    df = pattern_rows(1500)
+    config = dict(TINY_CONFIG, feature_names=list(df.columns))
+    model_path = tmp_path / "named.pth"
+    torch.save({"model_state_dict": tiny_model().state_dict(), "config": config, "model_type": "single"}, model_path)
+    monkeypatch.setenv("MODEL_PATH", str(model_path))
+    monkeypatch.setenv("CSV_SCHEMA_MODE", "1")
+
+    # Shuffled columns, a text column and NA spellings the schema treats as missing
+    df = df[list(reversed(df.columns))]
+    df.insert(3, "note", np.where(np.arange(len(df)) % 7 == 0, "see chart, twice", ""))
+    input_path = tmp_path / "input.csv"
+    df.to_csv(input_path, index=False, na_rep="NA")
+
+    service = ImputationService()
+    outputs = {}
+    for chunk_size in (0, 400):
+        output_path = tmp_path / f"out_{chunk_size}.csv"
+        service.impute_csv(str(input_path), str(output_path), batch_size=64, chunk_size=chunk_size)
+        outputs[chunk_size] = output_path.read_bytes()
+    with open(input_path, "rb") as input_stream:
+        output_path = tmp_path / "out_stream.csv"
+        service.impute_csv(str(input_path), str(output_path), batch_size=64, chunk_size=400, input_stream=input_stream)
+        outputs["stream"] = output_path.read_bytes()
+
+    assert outputs[400] == outputs[0]
+    assert outputs["stream"] == outputs[0]
+    assert b",NA," not in outputs[0]
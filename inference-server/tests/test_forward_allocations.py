@@ -0,0 +1,22 @@
+"""A steady-state forward pass must not rebuild anything that only depends on the sequence length"""
+import pytest
+import torch
+from benchmarks.profile_forward_allocations import CACHED_OPS, profile_forward
+from models.transformer_model import ATTENTION_BACKENDS, set_attention_backend
+from conftest import NUM_FEATURES, tiny_model
+
+
+@pytest.mark.parametrize("attention_backend", ATTENTION_BACKENDS)
+@pytest.mark.parametrize("mask_rows", [16, 1], ids=["per_row_mask", "shared_mask"])
+def test_steady_state_forward_skips_cached_ops(attention_backend, mask_rows):
+    model = tiny_model()
+    set_attention_backend(model, attention_backend)
+    x = torch.randn(16, NUM_FEATURES)
+    mask = (torch.rand(mask_rows, NUM_FEATURES) < 0.2).int()
+
+    with torch.no_grad():
+        for _ in range(2):
+            model(x, None, mask)
+    events = profile_forward(model, x, mask)
+
+    assert [name for name in CACHED_OPS if name in events] == []
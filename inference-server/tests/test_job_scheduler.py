@@ -0,0 +1,65 @@
+"""The job scheduler recovers from a dead worker and fails the jobs it drops at shutdown"""
+import os
+import time
+import pytest
+import inference.job_scheduler as job_scheduler_module
+from inference.job_registry import JobRegistry
+from inference.job_scheduler import JobScheduler
+
+
+def _crash():
+    os._exit(1)
+
+
+def _finish(registry_path, job_id):
+    JobRegistry(registry_path).mark_completed(job_id, {"rows": 1})
+
+
+def _sleep(seconds):
+    time.sleep(seconds)
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    registry = JobRegistry(str(tmp_path / "jobs.db"))
+    monkeypatch.setattr(job_scheduler_module, "job_registry", registry)
+    return registry
+
+
+def _wait_for_status(registry, job_id, status, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if registry.get_job(job_id)["status"] == status:
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def test_broken_pool_is_replaced(registry):
+    scheduler = JobScheduler(max_workers=1, max_queue_size=4, torch_threads=1)
+    scheduler.start()
+    try:
+        for job_id in ("crash", "after"):
+            registry.create_job(job_id, f"{job_id}.csv", "in", "out")
+        scheduler.submit("crash", _crash)
+        scheduler.submit("after", _finish, registry.db_path, "after")
+
+        assert _wait_for_status(registry, "crash", "failed")
+        assert registry.get_job("crash")["error"] == "Worker process terminated unexpectedly"
+        assert _wait_for_status(registry, "after", "completed")
+    finally:
+        scheduler.shutdown()
+
+
+def test_shutdown_fails_jobs_that_never_started(registry):
+    scheduler = JobScheduler(max_workers=1, max_queue_size=4, torch_threads=1)
+    scheduler.start()
+    for job_id in ("running", "queued"):
+        registry.create_job(job_id, f"{job_id}.csv", "in", "out")
+    scheduler.submit("running", _sleep, 0.5)
+    scheduler.submit("queued", _finish, registry.db_path, "queued")
+    scheduler.shutdown()
+
+    assert registry.get_job("running")["status"] == "processing"
+    assert registry.get_job("queued")["status"] == "failed"
+    assert registry.get_job("queued")["error"] == "Server shut down before the job started"
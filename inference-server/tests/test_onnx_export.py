@@ -0,0 +1,38 @@
+"""The exported ONNX model, run by the onnxruntime backend, must predict what the torch model does"""
+import numpy as np
+import pytest
+import torch
+from inference.backends import OnnxRuntimeBackend
+from models.export import export_onnx, file_sha256
+from conftest import NUM_FEATURES, TINY_CONFIG, tiny_model
+
+pytest.importorskip("onnx")
+pytest.importorskip("onnxruntime")
+
+
+@pytest.fixture
+def onnx_backend(tiny_checkpoint, tmp_path):
+    return OnnxRuntimeBackend(export_onnx(tiny_checkpoint, str(tmp_path / "tiny.onnx")))
+
+
+@pytest.mark.parametrize("batch_size", [1, 5, 64])
+@pytest.mark.parametrize("mask_rows", ["per_row", "shared"])
+def test_onnx_matches_torch(onnx_backend, batch_size, mask_rows):
+    torch.manual_seed(1)
+    x = torch.randn(batch_size, NUM_FEATURES)
+    # A shared mask is one [1, F] row for the whole batch, on its own dynamic axis
+    mask = torch.rand(batch_size if mask_rows == "per_row" else 1, NUM_FEATURES) < 0.2
+    mask[:, 0] = False
+
+    with torch.no_grad():
+        expected = tiny_model()(x, None, mask).numpy()
+    output = np.empty((batch_size, NUM_FEATURES), dtype=np.float32)
+    onnx_backend.run(x, mask, output)
+
+    np.testing.assert_allclose(output, expected, atol=1e-5, rtol=1e-4)
+
+
+def test_onnx_metadata(onnx_backend, tiny_checkpoint):
+    assert onnx_backend.source_sha256 == file_sha256(tiny_checkpoint)
+    assert onnx_backend.config == TINY_CONFIG
+    assert onnx_backend.model_type == "single"
@@ -0,0 +1,28 @@
+"""The scaler parameters are exported on first load and transform exactly like the pickled scaler"""
+import os
+import pickle
+import numpy as np
+from inference.imputation_service import ImputationService
+from models.scaler_params import ScalerParams, scaler_params_path
+from conftest import SCALER_PATH
+
+
+def test_first_load_exports_scaler_params(service_env):
+    params_path = scaler_params_path(service_env)
+    assert not os.path.exists(params_path)
+
+    first = ImputationService()
+    first._load_scaler()
+    assert os.path.exists(params_path)
+    assert first.scaler.path == params_path
+
+    second = ImputationService()
+    second._load_scaler()
+    assert isinstance(second.scaler, ScalerParams)
+    assert second.scaler.path == params_path
+
+    with open(SCALER_PATH, "rb") as f:
+        scaler = pickle.load(f)
+    rows = np.random.default_rng(0).normal(size=(16, scaler.n_features_in_)) * 10 + 50
+    assert np.array_equal(second.scaler.transform(rows), scaler.transform(rows))
+    assert np.array_equal(second.scaler.inverse_transform(rows), scaler.inverse_transform(rows))
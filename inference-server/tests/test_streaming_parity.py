@@ -0,0 +1,38 @@
+"""Streamed CSVs must come out byte for byte like the same file imputed whole"""
+import numpy as np
+import pytest
+from inference.imputation_service import ImputationService
+from conftest import pattern_rows
+
+
+def _impute(tmp_path, input_path, name, chunk_size, batches):
+    service = ImputationService()
+    impute_batch = service._impute_batch
+
+    def recording_impute_batch(values, missing, batch_positions, *args, **kwargs):
+        batches.append(values[batch_positions].tobytes())
+        return impute_batch(values, missing, batch_positions, *args, **kwargs)
+
+    service._impute_batch = recording_impute_batch
+    output_path = tmp_path / f"{name}.csv"
+    service.impute_csv(str(input_path), str(output_path), batch_size=64, chunk_size=chunk_size)
+    return output_path.read_bytes()
+
+
+@pytest.mark.parametrize("pattern_min_rows", ["64", "0"])
+def test_streaming_matches_whole_file(tmp_path, monkeypatch, service_env, pattern_min_rows):
+    # Chunks that end mid-batch, with patterns frequent enough to be grouped
+    monkeypatch.setenv("IMPUTATION_PATTERN_MIN_ROWS", pattern_min_rows)
+    input_path = tmp_path / "input.csv"
+    pattern_rows(2000).to_csv(input_path, index=False)
+
+    whole = _impute(tmp_path, input_path, "whole", 0, [])
+    streamed_batches = []
+    streamed = _impute(tmp_path, input_path, "streamed", 700, streamed_batches)
+    assert streamed == whole
+
+    # Streaming never groups patterns, so its batches are the whole file's mixed batches
+    monkeypatch.setenv("IMPUTATION_PATTERN_MIN_ROWS", "0")
+    ungrouped_batches = []
+    _impute(tmp_path, input_path, "ungrouped", 0, ungrouped_batches)
+    assert streamed_batches == ungrouped_batches